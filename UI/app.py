@@ -1,15 +1,25 @@
 #!/usr/bin/env python
 import streamlit as st
-import pandas as pd
-import numpy as np
-from PIL import Image
-import re
-import joblib
 import base64
 import os
 import sqlite3
-import requests
-from io import BytesIO
+
+from artifact_store import ArtifactError, ArtifactStore
+from ingredient_index import query_terms, search_overlap, user_terms
+from ingredient_suggest import suggester_from_env
+from recipe_db import ConnectionPool, check_model_alignment
+from recipe_model import get_normalizer, preprocess_user_ingredients
+from recipe_payloads import PAYLOAD_COLUMNS, card_html, fetch_recipes_with_payloads, has_payload_columns
+from result_cache import ResultCache, file_version
+from similarity_engine import similarity_models_from_env
+import tracing
+from tracing import span
+
+try:
+    # Text input that reruns the script on each keystroke (st.text_input only on Enter / blur)
+    from st_keyup import st_keyup
+except ImportError:
+    st_keyup = None
 
 # -------------------------------
 # Page Configuration
@@ -23,145 +33,310 @@ st.set_page_config(
 # -------------------------------
 # Database Search Functions
 # -------------------------------
+@st.cache_resource
+def get_artifact_store():
+    return ArtifactStore()
+
+@st.cache_resource
+def get_db_pool():
+    # Read-only, tuned connections shared by every session of this process
+    return ConnectionPool(
+        get_artifact_store().path("recipes_db"),
+        max_size=int(os.environ.get("PANTRYPALETTE_DB_POOL_SIZE", "8"))
+    )
+
 def get_connection():
-    db_url = "https://drive.google.com/uc?export=download&id=1FRNAtJiw8hpnvul1LqX3Bjjk4fttevoG"
-    db_path = "temp_recipes.db"
-    
-    # Return SQLite connection
-    conn = sqlite3.connect(db_path)
-    return conn
+    """Borrow a pooled connection for the duration of a with block"""
+    return get_db_pool().connection()
     
 # ---------------------------------------------
 # Load Trained Models (TF-IDF + Nearest Neighbors)
 # ---------------------------------------------
 @st.cache_resource
 def load_similarity_models():
-    # TF-IDF Vectorizer
-    tfidf_url = "https://drive.google.com/uc?export=download&id=1hTaVi9ZB2pxMFQ5MOwD3Ozc8raf31pL8"
-    response1 = requests.get(tfidf_url)
-    vectorizer = joblib.load(BytesIO(response1.content))
+    # TF-IDF vectorizer, similarity engine and index position -> recipe primary key,
+    # as PANTRYPALETTE_SIMILARITY_BACKEND / PANTRYPALETTE_CORPUS_STORE select them
+    return similarity_models_from_env(get_artifact_store())
 
-    # Nearest Neighbors Model
-    nn_url = "https://drive.google.com/uc?export=download&id=1uSIeGdZYyZt_gTzZWvI9HuArZ2zNx-Az" 
-    response2 = requests.get(nn_url)
-    nn_model = joblib.load(BytesIO(response2.content))
+@st.cache_resource
+def check_similarity_models(_nn_model, _recipe_ids):
+    with get_connection() as conn:
+        check_model_alignment(conn, _recipe_ids, _nn_model.n_samples_fit_)
+    return True
+
+try:
+    tfidf_vectorizer, nearest_neighbors_model, model_recipe_ids = load_similarity_models()
+except ArtifactError as e:
+    st.error(f"Model artifacts could not be loaded: {str(e)}")
+    st.stop()
+except RuntimeError as e:
+    st.error(f"Similarity index does not match the model: {str(e)}")
+    st.stop()
+
+# NLTK corpora are checked (not downloaded) once per process
+get_normalizer()
+
+try:
+    check_similarity_models(nearest_neighbors_model, model_recipe_ids)
+except ArtifactError as e:
+    st.error(f"Recipe database could not be loaded: {str(e)}")
+    st.stop()
+except RuntimeError as e:
+    st.error(f"Similarity model does not match the recipe database: {str(e)}")
+    st.stop()
 
-    return vectorizer, nn_model
+# ---------------------------------------------
+# Incremental Index (delta segments of newly ingested recipes)
+# ---------------------------------------------
+@st.cache_resource
+def load_segmented_index():
+    segments_dir = os.environ.get("PANTRYPALETTE_SEGMENTS_DIR")
+    if not segments_dir:
+        return None
+    from segmented_index import open_segmented_index
 
-tfidf_vectorizer, nearest_neighbors_model = load_similarity_models()
+    return open_segmented_index(segments_dir, store=get_artifact_store(), n_neighbors=SIMILARITY_K)
+
+# ---------------------------------------------
+# Display Payloads
+# ---------------------------------------------
+@st.cache_resource(max_entries=1)
+def _payload_columns_available(db_version):
+    with get_connection() as conn:
+        return has_payload_columns(conn)
+
+def payload_columns_available():
+    # Keyed on the DB file version: backfilling the columns takes effect without a restart
+    return _payload_columns_available(file_version(get_artifact_store().path("recipes_db")))
+
+def fetch_recipes(conn, recipe_ids):
+    """Fetch recipes with their parsed display payloads"""
+    # Rows without stored payloads are parsed here; results are cached
+    return fetch_recipes_with_payloads(conn, recipe_ids, payload_columns_available())
+
+def recipe_frame(rows):
+    import pandas as pd
+
+    return pd.DataFrame(rows, columns=['id', 'title', 'ingredients', 'instructions'] + PAYLOAD_COLUMNS)
+
+# ---------------------------------------------
+# Ingredient Autocomplete and Typo Correction
+# ---------------------------------------------
+# Keystrokes are debounced before the rerun that refreshes the suggestions
+SUGGEST_DEBOUNCE_MS = 150
+
+@st.cache_resource
+def load_ingredient_suggester():
+    # None until `python UI/ingredient_suggest.py build <db>` has been run
+    return suggester_from_env()
+
+def canonical_ingredients(ingredients):
+    """Cleaned user ingredients with misspelled tokens mapped to known ones"""
+    canonical = preprocess_user_ingredients(ingredients)
+    suggester = load_ingredient_suggester()
+    if suggester is not None:
+        canonical = suggester.correct_canonical(canonical)
+    return canonical
+
+# ---------------------------------------------
+# Cross-Session Result Cache
+# ---------------------------------------------
+@st.cache_resource
+def get_result_cache():
+    # Shared by every session and worker thread of this process
+    return ResultCache(
+        max_entries=int(os.environ.get("PANTRYPALETTE_RESULT_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.environ.get("PANTRYPALETTE_RESULT_CACHE_TTL", "600"))
+    )
+
+def cached_search(ingredients, mode, k, search, canonicalize=canonical_ingredients):
+    """Run search(canonicalize(ingredients)) through the shared result cache"""
+    # Default: sorted, de-duplicated, corrected cleaned phrases: "Chicken , Rice" == "rice, chiken"
+    canonical = canonicalize(ingredients)
+
+    store = get_artifact_store()
+    version = (tuple(sorted(store.versions().items())), file_version(store.path("recipes_db")))
+    segments = load_segmented_index()
+    if segments is not None:
+        # New delta segments or a compaction written by the ingestion process
+        segments.reload()
+        version += (segments.generation,)
+    cache = get_result_cache()
+    cache.set_version(version)
+    key = (version, canonical, mode, k)
+    found, result = cache.get(key)
+    tracing.count("result_cache_hits" if found else "result_cache_misses")
+    if not found:
+        result = search(canonical)
+        cache.put(key, result)
+    return result
 
 # ---------------------------------------------
 # Basic Ingredient Matching (Simple Overlap)
 # ---------------------------------------------
+OVERLAP_RESULT_LIMIT = 100
+
+def overlap_key(ingredients):
+    """The user's own terms: the match score divides by how many were entered"""
+    return ", ".join(user_terms(ingredients))
+
+def overlap_search(key):
+    import pandas as pd
+
+    ingredient_list = [ing for ing in key.split(", ") if ing]
+    if not ingredient_list:
+        return pd.DataFrame()
+
+    with get_connection() as conn:
+        # Match counts come straight from the ingredient posting index
+        with span("overlap_query"):
+            matches = search_overlap(conn, ingredient_list, limit=OVERLAP_RESULT_LIMIT)
+        if not matches:
+            return pd.DataFrame()
+
+        match_counts = dict(matches)
+        with span("db_fetch"):
+            rows = fetch_recipes(conn, [recipe_id for recipe_id, _ in matches])
+        tracing.count("rows_fetched", len(rows))
+
+    # Convert to DataFrame, keeping the index ranking
+    with span("dataframe"):
+        df = recipe_frame(rows)
+        df['match_score'] = [match_counts[row[0]] / len(ingredient_list) for row in rows]
+    return df
+
 def search_recipes_db(ingredients):
     """Search recipes in the database based on ingredients"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Split ingredients into list
-    ingredient_list = [ing.strip().lower() for ing in ingredients.split(',')]
-    
-    # Build the query
-    query = """
-        SELECT 
-            title,
-            ingredients,
-            instructions
-        FROM recipes
-        WHERE LOWER(ingredients) LIKE ?
-    """
-    
-    # Add more conditions for each ingredient
-    for _ in range(len(ingredient_list) - 1):
-        query += " OR LOWER(ingredients) LIKE ?"
-    
-    # Prepare parameters
-    params = ['%' + ing + '%' for ing in ingredient_list]
-    
+    import pandas as pd
+
     try:
-        cursor.execute(query, params)
-        recipes = cursor.fetchall()
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(recipes, columns=['title', 'ingredients', 'instructions'])
-        
-        # Calculate match scores
-        df['match_score'] = df['ingredients'].apply(lambda x: calculate_match_score(x, ingredient_list))
-        
-        # Sort by match score
-        df = df.sort_values('match_score', ascending=False)
-        
-        return df
+        return cached_search(ingredients, "overlap", OVERLAP_RESULT_LIMIT, overlap_search,
+                             canonicalize=overlap_key)
+    except sqlite3.OperationalError as e:
+        st.error(f"Error searching recipes: {str(e)}. "
+                 "Build the ingredient index with `python UI/ingredient_index.py <db>`.")
+        return pd.DataFrame()
     except Exception as e:
         st.error(f"Error searching recipes: {str(e)}")
         return pd.DataFrame()
-    finally:
-        conn.close()
-
-def calculate_match_score(ingredients, ingredient_list):
-    matched_ingredients = sum(1 for ing in ingredient_list if ing in ingredients)
-    ingredient_score = matched_ingredients / len(ingredient_list)
-    return ingredient_score
 
 # ---------------------------------------------
 # Smart Similarity Search (TF-IDF + Nearest Neighbors)
 # ---------------------------------------------
-def search_recipes_with_similarity(ingredients):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    try:
-        # Fetch all recipe titles
-        cursor.execute("SELECT title, ingredients, instructions FROM recipes")
-        recipes = cursor.fetchall()
-        df = pd.DataFrame(recipes, columns=['title', 'ingredients', 'instructions'])
-
+SIMILARITY_K = 10
+
+def similarity_search(canonical):
+    segments = load_segmented_index()
+    if segments is not None:
+        # Main segment plus delta segments, tombstoned rows excluded
+        with span("vectorize"):
+            user_vec = segments.vectorizer.transform([canonical])
+        with span("knn"):
+            recipe_ids, similarities = segments.search(user_vec, SIMILARITY_K)[0]
+    else:
         # Vectorize user ingredients
-        user_vec = tfidf_vectorizer.transform([ingredients])
+        with span("vectorize"):
+            user_vec = tfidf_vectorizer.transform([canonical])
 
         # Find top 10 nearest recipes
-        distances, indices = nearest_neighbors_model.kneighbors(user_vec, n_neighbors=10)
+        with span("knn"):
+            distances, indices = nearest_neighbors_model.kneighbors(user_vec, n_neighbors=SIMILARITY_K)
+        recipe_ids = model_recipe_ids[indices[0]]
+        similarities = 1 - distances[0]  # (closer distance = higher similarity)
 
-        # Get recipes based on the indices
-        matched_recipes = df.iloc[indices[0]].copy()
+    # Fetch only the matched recipes by primary key
+    with get_connection() as conn:
+        with span("db_fetch"):
+            rows = fetch_recipes(conn, recipe_ids)
+    tracing.count("rows_fetched", len(rows))
+    similarity = dict(zip(recipe_ids.tolist(), similarities))
+
+    with span("dataframe"):
+        matched_recipes = recipe_frame(rows)
 
         # Add similarity score
-        matched_recipes['similarity_score'] = 1 - distances[0]  # (closer distance = higher similarity)
+        matched_recipes['similarity_score'] = [similarity[row[0]] for row in rows]
 
         # Sort by similarity score
-        matched_recipes = matched_recipes.sort_values('similarity_score', ascending=False)
+        return matched_recipes.sort_values('similarity_score', ascending=False)
 
-        return matched_recipes
+def search_recipes_with_similarity(ingredients):
+    import pandas as pd
+
+    try:
+        return cached_search(ingredients, "similarity", SIMILARITY_K, similarity_search)
     except Exception as e:
         st.error(f"Error searching recipes with similarity: {str(e)}")
         return pd.DataFrame()
-    finally:
-        conn.close()
 
 # ---------------------------------------------
-# UI Setup and Styling
+# Cook With What I Have (Fewest Missing Ingredients)
 # ---------------------------------------------
+PANTRY_RESULT_LIMIT = 100
 
-def set_background(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded = base64.b64encode(image_file.read()).decode()
-    background_css = f"""
-    <style>
-    .stApp {{
-        background-image: url("data:image/jpeg;base64,{encoded}");
-        background-size: cover;
-        background-position: center;
-    }}
-    </style>
-    """
-    st.markdown(background_css, unsafe_allow_html=True)
+@st.cache_resource
+def load_pantry_index():
+    from pantry_index import PantryIndex
 
-set_background("UI/image/background.png")
+    return PantryIndex(os.environ.get("PANTRYPALETTE_PANTRY_INDEX", os.path.join("models", "pantry")))
 
-# -------------------------------
-# Custom CSS Styling
-# -------------------------------
-st.markdown("""
+def pantry_search(canonical, max_missing):
+    import pandas as pd
+
+    ingredient_list = [ing for ing in canonical.split(", ") if ing]
+    if not ingredient_list:
+        return pd.DataFrame()
+
+    # missing = popcount(recipe & ~pantry) over every recipe's ingredient bitset
+    with span("pantry_scan"):
+        matches = load_pantry_index().search(query_terms(ingredient_list), max_missing, limit=PANTRY_RESULT_LIMIT)
+    if not matches:
+        return pd.DataFrame()
+
+    with get_connection() as conn:
+        with span("db_fetch"):
+            rows = fetch_recipes(conn, [recipe_id for recipe_id, _, _ in matches])
+    tracing.count("rows_fetched", len(rows))
+    counts = {recipe_id: (missing, total) for recipe_id, missing, total in matches}
+
+    with span("dataframe"):
+        df = recipe_frame(rows)
+        df['missing'] = [counts[row[0]][0] for row in rows]
+        df['match_score'] = [1 - counts[row[0]][0] / counts[row[0]][1] for row in rows]
+    return df
+
+def search_recipes_pantry(ingredients, max_missing):
+    import pandas as pd
+
+    try:
+        return cached_search(ingredients, f"pantry:{max_missing}", PANTRY_RESULT_LIMIT,
+                             lambda canonical: pantry_search(canonical, max_missing))
+    except FileNotFoundError:
+        st.error("Pantry index not found. Build it with `python UI/pantry_index.py <db> models/pantry`.")
+        return pd.DataFrame()
+    except Exception as e:
+        st.error(f"Error searching recipes by missing ingredients: {str(e)}")
+        return pd.DataFrame()
+
+# ---------------------------------------------
+# Metrics Endpoint (PANTRYPALETTE_TRACING=1)
+# ---------------------------------------------
+@st.cache_resource
+def start_metrics_endpoint():
+    # One /metrics server per process, shared by every session
+    return tracing.start_metrics_server(
+        os.environ.get("PANTRYPALETTE_METRICS_HOST", "127.0.0.1"),
+        int(os.environ.get("PANTRYPALETTE_METRICS_PORT", str(tracing.DEFAULT_METRICS_PORT)))
+    )
+
+if tracing.get_tracer() is not None:
+    start_metrics_endpoint()
+
+# ---------------------------------------------
+# UI Setup and Styling
+# ---------------------------------------------
+
+CUSTOM_CSS = """
     <style>
     .main {
         padding: 0rem 1rem;
@@ -193,6 +368,12 @@ st.markdown("""
         color: #666;
         margin-bottom: 1rem;
     }
+    .ingredient-grid {
+        display: grid;
+        grid-template-columns: 1fr 1fr;
+        gap: 12px;
+        margin-bottom: 1rem;
+    }
     .ingredient-item {
         display: inline-block;
         background-color: #f8f9fa;
@@ -241,42 +422,27 @@ st.markdown("""
         margin-right: 8px;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
-def format_ingredients(ingredients_str):
-    try:
-        ingredients = eval(ingredients_str)
-        if isinstance(ingredients, list):
-            cleaned_ingredients = []
-            for ing in ingredients:
-                ing = ing.strip().replace('"', '').replace("'", '')
-                if ing:
-                    cleaned_ingredients.append(ing)
-            ingredients_html = []
-            for i in range(0, len(cleaned_ingredients), 2):
-                if i + 1 < len(cleaned_ingredients):
-                    ingredients_html.append(f"""
-                        <div style="display: flex; margin-bottom: 12px;">
-                            <div style="flex: 1; margin-right: 12px;">
-                                <span class="ingredient-item">{cleaned_ingredients[i]}</span>
-                            </div>
-                            <div style="flex: 1;">
-                                <span class="ingredient-item">{cleaned_ingredients[i+1]}</span>
-                            </div>
-                        </div>
-                    """)
-                else:
-                    ingredients_html.append(f"""
-                        <div style="display: flex; margin-bottom: 12px;">
-                            <div style="flex: 1;">
-                                <span class="ingredient-item">{cleaned_ingredients[i]}</span>
-                            </div>
-                        </div>
-                    """)
-            return ''.join(ingredients_html)
-    except:
-        ingredients = [ing.strip() for ing in ingredients_str.split() if ing.strip()]
-        return ''.join([f'<span class="ingredient-item">{ing}</span>' for ing in ingredients])
+@st.cache_data
+def background_css(image_path):
+    # Encoded once per process instead of on every rerun
+    with open(image_path, "rb") as image_file:
+        encoded = base64.b64encode(image_file.read()).decode()
+    return f"""
+    <style>
+    .stApp {{
+        background-image: url("data:image/jpeg;base64,{encoded}");
+        background-size: cover;
+        background-position: center;
+    }}
+    </style>
+    """
+
+def set_page_styles(image_path):
+    st.markdown(background_css(image_path) + CUSTOM_CSS, unsafe_allow_html=True)
+
+set_page_styles("UI/image/background.png")
 
 def display_header():
     header_container = st.container()
@@ -288,77 +454,32 @@ def display_header():
             </div>
         """, unsafe_allow_html=True)
 
-def clean_instruction(step):
-    step = step.strip().replace('[', '').replace(']', '').replace('"', '').replace("'", '')
-    step = re.sub(r'^\d+\.?\s*$', '', step)
-    step = re.sub(r'^\d+\.\s*', '', step)
-    step = step.lstrip(',')
-    step = re.sub(r'\s+\d+\s*$', '', step)
-    step = re.sub(r'^\d+\s+', '', step)
-    step = re.sub(r'\s+\d+\s+', ' ', step)
-    if step:
-        step = step[0].upper() + step[1:]
-    return step.strip()
-
 def display_recipe_card(recipe, show_accuracy=False):
     """Display a recipe card with ingredients and instructions"""
-    with st.container():
-        st.markdown(f"""
-            <div class="recipe-card">
-                <div class="recipe-title"> Recipe: {recipe['title']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-        
-        # Display ingredients in a clean format
-        st.markdown("### 📝 Ingredients")
-        try:
-            ingredients = eval(recipe['ingredients']) if isinstance(recipe['ingredients'], str) else []
-            if isinstance(ingredients, list):
-                # Create two columns for ingredients
-                col1, col2 = st.columns(2)
-                for i, ingredient in enumerate(ingredients):
-                    ingredient = ingredient.strip().replace('"', '').replace("'", '')
-                    if ingredient:
-                        ingredient_box = f"""
-                            <div class="ingredient-item">{ingredient}</div>
-                        """
-                        if i % 2 == 0:
-                            col1.markdown(ingredient_box, unsafe_allow_html=True)
-                        else:
-                            col2.markdown(ingredient_box, unsafe_allow_html=True)
-        except:
-            st.write("No ingredients available")
-        
-        # Display instructions
-        st.markdown("### 👩‍🍳 Instructions")
-        try:
-            instructions = eval(recipe['instructions']) if isinstance(recipe['instructions'], str) else []
-            if isinstance(instructions, list):
-                step_number = 1
-                for step in instructions:
-                    # Clean up the instruction text
-                    cleaned_step = clean_instruction(step)
-                    if cleaned_step:  # Only display non-empty steps
-                        st.markdown(f"""
-                            <div class="instruction-step">
-                                <strong>{step_number}.</strong> {cleaned_step}
-                            </div>
-                        """, unsafe_allow_html=True)
-                        step_number += 1
-        except:
-            st.write("No instructions available")
+    # One markdown call per card; the HTML is built once per recipe
+    st.markdown(
+        card_html(int(recipe['id']), recipe['title'], recipe['ingredients_json'], recipe['instructions_json']),
+        unsafe_allow_html=True
+    )
 
 def display_accuracy_card(recipe):
+    # Cook-with-what-I-have results also report how many ingredients are missing
+    missing = f"<br><strong>🛒 Missing Ingredients:</strong> {recipe['missing']}" if 'missing' in recipe else ""
     st.markdown(f"""
         <div class="accuracy-card">
             <div class="recipe-title">{recipe['title']}</div>
             <div class="recipe-meta">
                 <strong>🎯 Match Score:</strong> {recipe['match_score']*100:.1f}%
+                {missing}
             </div>
         </div>
     """, unsafe_allow_html=True)
 
 def display_recipes(matching_recipes, similarity_based=False):
+    with span("render"):
+        _display_recipes(matching_recipes, similarity_based)
+
+def _display_recipes(matching_recipes, similarity_based):
     if not matching_recipes.empty:
         if similarity_based:
             st.success(f"Here are your top recipe matches based on ingredient similarity! 🍽️")
@@ -404,10 +525,25 @@ def display_search_section():
     
     ## st.markdown("<h4><strong>🔍 Search Ingredients</strong></h4>", unsafe_allow_html=True)
 
-    ingredients = st.text_input(label = "", 
-                                placeholder="Example: tomato, cheese, pasta",
-                                help="Enter ingredients separated by commas",
-                                key="ingredient_search")
+    if st_keyup is not None:
+        ingredients = st_keyup(label="Ingredients",
+                               placeholder="Example: tomato, cheese, pasta",
+                               key="ingredient_search",
+                               debounce=SUGGEST_DEBOUNCE_MS,
+                               label_visibility="collapsed")
+    else:
+        ingredients = st.text_input(label = "", 
+                                    placeholder="Example: tomato, cheese, pasta",
+                                    help="Enter ingredients separated by commas",
+                                    key="ingredient_search")
+
+    # Completions of the ingredient being typed (after the last comma)
+    suggester = load_ingredient_suggester()
+    fragment = ingredients.rsplit(",", 1)[-1].strip()
+    if suggester is not None and fragment:
+        completions = suggester.complete(fragment, limit=5)
+        if completions:
+            st.caption("Suggestions: " + " · ".join(completions))
 
     col1, col2, col3 = st.columns([1,1,1])
     with col2:
@@ -424,19 +560,38 @@ def main():
         if not ingredients.strip():
             st.warning("⚠️ Please enter one or more ingredients to search for recipes.")
             return
+
+        suggester = load_ingredient_suggester()
+        if suggester is not None:
+            corrections = suggester.corrections(preprocess_user_ingredients(ingredients))
+            if corrections:
+                st.info("Showing results for " + ", ".join(
+                    f"**{right}** (instead of {wrong})" for wrong, right in sorted(corrections.items())
+                ))
         
         search_mode = st.radio(
             "Choose search method:",
-            ["Simple Ingredient Match (Overlap Match)", "Smart Similarity Match (TFIDF + Nearest Neighbors)"],
+            ["Simple Ingredient Match (Overlap Match)", "Smart Similarity Match (TFIDF + Nearest Neighbors)",
+             "Cook With What I Have (Fewest Missing Ingredients)"],
             horizontal=True
         )
 
         if search_mode.startswith("Simple Ingredient Match"):
-            matching_recipes = search_recipes_db(ingredients)
-            display_recipes(matching_recipes, similarity_based=False)
+            with tracing.request("search", mode="overlap"):
+                matching_recipes = search_recipes_db(ingredients)
+                display_recipes(matching_recipes, similarity_based=False)
+        elif search_mode.startswith("Cook With What I Have"):
+            max_missing = st.slider("Missing ingredients allowed", 0, 10, 3)
+            with tracing.request("search", mode="pantry"):
+                matching_recipes = search_recipes_pantry(ingredients, max_missing)
+                display_recipes(matching_recipes, similarity_based=False)
         else:
-            matching_recipes = search_recipes_with_similarity(ingredients)
-            display_recipes(matching_recipes, similarity_based=True)
+            with tracing.request("search", mode="similarity"):
+                matching_recipes = search_recipes_with_similarity(ingredients)
+                display_recipes(matching_recipes, similarity_based=True)
+
+    with st.sidebar.expander("Search cache"):
+        st.json(get_result_cache().stats())
 
     # Footer
     st.markdown("""
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# approximate_search.py
+import argparse
+import heapq
+import threading
+import time
+
+import numpy as np
+
+from similarity_engine import SparseCosineIndex, l2_normalize, top_k
+
+
+class ImpactOrderedIndex:
+    """
+    Approximate cosine top-k over an impact-ordered inverted index.
+
+    Each TF-IDF term keeps its postings (recipe, weight) sorted by weight,
+    highest first. A query walks its terms in decreasing upper-bound order
+    (query weight x best posting of the term), accumulating partial scores,
+    and stops MaxScore-style once the k-th best partial score beats the
+    summed upper bounds of the terms not yet visited. The best candidates
+    are then re-scored exactly against the recipe matrix.
+
+    Recall / latency knobs:
+        max_postings  only the first max_postings postings of each term are
+                      read (None reads the full list)
+        rerank_depth  number of partial-score candidates re-scored exactly
+                      (None re-scores all of them)
+
+    With max_postings=None and a rerank_depth covering every candidate
+    the results are exact.
+    """
+
+    def __init__(self, recipe_vectors, n_neighbors=10, max_postings=None, rerank_depth=200):
+        self.matrix = l2_normalize(recipe_vectors)
+        self.n_neighbors = n_neighbors
+        self.max_postings = max_postings
+        self.rerank_depth = rerank_depth
+        self.n_samples_fit_ = self.matrix.shape[0]
+        self.n_features_in_ = self.matrix.shape[1]
+        self._local = threading.local()
+        self._build_postings()
+
+    @classmethod
+    def from_engine(cls, engine, **kwargs):
+        """
+        Build the index from an already normalized SparseCosineIndex.
+        """
+        kwargs.setdefault("n_neighbors", engine.n_neighbors)
+        return cls(engine.matrix, **kwargs)
+
+    @classmethod
+    def from_nn_model(cls, nn_model, **kwargs):
+        kwargs.setdefault("n_neighbors", nn_model.n_neighbors)
+        return cls(nn_model._fit_X, **kwargs)
+
+    def _build_postings(self):
+        csc = self.matrix.tocsc()
+        csc.sort_indices()
+        term_of_entry = np.repeat(np.arange(csc.shape[1]), np.diff(csc.indptr))
+        order = np.lexsort((-csc.data, term_of_entry))
+        self.indptr = csc.indptr.astype(np.int64)
+        self.postings = csc.indices[order].astype(np.int64)
+        self.impacts = csc.data[order]
+        lengths = np.diff(self.indptr)
+        self.max_impact = np.zeros(csc.shape[1], dtype=np.float64)
+        self.max_impact[lengths > 0] = self.impacts[self.indptr[:-1][lengths > 0]]
+
+    def _scratch(self):
+        """
+        Per-thread accumulator and seen flags, all zero between queries.
+        """
+        if not hasattr(self._local, "accumulator"):
+            self._local.accumulator = np.zeros(self.n_samples_fit_, dtype=np.float64)
+            self._local.seen = np.zeros(self.n_samples_fit_, dtype=bool)
+        return self._local.accumulator, self._local.seen
+
+    def _candidates(self, terms, weights, k, depth):
+        upper_bounds = weights * self.max_impact[terms]
+        order = np.argsort(-upper_bounds, kind="stable")
+        remaining = upper_bounds[order][::-1].cumsum()[::-1]
+
+        accumulator, seen = self._scratch()
+        parts = []
+        # Min-heap of (score, recipe) for the k best partial scores seen so
+        # far; best[recipe] is the live entry, older ones are skipped. Scores
+        # only grow, so its minimum is a lower bound of the k-th score.
+        heap, best = [], {}
+        try:
+            for step, term_pos in enumerate(order):
+                if len(best) >= k and heap[0][0] >= remaining[step]:
+                    break
+                term = terms[term_pos]
+                start, end = self.indptr[term], self.indptr[term + 1]
+                if self.max_postings is not None:
+                    end = min(end, start + self.max_postings)
+                docs = self.postings[start:end]
+                accumulator[docs] += weights[term_pos] * self.impacts[start:end]
+                new_docs = docs[~seen[docs]]
+                seen[new_docs] = True
+                parts.append(new_docs)
+
+                scores = accumulator[docs]
+                if len(best) >= k:
+                    # Entries of best only grow, so they all stay above the minimum
+                    above = scores > heap[0][0]
+                    docs, scores = docs[above], scores[above]
+                if len(docs) > k:
+                    step_best = np.argpartition(scores, len(docs) - k)[len(docs) - k:]
+                    docs, scores = docs[step_best], scores[step_best]
+                for doc, score in zip(docs.tolist(), scores.tolist()):
+                    if doc not in best and len(best) >= k:
+                        if score <= heap[0][0]:
+                            continue
+                        del best[heapq.heappop(heap)[1]]
+                    best[doc] = score
+                    heapq.heappush(heap, (score, doc))
+                    while heap[0][0] != best.get(heap[0][1]):
+                        heapq.heappop(heap)
+
+            touched = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+            scores = accumulator[touched]
+        finally:
+            # Reset only the entries this query touched
+            for docs in parts:
+                accumulator[docs] = 0.0
+                seen[docs] = False
+
+        if depth is None:
+            return touched
+        return touched[top_k(scores, depth)]
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        """
+        Same (distances, indices) contract as SparseCosineIndex.kneighbors.
+
+        Recipes without any query term score 0; they only fill the result
+        when fewer than k candidates were found.
+        """
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_)
+        queries = l2_normalize(X)
+        distances = np.empty((queries.shape[0], k), dtype=np.float64)
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+
+        for row in range(queries.shape[0]):
+            start, end = queries.indptr[row], queries.indptr[row + 1]
+            terms, weights = queries.indices[start:end], queries.data[start:end]
+            depth = None if self.rerank_depth is None else max(k, self.rerank_depth)
+            candidates = np.sort(self._candidates(terms, weights, k, depth))
+            exact = self.matrix[candidates] @ queries[row].toarray().ravel()
+            best_pos = top_k(exact, k)
+            best, best_scores = candidates[best_pos], exact[best_pos]
+            if len(best) < k:
+                filler = np.setdiff1d(np.arange(self.n_samples_fit_), best)[:k - len(best)]
+                best = np.concatenate([best, filler])
+                best_scores = np.concatenate([best_scores, np.zeros(len(filler))])
+            indices[row] = best
+            distances[row] = np.clip(1.0 - best_scores, 0.0, 2.0)
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+
+# ---------------------------------------------
+# Recall Report
+# ---------------------------------------------
+def recall_report(exact, approximate, query_vectors, k=10):
+    """
+    Compare an approximate index against the exact engine on held-out queries.
+
+    Returns a dict with recall@k and mean per-query latency of both.
+    """
+    recalls = []
+    exact_time = approx_time = 0.0
+    for row in range(query_vectors.shape[0]):
+        query = query_vectors[row]
+        t0 = time.perf_counter()
+        expected = exact.kneighbors(query, n_neighbors=k, return_distance=False)[0]
+        t1 = time.perf_counter()
+        found = approximate.kneighbors(query, n_neighbors=k, return_distance=False)[0]
+        t2 = time.perf_counter()
+        exact_time += t1 - t0
+        approx_time += t2 - t1
+        recalls.append(len(set(expected) & set(found)) / len(expected))
+
+    n_queries = max(query_vectors.shape[0], 1)
+    return {
+        "k": k,
+        "queries": query_vectors.shape[0],
+        "recall_at_k": float(np.mean(recalls)) if recalls else 0.0,
+        "exact_ms": 1000 * exact_time / n_queries,
+        "approximate_ms": 1000 * approx_time / n_queries,
+    }
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    from artifact_store import ArtifactStore
+
+    parser = argparse.ArgumentParser(description="Recall@k of the approximate index against exact cosine search.")
+    parser.add_argument("queries_csv", help="held-out recipes (e.g. the notebook's test_df) with an 'ingredients' column")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=1000, help="number of held-out queries to use")
+    parser.add_argument("--max-postings", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--rerank-depth", type=int, default=200)
+    args = parser.parse_args()
+
+    store = ArtifactStore()
+    vectorizer = store.load("tfidf_vectorizer")
+    exact = SparseCosineIndex.from_nn_model(store.load("nearest_neighbors_model"))
+    queries = pd.read_csv(args.queries_csv, nrows=args.limit)["ingredients"].astype(str)
+    query_vectors = vectorizer.transform(queries)
+
+    for max_postings in args.max_postings:
+        approximate = ImpactOrderedIndex.from_engine(exact, max_postings=max_postings, rerank_depth=args.rerank_depth)
+        report = recall_report(exact, approximate, query_vectors, k=args.k)
+        print(f"max_postings={max_postings:>8} rerank_depth={args.rerank_depth:>5} "
+              f"recall@{report['k']}={report['recall_at_k']:.3f} "
+              f"exact={report['exact_ms']:.2f}ms approximate={report['approximate_ms']:.2f}ms")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# artifact_store.py
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "manifest.json")
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pantrypalette", "artifacts")
+
+CHUNK_SIZE = 1 << 20
+
+
+class ArtifactError(RuntimeError):
+    """Raised when an artifact cannot be found, downloaded or verified."""
+
+
+def sha256_file(path):
+    """
+    Compute the sha256 hex digest of a file without reading it into memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Versioned, content-addressed on-disk cache for model artifacts.
+
+    Artifacts are described in a manifest (name -> version, filename,
+    sha256, url, format). They are resolved from the local models
+    directory first, then from the cache directory, and only downloaded
+    when neither has a copy with the expected hash. Downloads go to a
+    temporary file and are renamed into place once the hash matches.
+    Artifacts without a sha256 in the manifest are only downloaded when
+    unpinned downloads are explicitly allowed.
+
+    Environment overrides:
+        PANTRYPALETTE_CACHE_DIR          cache directory
+        PANTRYPALETTE_OFFLINE=1          never touch the network
+        PANTRYPALETTE_ARTIFACT_URL       base URL replacing every manifest url
+                                         (e.g. a local HTTP mirror)
+        PANTRYPALETTE_ALLOW_UNPINNED=1   download unpinned artifacts, logging their sha256
+    """
+
+    def __init__(self, manifest_path=DEFAULT_MANIFEST, cache_dir=None, offline=None, base_url=None, local_dir=None,
+                 allow_unpinned=None):
+        self.manifest_path = manifest_path
+        self.local_dir = local_dir or os.path.dirname(os.path.abspath(manifest_path))
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)["artifacts"]
+
+        self.cache_dir = cache_dir or os.environ.get("PANTRYPALETTE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if offline is None:
+            offline = os.environ.get("PANTRYPALETTE_OFFLINE", "") not in ("", "0")
+        self.offline = offline
+        if allow_unpinned is None:
+            allow_unpinned = os.environ.get("PANTRYPALETTE_ALLOW_UNPINNED", "") not in ("", "0")
+        self.allow_unpinned = allow_unpinned
+        self.base_url = base_url or os.environ.get("PANTRYPALETTE_ARTIFACT_URL")
+
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def entry(self, name):
+        try:
+            return self.manifest[name]
+        except KeyError:
+            raise ArtifactError(f"Unknown artifact '{name}' in {self.manifest_path}")
+
+    def version(self, name):
+        return str(self.entry(name)["version"])
+
+    def document_form(self):
+        """
+        Document form the TF-IDF model was fitted on (recipe_model.DOCUMENT_FORMS), "raw" if unrecorded.
+        """
+        return self.entry("tfidf_vectorizer").get("documents", "raw")
+
+    def versions(self):
+        """
+        Return {name: (version, sha256)} for every artifact in the manifest.
+        """
+        return {name: (str(e["version"]), e.get("sha256")) for name, e in self.manifest.items()}
+
+    # ---------------------------------------------
+    # Resolution
+    # ---------------------------------------------
+    def available(self, name):
+        """
+        Whether path(name) has a copy to return: a local or cached one, or a url to download it from.
+        """
+        entry = self.entry(name)
+        if name in self._resolved or os.path.exists(self._local_path(entry)):
+            return True
+        if entry.get("url") or self.base_url:
+            return True
+        expected = entry.get("sha256")
+        if expected is not None:
+            return os.path.exists(self._cache_path(name, entry, expected))
+        return self._cached_unpinned(name, entry) is not None
+
+    def path(self, name):
+        """
+        Return a verified local path for an artifact, downloading it if needed.
+        """
+        with self._lock:
+            if name not in self._resolved:
+                self._resolved[name] = self._resolve(name)
+            return self._resolved[name]
+
+    def _cache_path(self, name, entry, sha256):
+        return os.path.join(self.cache_dir, name, str(entry["version"]), sha256, entry["filename"])
+
+    def _cached_unpinned(self, name, entry):
+        """
+        Most recently downloaded copy of an unpinned artifact's version, if any.
+        """
+        version_dir = os.path.join(self.cache_dir, name, str(entry["version"]))
+        if not os.path.isdir(version_dir):
+            return None
+        candidates = [os.path.join(version_dir, sha256, entry["filename"]) for sha256 in os.listdir(version_dir)]
+        candidates = [path for path in candidates if os.path.exists(path)]
+        return max(candidates, key=os.path.getmtime, default=None)
+
+    def _local_path(self, entry):
+        return os.path.normpath(os.path.join(self.local_dir, entry.get("local_path", entry["filename"])))
+
+    def _resolve(self, name):
+        entry = self.entry(name)
+        expected = entry.get("sha256")
+
+        # 1. Artifact checked into / provisioned next to the manifest
+        local_path = self._local_path(entry)
+        if os.path.exists(local_path):
+            if expected is None or sha256_file(local_path) == expected:
+                return local_path
+            print(f"Artifact '{name}' at {local_path} does not match the manifest hash, ignoring it")
+
+        # 2. Content-addressed cache (verified when it was written)
+        if expected is not None:
+            cached = self._cache_path(name, entry, expected)
+            if os.path.exists(cached):
+                return cached
+        else:
+            cached = self._cached_unpinned(name, entry)
+            if cached:
+                return cached
+
+        # 3. Download
+        if self.offline:
+            raise ArtifactError(f"Artifact '{name}' is not available locally and offline mode is enabled")
+        if expected is None and not self.allow_unpinned:
+            raise ArtifactError(
+                f"Artifact '{name}' has no sha256 in {self.manifest_path}; refusing to download it unverified "
+                f"(pin it, or set PANTRYPALETTE_ALLOW_UNPINNED=1)"
+            )
+        return self._download(name, entry, expected)
+
+    def _url(self, entry):
+        if self.base_url:
+            return self.base_url.rstrip("/") + "/" + entry["filename"]
+        if not entry.get("url"):
+            raise ArtifactError(f"Artifact '{entry['filename']}' has no download url")
+        return entry["url"]
+
+    def _download(self, name, entry, expected):
+        url = self._url(entry)
+        staging_dir = os.path.join(self.cache_dir, name, str(entry["version"]))
+        os.makedirs(staging_dir, exist_ok=True)
+
+        import requests
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with requests.get(url, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    for block in response.iter_content(CHUNK_SIZE):
+                        digest.update(block)
+                        f.write(block)
+            actual = digest.hexdigest()
+            if expected is not None and actual != expected:
+                raise ArtifactError(
+                    f"Artifact '{name}' from {url} has sha256 {actual}, expected {expected}"
+                )
+            if expected is None:
+                print(f"Artifact '{name}' is not pinned in the manifest; downloaded sha256 {actual}")
+
+            final_path = self._cache_path(name, entry, actual)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+            return final_path
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ---------------------------------------------
+    # Loading
+    # ---------------------------------------------
+    def load(self, name):
+        """
+        Load an artifact straight from disk according to its manifest format.
+
+        joblib pickles and .npy arrays are memory-mapped read-only, so
+        numpy buffers are shared through the page cache instead of copied.
+        """
+        entry = self.entry(name)
+        path = self.path(name)
+        fmt = entry.get("format", "file")
+        if fmt == "joblib":
+            import joblib
+            return joblib.load(path, mmap_mode="r")
+        if fmt == "npy":
+            import numpy as np
+            return np.load(path, mmap_mode="r")
+        return path
+
+
+def pin_manifest(manifest_path=DEFAULT_MANIFEST):
+    """
+    Record the sha256 of every locally available model artifact in the manifest.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    local_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for name, entry in manifest["artifacts"].items():
+        # Plain files such as the recipes DB are rewritten by ingestion
+        if entry.get("format", "file") == "file":
+            continue
+        local_path = os.path.normpath(os.path.join(local_dir, entry.get("local_path", entry["filename"])))
+        if os.path.exists(local_path):
+            entry["sha256"] = sha256_file(local_path)
+            print(f"{name}: {entry['sha256']}")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the PantryPalette model artifact cache.")
+    parser.add_argument("command", choices=["fetch", "pin", "list"])
+    parser.add_argument("names", nargs="*", help="artifacts to fetch or list (default: all)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--offline", action="store_true", default=None)
+    parser.add_argument("--allow-unpinned", action="store_true", default=None,
+                        help="download artifacts without a sha256 in the manifest")
+    args = parser.parse_args()
+
+    if args.command == "pin":
+        pin_manifest(args.manifest)
+    else:
+        store = ArtifactStore(args.manifest, cache_dir=args.cache_dir, offline=args.offline,
+                              allow_unpinned=args.allow_unpinned)
+        for name, (version, sha256) in store.versions().items():
+            if args.names and name not in args.names:
+                continue
+            if args.command == "fetch":
+                print(f"{name} v{version}: {store.path(name)}")
+            else:
+                print(f"{name} v{version}: {sha256 or 'unpinned'}")
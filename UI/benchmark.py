@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# benchmark.py
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def git_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=UI_DIR, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def time_stage(func, inputs, repeat=1):
+    """
+    Call func on every input and summarize the per-call latencies.
+    """
+    from search_service import percentiles
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            call_start = time.perf_counter()
+            func(item)
+            latencies.append(1000 * (time.perf_counter() - call_start))
+    elapsed = time.perf_counter() - start
+    summary = percentiles(latencies)
+    summary["throughput_per_s"] = round(len(latencies) / elapsed, 1) if elapsed else None
+    summary["peak_rss_mb"] = peak_rss_mb()
+    return summary
+
+
+def run_benchmark(corpus_dir, n_queries=200, k=10, seed=1):
+    """
+    Time every search stage against a synthetic corpus directory.
+
+    Stages run on the same generated queries; the result cache is
+    disabled so end-to-end numbers measure real work. Nothing is
+    downloaded: the store is opened offline on the corpus manifest.
+    """
+    from artifact_store import ArtifactStore
+    from ingredient_index import search_overlap, user_terms
+    from recipe_db import connect_readonly, fetch_recipes_by_ids
+    from recipe_model import get_normalizer, preprocess_ingredients, preprocess_user_ingredients
+    from result_cache import ResultCache
+    from search_service import SearchBackend
+    from synthetic_corpus import generate_queries
+
+    store = ArtifactStore(os.path.join(corpus_dir, "models", "manifest.json"), offline=True)
+    load_start = time.perf_counter()
+    get_normalizer()
+    backend = SearchBackend(store)
+    backend.cache = ResultCache(max_entries=0)
+    load_ms = round(1000 * (time.perf_counter() - load_start), 1)
+
+    conn = connect_readonly(backend.db_path)
+    n_recipes = conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+    sample_ids = np.random.default_rng(seed).choice(n_recipes, size=min(n_queries, n_recipes), replace=False) + 1
+    corpus_sample = [row[2] for row in fetch_recipes_by_ids(conn, sample_ids.tolist())]
+
+    with open(os.path.join(corpus_dir, "corpus.json")) as f:
+        params = json.load(f)
+    queries = generate_queries(n_queries, params["vocab_size"], seed=seed)
+    canonicals = [preprocess_user_ingredients(query) for query in queries]
+    vectors = [backend.vectorizer.transform([canonical]) for canonical in canonicals]
+    neighbor_ids = [backend.recipe_ids[backend.engine.kneighbors(vector, n_neighbors=k, return_distance=False)[0]]
+                    for vector in vectors]
+
+    stages = {
+        "preprocess_corpus": time_stage(preprocess_ingredients, corpus_sample),
+        "preprocess_query": time_stage(preprocess_user_ingredients, queries),
+        "vectorize": time_stage(lambda canonical: backend.vectorizer.transform([canonical]), canonicals),
+        "knn": time_stage(lambda vector: backend.engine.kneighbors(vector, n_neighbors=k), vectors),
+        "db_fetch": time_stage(lambda ids: fetch_recipes_by_ids(conn, ids.tolist()), neighbor_ids),
+        "overlap_scoring": time_stage(lambda query: search_overlap(conn, user_terms(query), limit=k), queries),
+        "end_to_end_overlap": time_stage(lambda query: backend.overlap(query, limit=k), queries),
+        "end_to_end_similar": time_stage(lambda query: backend.similar_batch([(query, k)]), queries),
+    }
+    pantry_dir = os.path.join(corpus_dir, "pantry")
+    if os.path.isdir(pantry_dir):
+        from ingredient_index import query_terms
+        from pantry_index import PantryIndex
+
+        pantry = PantryIndex(pantry_dir)
+        pantry_terms = [query_terms([ing for ing in canonical.split(", ") if ing]) for canonical in canonicals]
+        stages["pantry_search"] = time_stage(lambda terms: pantry.search(terms, limit=k), pantry_terms)
+    suggest_dir = os.path.join(corpus_dir, "suggest")
+    if os.path.isdir(suggest_dir):
+        from ingredient_suggest import IngredientSuggester
+
+        suggester = IngredientSuggester(suggest_dir)
+        # Every keystroke of every query ingredient, and the canonical queries with a typo each
+        prefixes = [ing[:n] for query in queries for ing in query.split(", ") for n in range(1, len(ing) + 1)]
+        misspelled = [canonical[:-2] + canonical[-2:][::-1] if len(canonical) > 1 else canonical
+                      for canonical in canonicals]
+        stages["suggest_complete"] = time_stage(suggester.complete, prefixes)
+        stages["suggest_correct"] = time_stage(suggester.correct_canonical, misspelled)
+    conn.close()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": {"dir": os.path.abspath(corpus_dir), "recipes": n_recipes,
+                   "vocab_size": params["vocab_size"], "features": backend.engine.n_features_in_},
+        "queries": n_queries,
+        "k": k,
+        "load_ms": load_ms,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# ---------------------------------------------
+# DB Concurrency
+# ---------------------------------------------
+def db_concurrency(db_path, thread_counts=(1, 2, 4, 8), duration=2.0, n_queries=200, seed=1):
+    """
+    Throughput of pooled read connections as the number of threads grows.
+
+    Each thread keeps its own pooled connection and runs, for duration
+    seconds, either a 10-row primary-key fetch or an overlap query.
+    A single-threaded connect-per-query baseline is reported for comparison.
+    """
+    from ingredient_index import search_overlap
+    from recipe_db import ConnectionPool, connect_readonly, fetch_recipes_by_ids
+    from synthetic_corpus import generate_queries
+
+    conn = connect_readonly(db_path)
+    n_recipes = conn.execute("SELECT MAX(rowid) FROM recipes").fetchone()[0]
+    conn.close()
+    rng = np.random.default_rng(seed)
+    id_batches = [rng.integers(1, n_recipes + 1, size=10).tolist() for _ in range(n_queries)]
+    ingredient_lists = [query.split(", ") for query in generate_queries(n_queries, seed=seed)]
+    workloads = {
+        "fetch": (lambda conn, i: fetch_recipes_by_ids(conn, id_batches[i % n_queries])),
+        "overlap": (lambda conn, i: search_overlap(conn, ingredient_lists[i % n_queries], limit=10)),
+    }
+
+    def run(workload, threads, connect):
+        counts = [0] * threads
+        deadline = time.perf_counter() + duration
+
+        def worker(slot):
+            conn = connect()
+            i = slot
+            while time.perf_counter() < deadline:
+                workload(conn, i)
+                i += threads
+                counts[slot] += 1
+
+        workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return sum(counts) / duration
+
+    results = {}
+    for name, workload in workloads.items():
+        def fresh_connection(conn, i, workload=workload):
+            conn = connect_readonly(db_path)
+            try:
+                return workload(conn, i)
+            finally:
+                conn.close()
+
+        baseline = run(fresh_connection, 1, lambda: None)
+        scaling = []
+        for threads in thread_counts:
+            pool = ConnectionPool(db_path, max_size=threads)
+            qps = run(workload, threads, pool.thread_connection)
+            pool.close()
+            scaling.append({"threads": threads, "qps": round(qps, 1)})
+        for entry in scaling:
+            entry["speedup"] = round(entry["qps"] / scaling[0]["qps"], 2)
+        results[name] = {"connect_per_query_qps": round(baseline, 1), "pooled": scaling}
+    return results
+
+
+# ---------------------------------------------
+# Sharded Search Scaling
+# ---------------------------------------------
+def shard_scaling(corpus_dir, worker_counts=(1, 2, 4, 8), n_shards=None, n_queries=200, k=10, batch_size=16, seed=1):
+    """
+    Latency and throughput of the sharded similarity search as workers grow.
+
+    Every worker count is checked against the unsharded engine (the
+    neighbors must be identical) and timed on single queries and on
+    batches of batch_size queries. Shards default to the worker count.
+    The corpus store is built next to the models if it does not exist.
+    """
+    from artifact_store import ArtifactStore
+    from corpus_store import CorpusStore, build_corpus_store
+    from recipe_model import preprocess_user_ingredients
+    from sharded_search import ShardedIndex
+    from synthetic_corpus import generate_queries
+
+    store = ArtifactStore(os.path.join(corpus_dir, "models", "manifest.json"), offline=True)
+    corpus_path = os.path.join(corpus_dir, "models", "corpus")
+    if not os.path.exists(os.path.join(corpus_path, "meta.json")):
+        build_corpus_store(corpus_path, store=store)
+
+    with open(os.path.join(corpus_dir, "corpus.json")) as f:
+        params = json.load(f)
+    vectorizer = store.load("tfidf_vectorizer")
+    queries = vectorizer.transform([preprocess_user_ingredients(query)
+                                    for query in generate_queries(n_queries, params["vocab_size"], seed=seed)])
+    single = [queries[i] for i in range(n_queries)]
+    batches = [queries[start:start + batch_size] for start in range(0, n_queries, batch_size)]
+
+    engine = CorpusStore(corpus_path).engine()
+    expected = engine.kneighbors(queries, n_neighbors=k)
+
+    def measure(index):
+        query = time_stage(lambda vector: index.kneighbors(vector, n_neighbors=k), single)
+        batch = time_stage(lambda block: index.kneighbors(block, n_neighbors=k), batches)
+        return {"query_p50_ms": query["p50_ms"], "query_p95_ms": query["p95_ms"],
+                "batch_qps": round(batch["throughput_per_s"] * batch_size, 1)}
+
+    results = {"unsharded": measure(engine), "sharded": []}
+    for workers in worker_counts:
+        index = ShardedIndex(corpus_path, n_shards or workers, workers)
+        index.warm_up()
+        found = index.kneighbors(queries, n_neighbors=k)
+        entry = {"workers": workers, "shards": index.n_shards,
+                 "identical": all(np.array_equal(a, b) for a, b in zip(expected, found))}
+        entry.update(measure(index))
+        index.close()
+        results["sharded"].append(entry)
+    return results
+
+
+# ---------------------------------------------
+# Dense Embedding Backend
+# ---------------------------------------------
+def dense_backend(corpus_dir, component_counts=(64, 128, 256), n_queries=200, k=10, seed=1):
+    """
+    Memory, throughput and recall@k of the dense backend against exact search.
+
+    A float32 and an int8 index are built for every component count
+    under models/dense-<components>[-int8] of the corpus directory.
+    """
+    from artifact_store import ArtifactStore
+    from corpus_store import CorpusStore, build_corpus_store
+    from dense_embedding import DenseCosineIndex, build_dense_index, dense_report
+    from recipe_model import preprocess_user_ingredients
+    from synthetic_corpus import generate_queries
+
+    store = ArtifactStore(os.path.join(corpus_dir, "models", "manifest.json"), offline=True)
+    corpus_path = os.path.join(corpus_dir, "models", "corpus")
+    if not os.path.exists(os.path.join(corpus_path, "meta.json")):
+        build_corpus_store(corpus_path, store=store)
+
+    with open(os.path.join(corpus_dir, "corpus.json")) as f:
+        params = json.load(f)
+    queries = store.load("tfidf_vectorizer").transform([
+        preprocess_user_ingredients(query) for query in generate_queries(n_queries, params["vocab_size"], seed=seed)
+    ])
+
+    corpus = CorpusStore(corpus_path)
+    engine = corpus.engine()
+    results = []
+    for components in component_counts:
+        for quantize in (False, True):
+            out_dir = os.path.join(corpus_dir, "models", f"dense-{components}" + ("-int8" if quantize else ""))
+            start = time.perf_counter()
+            build_dense_index(engine.matrix, corpus.recipe_ids, out_dir, components, quantize, normalized=True,
+                              model_version=store.versions()["tfidf_vectorizer"])
+            report = dense_report(engine, DenseCosineIndex(out_dir), queries, k=k)
+            report["build_s"] = round(time.perf_counter() - start, 2)
+            results.append(report)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PantryPalette search stages on a synthetic corpus.")
+    parser.add_argument("corpus_dir", help="directory written by synthetic_corpus.py")
+    parser.add_argument("--generate", type=int, metavar="ROWS", help="generate a corpus of ROWS recipes first")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db-threads", type=int, nargs="+", metavar="N",
+                        help="also measure pooled DB throughput with these thread counts")
+    parser.add_argument("--shard-workers", type=int, nargs="+", metavar="N",
+                        help="also measure sharded similarity search with these worker counts")
+    parser.add_argument("--shards", type=int, help="shards for --shard-workers (default: one per worker)")
+    parser.add_argument("--dense-components", type=int, nargs="+", metavar="N",
+                        help="also measure the dense embedding backend with these component counts")
+    parser.add_argument("--json", help="write the results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.generate:
+        from synthetic_corpus import build_corpus
+        build_corpus(args.corpus_dir, args.generate)
+
+    result = run_benchmark(args.corpus_dir, args.queries, args.k, args.seed)
+    print(f"{result['corpus']['recipes']} recipes, {args.queries} queries, k={args.k}, load {result['load_ms']} ms")
+    for stage, summary in result["stages"].items():
+        print(f"{stage:<20} p50 {summary['p50_ms']:8.3f} ms  p95 {summary['p95_ms']:8.3f} ms  "
+              f"p99 {summary['p99_ms']:8.3f} ms  {summary['throughput_per_s']:>10}/s")
+    print(f"Peak RSS: {result['peak_rss_mb']} MiB")
+
+    if args.db_threads:
+        result["db_concurrency"] = db_concurrency(os.path.join(args.corpus_dir, "recipes.db"), args.db_threads)
+        for name, report in result["db_concurrency"].items():
+            print(f"{name}: connect-per-query {report['connect_per_query_qps']}/s, pooled " + ", ".join(
+                f"{entry['threads']}t {entry['qps']}/s (x{entry['speedup']})" for entry in report["pooled"]))
+
+    if args.shard_workers:
+        result["shard_scaling"] = shard_scaling(args.corpus_dir, args.shard_workers, args.shards, args.queries, args.k)
+        unsharded = result["shard_scaling"]["unsharded"]
+        print(f"unsharded: query p50 {unsharded['query_p50_ms']} ms, batch {unsharded['batch_qps']}/s")
+        for entry in result["shard_scaling"]["sharded"]:
+            print(f"{entry['workers']} workers / {entry['shards']} shards: query p50 {entry['query_p50_ms']} ms, "
+                  f"batch {entry['batch_qps']}/s, identical={entry['identical']}")
+
+    if args.dense_components:
+        result["dense_backend"] = dense_backend(args.corpus_dir, args.dense_components, args.queries, args.k)
+        for report in result["dense_backend"]:
+            print(f"dense {report['components']}{' int8' if report['quantized'] else ''}: "
+                  f"recall@{report['k']} {report['recall_at_k']:.3f}, {report['dense_mb']} MiB "
+                  f"(exact {report['exact_mb']} MiB), batch {report['dense_batch_qps']}/s "
+                  f"(exact {report['exact_batch_qps']}/s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# corpus_store.py
+import argparse
+import json
+import os
+from array import array
+
+import numpy as np
+import scipy.sparse as sp
+
+from similarity_engine import SparseCosineIndex, l2_normalize
+
+FORMAT_VERSION = 1
+TEXT_COLUMNS = ["title", "ingredients", "instructions"]
+
+
+def _open_array(path, dtype):
+    """
+    Memory-map a raw array file read-only (np.memmap rejects empty files).
+    """
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+# ---------------------------------------------
+# Writer
+# ---------------------------------------------
+def write_corpus_store(out_dir, rows, recipe_vectors, recipe_ids):
+    """
+    Write a columnar corpus store for the rows the similarity model was fitted on.
+
+    rows yields (title, ingredients, instructions, ingredients_clean) in
+    model row order and is consumed once, so a 2M-row corpus streams
+    straight to disk. Text columns become a UTF-8 byte file plus int64
+    offsets, ingredients_clean becomes int32 phrase ids (sorted phrases,
+    so joining them reproduces the string), and the TF-IDF CSR arrays,
+    L2-normalized as the similarity engine scores them, are saved as .npy
+    files next to them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    text_files = {column: open(os.path.join(out_dir, f"{column}.bytes"), "wb") for column in TEXT_COLUMNS}
+    text_offsets = {column: array("q", [0]) for column in TEXT_COLUMNS}
+    token_ids, token_offsets = array("i"), array("q", [0])
+    vocabulary = {}
+
+    n_rows = 0
+    try:
+        for row in rows:
+            for column, value in zip(TEXT_COLUMNS, row[:3]):
+                data = (value if isinstance(value, str) else str(value)).encode("utf-8")
+                text_files[column].write(data)
+                text_offsets[column].append(text_offsets[column][-1] + len(data))
+            for phrase in (row[3] or "").split(", "):
+                if phrase:
+                    token_ids.append(vocabulary.setdefault(phrase, len(vocabulary)))
+            token_offsets.append(len(token_ids))
+            n_rows += 1
+    finally:
+        for f in text_files.values():
+            f.close()
+
+    for column in TEXT_COLUMNS:
+        np.save(os.path.join(out_dir, f"{column}.offsets.npy"), np.frombuffer(text_offsets[column], dtype=np.int64))
+    np.frombuffer(token_ids, dtype=np.int32).tofile(os.path.join(out_dir, "ingredients_clean.ids"))
+    np.save(os.path.join(out_dir, "ingredients_clean.offsets.npy"), np.frombuffer(token_offsets, dtype=np.int64))
+    with open(os.path.join(out_dir, "vocabulary.json"), "w") as f:
+        json.dump(sorted(vocabulary, key=vocabulary.get), f)
+
+    matrix = l2_normalize(recipe_vectors)
+    if matrix.shape[0] != n_rows or len(recipe_ids) != n_rows:
+        raise ValueError(
+            f"{n_rows} rows but {matrix.shape[0]} TF-IDF rows and {len(recipe_ids)} recipe ids"
+        )
+    matrix.sort_indices()
+    np.save(os.path.join(out_dir, "tfidf.data.npy"), matrix.data)
+    # scipy keeps int32 index arrays as-is (no copy) whenever nnz fits
+    index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+    np.save(os.path.join(out_dir, "tfidf.indices.npy"), matrix.indices.astype(index_dtype))
+    np.save(os.path.join(out_dir, "tfidf.indptr.npy"), matrix.indptr.astype(index_dtype))
+    np.save(os.path.join(out_dir, "recipe_ids.npy"), np.asarray(recipe_ids, dtype=np.int64))
+
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"format_version": FORMAT_VERSION, "rows": n_rows, "tfidf_shape": list(matrix.shape),
+                   "vocabulary_size": len(vocabulary)}, f, indent=2)
+    return n_rows
+
+
+# ---------------------------------------------
+# Reader
+# ---------------------------------------------
+class CorpusStore:
+    """
+    Read-only, memory-mapped view of a corpus written by write_corpus_store.
+
+    Every array is mapped, not loaded, so worker processes opening the
+    same directory share one copy in the page cache. Row i is the
+    similarity model's row i; lookups slice the mapped buffers and only
+    decode the requested row.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus store format {self.meta['format_version']} in {path}")
+
+        self.columns = TEXT_COLUMNS + ["ingredients_clean"]
+        self._bytes = {column: _open_array(os.path.join(path, f"{column}.bytes"), np.uint8) for column in TEXT_COLUMNS}
+        self._offsets = {column: self._load(f"{column}.offsets.npy") for column in TEXT_COLUMNS}
+        self.token_ids = _open_array(os.path.join(path, "ingredients_clean.ids"), np.int32)
+        self.token_offsets = self._load("ingredients_clean.offsets.npy")
+        with open(os.path.join(path, "vocabulary.json")) as f:
+            self.vocabulary = json.load(f)
+        self.recipe_ids = self._load("recipe_ids.npy")
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode="r")
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def raw(self, column, i):
+        """
+        Zero-copy memoryview of one text cell's UTF-8 bytes.
+        """
+        offsets = self._offsets[column]
+        return memoryview(self._bytes[column])[offsets[i]:offsets[i + 1]]
+
+    def text(self, column, i):
+        return bytes(self.raw(column, i)).decode("utf-8")
+
+    def ingredient_ids(self, i):
+        return self.token_ids[self.token_offsets[i]:self.token_offsets[i + 1]]
+
+    def ingredients_clean(self, i):
+        return ", ".join(self.vocabulary[token] for token in self.ingredient_ids(i))
+
+    def row(self, i):
+        """
+        Row i as a dict with the DataFrame's column names.
+        """
+        record = {column: self.text(column, i) for column in TEXT_COLUMNS}
+        record["ingredients_clean"] = self.ingredients_clean(i)
+        return record
+
+    def tfidf_matrix(self):
+        """
+        The L2-normalized TF-IDF CSR matrix backed by the mapped arrays (no copy).
+        """
+        return sp.csr_matrix(
+            (self._load("tfidf.data.npy"), self._load("tfidf.indices.npy"), self._load("tfidf.indptr.npy")),
+            shape=tuple(self.meta["tfidf_shape"]), copy=False
+        )
+
+    def engine(self, n_neighbors=10):
+        """
+        Exact cosine engine over the stored matrix, sharing its mapped pages.
+        """
+        return SparseCosineIndex(self.tfidf_matrix(), n_neighbors=n_neighbors, normalized=True)
+
+
+# ---------------------------------------------
+# Build from the Notebook / App Artifacts
+# ---------------------------------------------
+def rows_from_pickle(pickle_path, recipe_ids):
+    """
+    Model rows from the notebook's pickled df_combined (recipes.rowid = position + 1).
+    """
+    import pandas as pd
+
+    df = pd.read_pickle(pickle_path)
+    fitted = df.iloc[np.asarray(recipe_ids) - 1]
+    for title, ingredients, instructions, ingredients_clean in zip(
+            fitted["title"], fitted["ingredients"], fitted["instructions"], fitted["ingredients_clean"]):
+        yield title, ingredients, instructions, ingredients_clean
+
+
+def rows_from_db(db_path, recipe_ids, batch_size=10000):
+    """
+    Model rows fetched from the recipes DB, cleaning ingredients on the way.
+    """
+    from recipe_db import connect_readonly, fetch_recipes_by_ids
+    from recipe_model import preprocess_ingredients
+
+    conn = connect_readonly(db_path)
+    try:
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = [int(recipe_id) for recipe_id in recipe_ids[start:start + batch_size]]
+            rows = fetch_recipes_by_ids(conn, batch)
+            if len(rows) != len(batch):
+                raise RuntimeError(f"{len(batch) - len(rows)} fitted recipes are missing from {db_path}")
+            for _, title, ingredients, instructions in rows:
+                yield title, ingredients, instructions, preprocess_ingredients(ingredients)
+    finally:
+        conn.close()
+
+
+def build_corpus_store(out_dir, pickle_path=None, store=None):
+    """
+    Build the corpus store from the app's artifacts (and the notebook pickle if given).
+    """
+    from artifact_store import ArtifactStore
+    from recipe_db import load_model_recipe_ids
+
+    store = store or ArtifactStore()
+    matrix = store.load("nearest_neighbors_model")._fit_X
+    recipe_ids = np.asarray(load_model_recipe_ids(store, matrix.shape[0]))
+    if pickle_path:
+        rows = rows_from_pickle(pickle_path, recipe_ids)
+    else:
+        rows = rows_from_db(store.path("recipes_db"), recipe_ids)
+    return write_corpus_store(out_dir, rows, matrix, recipe_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped corpus store from the model artifacts.")
+    parser.add_argument("out_dir", nargs="?", default=os.path.join("models", "corpus"))
+    parser.add_argument("--pickle", help="notebook recipes.pkl with an ingredients_clean column (skips re-cleaning)")
+    args = parser.parse_args()
+
+    n_rows = build_corpus_store(args.out_dir, args.pickle)
+    print(f"Wrote {n_rows} rows to {args.out_dir}")
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# dense_embedding.py
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from similarity_engine import QUERY_BATCH_SIZE, l2_normalize, top_k
+
+FORMAT_VERSION = 1
+DEFAULT_COMPONENTS = 128
+# The SVD is fitted on a row sample: its randomized range finder holds a
+# dense (rows x components) float64 block, too large for a 2M-row corpus
+FIT_SAMPLE = 200000
+# Rows projected / dequantized per block
+ROW_BLOCK = 1 << 16
+
+
+def _normalize_rows(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return embeddings / norms
+
+
+# ---------------------------------------------
+# Build
+# ---------------------------------------------
+def build_dense_index(recipe_vectors, recipe_ids, out_dir, n_components=DEFAULT_COMPONENTS, quantize=False,
+                      normalized=False, seed=0, model_version=None):
+    """
+    Project the TF-IDF recipe vectors to unit-length dense embeddings with truncated SVD.
+
+    The SVD is fitted on up to FIT_SAMPLE L2-normalized rows; every row is
+    then projected in ROW_BLOCK blocks and re-normalized, so a dot product
+    is the cosine in the reduced space. Embeddings are one contiguous
+    (rows, n_components) float32 array, or with quantize int8 codes plus
+    a float32 scale per row (max |value| / 127). Components are kept to
+    project queries. model_version, the (version, sha256) of the
+    tfidf_vectorizer artifact the vectors come from, is recorded for
+    DenseCosineIndex.check_model.
+    """
+    from sklearn.decomposition import TruncatedSVD
+
+    matrix = l2_normalize(recipe_vectors) if not normalized else recipe_vectors
+    n_rows, n_features = matrix.shape
+    if len(recipe_ids) != n_rows:
+        raise ValueError(f"{n_rows} TF-IDF rows but {len(recipe_ids)} recipe ids")
+    n_components = min(n_components, n_features - 1)
+
+    sample = np.arange(n_rows)
+    if n_rows > FIT_SAMPLE:
+        sample = np.sort(np.random.default_rng(seed).choice(n_rows, FIT_SAMPLE, replace=False))
+    svd = TruncatedSVD(n_components=n_components, random_state=seed).fit(matrix[sample])
+    components = np.ascontiguousarray(svd.components_, dtype=np.float32)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "components.npy"), components)
+    np.save(os.path.join(out_dir, "recipe_ids.npy"), np.asarray(recipe_ids, dtype=np.int64))
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(out_dir, "embeddings.npy"), mode="w+",
+        dtype=np.int8 if quantize else np.float32, shape=(n_rows, n_components)
+    )
+    scales = np.empty(n_rows, dtype=np.float32) if quantize else None
+    for start in range(0, n_rows, ROW_BLOCK):
+        stop = min(start + ROW_BLOCK, n_rows)
+        block = _normalize_rows(matrix[start:stop].astype(np.float32) @ components.T)
+        if quantize:
+            scale = np.abs(block).max(axis=1) / 127
+            scale[scale == 0.0] = 1.0
+            embeddings[start:stop] = np.rint(block / scale[:, np.newaxis])
+            scales[start:stop] = scale
+        else:
+            embeddings[start:stop] = block
+    embeddings.flush()
+    del embeddings
+    if quantize:
+        np.save(os.path.join(out_dir, "scales.npy"), scales)
+
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"format_version": FORMAT_VERSION, "rows": n_rows, "features": n_features,
+                   "components": n_components, "quantized": quantize, "fit_rows": len(sample),
+                   "model_version": list(model_version) if model_version else None,
+                   "explained_variance": float(svd.explained_variance_ratio_.sum())}, f, indent=2)
+    return n_rows
+
+
+# ---------------------------------------------
+# Search
+# ---------------------------------------------
+class DenseCosineIndex:
+    """
+    Cosine top-k over the dense embeddings written by build_dense_index.
+
+    Drop-in replacement for SparseCosineIndex that takes the same TF-IDF
+    query rows: queries are projected with the SVD components and a
+    block of QUERY_BATCH_SIZE queries is scored against every recipe
+    with one float32 BLAS matrix multiply (quantized embeddings are
+    dequantized ROW_BLOCK rows at a time). Results are approximate; see
+    dense_report for the recall against the exact engine. Arrays are
+    memory-mapped.
+    """
+
+    def __init__(self, path, n_neighbors=10):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dense index format {self.meta['format_version']} in {path}")
+
+        self.components = np.load(os.path.join(path, "components.npy"))
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.meta["quantized"] else None
+        self.recipe_ids = np.load(os.path.join(path, "recipe_ids.npy"), mmap_mode="r")
+        self.n_neighbors = n_neighbors
+        self.n_samples_fit_ = self.meta["rows"]
+        self.n_features_in_ = self.meta["features"]
+
+    def check_model(self, vectorizer, model_version):
+        """
+        Raise RuntimeError unless the index was built in the TF-IDF space of this vectorizer.
+
+        model_version is the (version, sha256) of the loaded tfidf_vectorizer artifact.
+        """
+        if self.n_features_in_ != len(vectorizer.vocabulary_):
+            raise RuntimeError(f"Dense index {self.path} was built on {self.n_features_in_} TF-IDF features, "
+                               f"the vectorizer has {len(vectorizer.vocabulary_)}")
+        built_from = self.meta.get("model_version")
+        if built_from is None or tuple(built_from) != tuple(model_version):
+            raise RuntimeError(f"Dense index {self.path} was built from tfidf_vectorizer {built_from}, "
+                               f"the manifest pins {list(model_version)}; rebuild it")
+
+    @property
+    def nbytes(self):
+        """
+        Bytes of the arrays scored per query (embeddings, scales, components).
+        """
+        total = self.embeddings.nbytes + self.components.nbytes
+        return total + (self.scales.nbytes if self.scales is not None else 0)
+
+    def project(self, query_vectors):
+        """
+        Unit-length float32 embeddings of TF-IDF query rows, shape (n_queries, components).
+        """
+        queries = l2_normalize(query_vectors).astype(np.float32)
+        return _normalize_rows(np.asarray(queries @ self.components.T))
+
+    def scores(self, query_vectors):
+        """
+        Cosine similarity of every query row against every recipe, shape (n_queries, n_recipes).
+        """
+        queries = self.project(query_vectors).T
+        if self.scales is None:
+            return (self.embeddings @ queries).T
+        scores = np.empty((self.n_samples_fit_, queries.shape[1]), dtype=np.float32)
+        for start in range(0, self.n_samples_fit_, ROW_BLOCK):
+            stop = min(start + ROW_BLOCK, self.n_samples_fit_)
+            np.matmul(self.embeddings[start:stop].astype(np.float32), queries, out=scores[start:stop])
+            scores[start:stop] *= self.scales[start:stop, np.newaxis]
+        return scores.T
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        """
+        Same contract as SparseCosineIndex.kneighbors.
+        """
+        import scipy.sparse as sp
+
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_)
+        X = sp.csr_matrix(X)
+        n_queries = X.shape[0]
+        distances = np.empty((n_queries, k), dtype=np.float64)
+        indices = np.empty((n_queries, k), dtype=np.int64)
+
+        for start in range(0, n_queries, QUERY_BATCH_SIZE):
+            block = self.scores(X[start:start + QUERY_BATCH_SIZE])
+            for offset, row in enumerate(block):
+                top = top_k(row, k)
+                indices[start + offset] = top
+                distances[start + offset] = np.clip(1.0 - row[top], 0.0, 2.0)
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+
+# ---------------------------------------------
+# Memory / Throughput / Recall Report
+# ---------------------------------------------
+def dense_report(exact, dense, query_vectors, k=10):
+    """
+    Compare a DenseCosineIndex against the exact sparse engine.
+
+    Adds to approximate_search.recall_report (recall@k, per-query
+    latency) the bytes each backend scores against and the throughput
+    of scoring all queries as one batch.
+    """
+    from approximate_search import recall_report
+
+    report = recall_report(exact, dense, query_vectors, k=k)
+    report["dense_ms"] = report.pop("approximate_ms")
+
+    for name, index in (("exact", exact), ("dense", dense)):
+        start = time.perf_counter()
+        index.kneighbors(query_vectors, n_neighbors=k, return_distance=False)
+        elapsed = time.perf_counter() - start
+        report[f"{name}_batch_qps"] = round(query_vectors.shape[0] / elapsed, 1) if elapsed else None
+
+    matrix = exact.matrix
+    report["exact_mb"] = round((matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1 << 20), 1)
+    report["dense_mb"] = round(dense.nbytes / (1 << 20), 1)
+    report["components"] = dense.meta["components"]
+    report["quantized"] = dense.meta["quantized"]
+    return report
+
+
+def default_dense_dir(store=None):
+    """
+    PANTRYPALETTE_DENSE_INDEX, or the dense/ directory next to the artifact manifest.
+    """
+    from artifact_store import ArtifactStore
+
+    store = store or ArtifactStore()
+    return os.environ.get("PANTRYPALETTE_DENSE_INDEX", os.path.join(store.local_dir, "dense"))
+
+
+def _load_source(corpus_path):
+    """
+    (recipe matrix, recipe ids, normalized, vectorizer version) from a corpus store or the artifact store.
+
+    A corpus store is built from the artifact store's model, so both
+    report the tfidf_vectorizer version of the manifest.
+    """
+    from artifact_store import ArtifactStore
+    from recipe_db import load_model_recipe_ids
+
+    store = ArtifactStore()
+    model_version = store.versions()["tfidf_vectorizer"]
+    if corpus_path:
+        from corpus_store import CorpusStore
+
+        corpus = CorpusStore(corpus_path)
+        return corpus.tfidf_matrix(), corpus.recipe_ids, True, model_version
+    matrix = store.load("nearest_neighbors_model")._fit_X
+    return matrix, load_model_recipe_ids(store, matrix.shape[0]), False, model_version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or evaluate the dense (truncated SVD) similarity index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="project the TF-IDF matrix and write the dense index")
+    build.add_argument("out_dir", nargs="?", help="default: dense/ next to the artifact manifest")
+    build.add_argument("--corpus-store", help="read the matrix from this corpus store instead of the model")
+    build.add_argument("--components", type=int, default=DEFAULT_COMPONENTS)
+    build.add_argument("--int8", action="store_true", help="store int8 codes plus a per-recipe scale")
+
+    report = commands.add_parser("report", help="memory, throughput and recall@k against exact search")
+    report.add_argument("dense_dir", nargs="?", help="default: dense/ next to the artifact manifest")
+    report.add_argument("--corpus-store", help="read the matrix from this corpus store instead of the model")
+    report.add_argument("--queries-csv", help="held-out recipes with an 'ingredients' column (default: sampled recipes)")
+    report.add_argument("--limit", type=int, default=1000, help="number of queries to use")
+    report.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    matrix, recipe_ids, normalized, model_version = _load_source(args.corpus_store)
+    if args.command == "build":
+        out_dir = args.out_dir or default_dense_dir()
+        n_rows = build_dense_index(matrix, recipe_ids, out_dir, args.components, args.int8, normalized,
+                                   model_version=model_version)
+        print(f"Wrote dense embeddings of {n_rows} recipes to {out_dir}")
+    else:
+        from similarity_engine import SparseCosineIndex
+
+        exact = SparseCosineIndex(matrix, normalized=normalized)
+        dense = DenseCosineIndex(args.dense_dir or default_dense_dir())
+        if args.queries_csv:
+            import pandas as pd
+
+            from artifact_store import ArtifactStore
+
+            queries = pd.read_csv(args.queries_csv, nrows=args.limit)["ingredients"].astype(str)
+            query_vectors = ArtifactStore().load("tfidf_vectorizer").transform(queries)
+        else:
+            rows = np.random.default_rng(0).choice(exact.n_samples_fit_, size=min(args.limit, exact.n_samples_fit_),
+                                                   replace=False)
+            query_vectors = exact.matrix[np.sort(rows)]
+        print(json.dumps(dense_report(exact, dense, query_vectors, k=args.k), indent=2))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# ingredient_index.py
+import argparse
+import re
+
+from recipe_db import connect_writer, execute
+from recipe_payloads import parse_list
+
+# ---------------------------------------------
+# Schema
+# ---------------------------------------------
+# ingredients        : one row per raw ingredient line, lowercased and
+#                      reduced to its words ("2 boneless chicken breasts")
+# ingredient_tokens  : token -> line postings ("chicken" -> "2 boneless chicken breasts")
+# recipe_ingredients : line -> recipe postings
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ingredients (
+        ingredient_id INTEGER PRIMARY KEY,
+        line TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ingredient_tokens (
+        token TEXT NOT NULL,
+        ingredient_id INTEGER NOT NULL,
+        PRIMARY KEY (token, ingredient_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS recipe_ingredients (
+        ingredient_id INTEGER NOT NULL,
+        recipe_id INTEGER NOT NULL,
+        PRIMARY KEY (ingredient_id, recipe_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe
+        ON recipe_ingredients (recipe_id);
+"""
+
+BATCH_SIZE = 10000
+
+
+def create_index_tables(conn):
+    """
+    Create the ingredient posting tables if they do not exist yet.
+    """
+    conn.executescript(SCHEMA)
+
+
+NON_LETTERS = re.compile(r"[^a-z]+")
+
+
+def index_line(text):
+    """
+    Lowercase text and reduce it to its words: "2 (8 oz.) Olive-Oil" -> "oz olive oil".
+    """
+    return " ".join(NON_LETTERS.sub(" ", str(text).lower()).split())
+
+
+def ingredient_lines(ingredients):
+    """
+    Return the indexed lines of a raw recipe ingredient list.
+
+    Every line is kept as written, only lowercased and reduced to its words
+    (no stopword, lemma or generic-word filtering), so "salt", "olive oil"
+    and "watermelon" stay searchable as they were with the original LIKE
+    scan.
+    """
+    if isinstance(ingredients, str) and not ingredients.strip().startswith("["):
+        lines = [ingredients]
+    else:
+        lines = ingredients if isinstance(ingredients, list) else parse_list(ingredients)
+    indexed = {index_line(line) for line in lines}
+    indexed.discard("")
+    return sorted(indexed)
+
+
+def _ingredient_id(cursor, line, cache):
+    ingredient_id = cache.get(line)
+    if ingredient_id is not None:
+        return ingredient_id
+
+    cursor.execute("INSERT OR IGNORE INTO ingredients (line) VALUES (?)", (line,))
+    cursor.execute("SELECT ingredient_id FROM ingredients WHERE line = ?", (line,))
+    ingredient_id = cursor.fetchone()[0]
+    cursor.executemany(
+        "INSERT OR IGNORE INTO ingredient_tokens (token, ingredient_id) VALUES (?, ?)",
+        [(token, ingredient_id) for token in set(line.split())]
+    )
+    cache[line] = ingredient_id
+    return ingredient_id
+
+
+def index_recipes(conn, recipes, cache=None):
+    """
+    Add (recipe_id, ingredients) pairs to the posting index.
+
+    Called by the ingestion writers right after a recipe row is inserted so
+    that new recipes are searchable by the overlap search immediately.
+    Existing postings of a re-indexed recipe are replaced.
+    """
+    cache = {} if cache is None else cache
+    cursor = conn.cursor()
+    postings = []
+    recipe_ids = []
+    for recipe_id, ingredients in recipes:
+        recipe_ids.append((recipe_id,))
+        for line in ingredient_lines(ingredients):
+            postings.append((_ingredient_id(cursor, line, cache), recipe_id))
+
+    cursor.executemany("DELETE FROM recipe_ingredients WHERE recipe_id = ?", recipe_ids)
+    cursor.executemany(
+        "INSERT OR IGNORE INTO recipe_ingredients (ingredient_id, recipe_id) VALUES (?, ?)",
+        postings
+    )
+
+
+def rebuild_index(db_path, batch_size=BATCH_SIZE):
+    """
+    Drop and rebuild the posting index of an existing recipes database.
+    """
+    conn = connect_writer(db_path)
+    try:
+        conn.executescript("""
+            DROP TABLE IF EXISTS recipe_ingredients;
+            DROP TABLE IF EXISTS ingredient_tokens;
+            DROP TABLE IF EXISTS ingredients;
+        """)
+        create_index_tables(conn)
+
+        cache = {}
+        indexed = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT rowid, ingredients FROM recipes WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            index_recipes(conn, rows, cache)
+            conn.commit()
+            indexed += len(rows)
+            last_id = rows[-1][0]
+            print(f"Indexed {indexed} recipes")
+        return indexed
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------
+# Overlap Search
+# ---------------------------------------------
+def user_terms(ingredients):
+    """
+    The terms of a comma-separated query as the original search took them.
+
+    Stripped and lowercased with empty and repeated terms dropped, then
+    sorted so the same set of terms always gives the same cache key (and
+    the same match-score denominator).
+    """
+    return sorted({term for term in (ing.strip().lower() for ing in ingredients.split(",")) if term})
+
+
+def query_terms(ingredient_list):
+    """
+    Reduce each user ingredient to the token set it must match.
+
+    A user ingredient matches a recipe when one of the recipe's lines
+    has, for each of its tokens, a word starting with that token. This
+    differs from the substring test of calculate_match_score in two ways:
+    word order is ignored ("breast chicken" matches "chicken breasts"),
+    and a token must start a word ("tomato" matches "tomatoes", but
+    "salt" does not match "unsalted").
+    """
+    return [sorted(set(index_line(ing).split())) for ing in ingredient_list]
+
+
+def search_overlap(conn, ingredient_list, limit=None):
+    """
+    Rank recipes by the number of user ingredients they contain.
+
+    Returns (recipe_id, matched_count) pairs ordered by matched_count
+    descending, then recipe_id. The match score used by the UI is
+    matched_count / len(ingredient_list), as in calculate_match_score.
+    """
+    rows = []
+    for slot, tokens in enumerate(query_terms(ingredient_list)):
+        rows.extend((slot, token, len(tokens)) for token in tokens)
+    if not rows:
+        return []
+
+    values = ", ".join(["(?, ?, ?)"] * len(rows))
+    params = [value for row in rows for value in row]
+    # Tokens are [a-z] only, so the words starting with a query token are
+    # the index range [token, token || '{') ('{' is char(123), right after 'z')
+    query = f"""
+        WITH query_tokens (slot, token, n_tokens) AS (VALUES {values}),
+        slot_lines AS (
+            SELECT q.slot, it.ingredient_id
+            FROM query_tokens q
+            JOIN ingredient_tokens it ON it.token >= q.token AND it.token < q.token || char(123)
+            GROUP BY q.slot, it.ingredient_id
+            HAVING COUNT(DISTINCT q.token) = MAX(q.n_tokens)
+        )
+        SELECT ri.recipe_id, COUNT(DISTINCT sp.slot) AS matched
+        FROM slot_lines sp
+        JOIN recipe_ingredients ri ON ri.ingredient_id = sp.ingredient_id
+        GROUP BY ri.recipe_id
+        ORDER BY matched DESC, ri.recipe_id
+    """
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    cursor = conn.cursor()
+    execute(cursor, query, params)
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the ingredient posting index of a recipes database.")
+    parser.add_argument("db_path", nargs="?", default="temp_recipes.db")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    total = rebuild_index(args.db_path, args.batch_size)
+    print(f"Ingredient index rebuilt for {total} recipes in {args.db_path}")
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# ingredient_suggest.py
+import argparse
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from normalization import GENERIC_WORDS, NON_ALPHA_PATTERN
+from recipe_db import connect_readonly
+
+FORMAT_VERSION = 1
+COMPLETION_LIMIT = 10
+# Completions of prefixes up to this length are precomputed: their ranges
+# of the prefix array are too long to rank per keystroke
+PRECOMPUTED_PREFIX = 2
+# Corrections: up to 2 edits (1 for tokens of 4 letters or fewer), none
+# below 3 letters; deletes are generated on the first PREFIX_LENGTH letters
+MAX_EDIT_DISTANCE = 2
+SHORT_TOKEN = 4
+MIN_CORRECT_LENGTH = 3
+PREFIX_LENGTH = 7
+
+
+def _one_edit_apart(a, b):
+    """
+    Whether two different strings are one insertion, deletion, substitution or transposition apart.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    if a[i + 1:] == b[i + 1:]:
+        return True
+    return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (an adjacent transposition is one edit).
+
+    Returns max_distance + 1 as soon as the distance is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+    if max_distance <= 1:
+        return 1 if max_distance == 1 and _one_edit_apart(a, b) else max_distance + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def deletes(word, max_distance):
+    """
+    word and every string obtained by deleting up to max_distance of its letters.
+    """
+    found = {word}
+    level = {word}
+    for _ in range(max_distance):
+        level = {variant[:i] + variant[i + 1:] for variant in level if len(variant) > 1 for i in range(len(variant))}
+        found |= level
+    return found
+
+
+# ---------------------------------------------
+# Build from the Ingredient Posting Index
+# ---------------------------------------------
+def build_suggest_index(db_path, out_dir, normalize=None):
+    """
+    Write the canonical ingredient phrases of a recipes DB with their recipe counts.
+
+    The posting index holds lowercased ingredient lines ("cups chopped
+    onions"); each is mapped with normalize (default: the cleaned phrase
+    of recipe_model's normalizer, what preprocess_user_ingredients
+    produces) and the recipe counts of lines with the same cleaned phrase
+    are summed. Phrases are sorted alphabetically; lines no recipe uses
+    any more, and lines that clean to nothing, are left out.
+    """
+    if normalize is None:
+        from recipe_model import get_normalizer
+
+        normalize = get_normalizer().normalize
+    conn = connect_readonly(db_path)
+    try:
+        lines = conn.execute("""
+            SELECT i.line, COUNT(*)
+            FROM ingredients i
+            JOIN recipe_ingredients ri ON ri.ingredient_id = i.ingredient_id
+            GROUP BY i.ingredient_id
+        """).fetchall()
+    finally:
+        conn.close()
+    counts = {}
+    for line, count in lines:
+        phrase = normalize(line)
+        if phrase:
+            counts[phrase] = counts.get(phrase, 0) + count
+    rows = sorted(counts.items())
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "phrases.json"), "w") as f:
+        json.dump([phrase for phrase, _ in rows], f)
+    np.save(os.path.join(out_dir, "counts.npy"), np.array([count for _, count in rows], dtype=np.int64))
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"format_version": FORMAT_VERSION, "phrases": len(rows)}, f, indent=2)
+    return len(rows)
+
+
+# ---------------------------------------------
+# Autocomplete and Correction
+# ---------------------------------------------
+class IngredientSuggester:
+    """
+    Ingredient autocomplete and typo correction over a directory written by build_suggest_index.
+
+    Completions come from a sorted prefix array holding every word-start
+    suffix of every phrase ("chicken breast", "breast" -> "chicken
+    breast"), so a prefix is one bisect; its phrases are ranked by recipe
+    count, precomputed for prefixes of up to PRECOMPUTED_PREFIX letters.
+
+    Corrections map a token missing from the vocabulary to the closest
+    known token, fewest edits first, then most frequent (symmetric delete
+    search: the hashes of every token's deletes are a sorted array
+    looked up with the deletes of the query, and the candidates are
+    verified with edit_distance).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported suggestion index format {self.meta['format_version']} in {path}")
+        with open(os.path.join(path, "phrases.json")) as f:
+            self.phrases = json.load(f)
+        self.counts = np.load(os.path.join(path, "counts.npy"))
+        self._build_prefix_array()
+        self._build_deletes()
+
+    def _build_prefix_array(self):
+        entries = []
+        for phrase_id, phrase in enumerate(self.phrases):
+            start = 0
+            for word in phrase.split(" "):
+                entries.append((phrase[start:], phrase_id))
+                start += len(word) + 1
+        entries.sort()
+        self.entries = [entry for entry, _ in entries]
+        self.entry_phrases = np.array([phrase_id for _, phrase_id in entries], dtype=np.int32)
+
+        prefixes = {entry[:length] for entry in self.entries for length in range(1, PRECOMPUTED_PREFIX + 1)}
+        self.top_completions = {prefix: self._rank(prefix, COMPLETION_LIMIT) for prefix in prefixes}
+
+    def _build_deletes(self):
+        token_counts = {}
+        for phrase, count in zip(self.phrases, self.counts.tolist()):
+            for token in set(phrase.split()):
+                token_counts[token] = token_counts.get(token, 0) + count
+        self.tokens = sorted(token_counts)
+        self.token_ids = {token: token_id for token_id, token in enumerate(self.tokens)}
+        self.token_counts = np.array([token_counts[token] for token in self.tokens], dtype=np.int64)
+        self.token_lengths = np.array([len(token) for token in self.tokens], dtype=np.int32)
+
+        hashes, owners = [], []
+        for token_id, token in enumerate(self.tokens):
+            for variant in deletes(token[:PREFIX_LENGTH], MAX_EDIT_DISTANCE):
+                hashes.append(hash(variant))
+                owners.append(token_id)
+        hashes = np.array(hashes, dtype=np.int64)
+        order = np.argsort(hashes, kind="stable")
+        self.delete_hashes = hashes[order]
+        self.delete_tokens = np.array(owners, dtype=np.int32)[order]
+
+    def _rank(self, text, limit):
+        lo = bisect_left(self.entries, text)
+        hi = bisect_right(self.entries, text + "\uffff", lo)
+        phrase_ids = self.entry_phrases[lo:hi]
+        counts = self.counts[phrase_ids]
+        if len(phrase_ids) > 2 * limit:
+            # A phrase appears once per matching word start, so 2 * limit leaves
+            # room for repeats; everything tied with the cut-off stays so the order is exact
+            threshold = np.partition(counts, len(counts) - 2 * limit)[len(counts) - 2 * limit]
+            keep = counts >= threshold
+            phrase_ids, counts = phrase_ids[keep], counts[keep]
+        ranked = phrase_ids[np.lexsort((phrase_ids, -counts))]
+        return [self.phrases[phrase_id] for phrase_id in dict.fromkeys(ranked.tolist())][:limit]
+
+    def complete(self, prefix, limit=COMPLETION_LIMIT):
+        """
+        Up to limit known phrases with a word starting with prefix, most used first.
+        """
+        text = " ".join(NON_ALPHA_PATTERN.sub("", prefix.lower()).split())
+        if not text:
+            return []
+        if len(text) <= PRECOMPUTED_PREFIX and limit <= COMPLETION_LIMIT:
+            return self.top_completions.get(text, [])[:limit]
+        return self._rank(text, limit)
+
+    def correct_token(self, token):
+        """
+        The closest known token, or token itself when it is known or nothing is close enough.
+        """
+        if token in self.token_ids or len(token) < MIN_CORRECT_LENGTH:
+            return token
+        max_distance = 1 if len(token) <= SHORT_TOKEN else MAX_EDIT_DISTANCE
+
+        query = np.array([hash(variant) for variant in deletes(token[:PREFIX_LENGTH], max_distance)], dtype=np.int64)
+        lo = np.searchsorted(self.delete_hashes, query, side="left")
+        hi = np.searchsorted(self.delete_hashes, query, side="right")
+        if not (hi > lo).any():
+            return token
+        candidates = np.unique(np.concatenate([self.delete_tokens[start:stop] for start, stop in zip(lo, hi)]))
+        candidates = candidates[np.abs(self.token_lengths[candidates] - len(token)) <= max_distance]
+
+        best, limit = token, max_distance
+        # Most frequent first: a later candidate must be strictly closer to win
+        for token_id in candidates[np.argsort(-self.token_counts[candidates], kind="stable")].tolist():
+            candidate = self.tokens[token_id]
+            distance = edit_distance(token, candidate, limit)
+            if distance <= limit:
+                best, limit = candidate, distance - 1
+                if limit < 1:
+                    break
+        return best
+
+    def correct_phrase(self, phrase):
+        return " ".join(self.correct_token(token) for token in phrase.split())
+
+    def correct_canonical(self, canonical):
+        """
+        Correct the output of preprocess_user_ingredients, keeping its sorted, de-duplicated form.
+
+        Corrected phrases with a generic word among their words are dropped
+        ("sallt" -> "salt"), but not phrases that merely contain one ("boiled
+        ham").
+        """
+        corrected = set()
+        for phrase in canonical.split(", "):
+            phrase = self.correct_phrase(phrase)
+            if phrase and set(phrase.split()).isdisjoint(GENERIC_WORDS):
+                corrected.add(phrase)
+        return ", ".join(sorted(corrected))
+
+    def corrections(self, canonical):
+        """
+        {unknown token: correction} for the tokens correct_canonical would change.
+        """
+        found = {}
+        for token in set(canonical.replace(",", " ").split()):
+            corrected = self.correct_token(token)
+            if corrected != token:
+                found[token] = corrected
+        return found
+
+
+def suggester_from_env():
+    """
+    IngredientSuggester of PANTRYPALETTE_SUGGEST_INDEX (default models/suggest), or None when it is not built.
+    """
+    path = os.environ.get("PANTRYPALETTE_SUGGEST_INDEX", os.path.join("models", "suggest"))
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return IngredientSuggester(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the ingredient autocomplete / correction index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="extract the canonical phrases of a recipes database")
+    build.add_argument("db_path")
+    build.add_argument("out_dir", nargs="?", default=os.path.join("models", "suggest"))
+
+    query = commands.add_parser("query", help="complete or correct the given words, with latencies")
+    query.add_argument("words", nargs="+")
+    query.add_argument("--index", default=os.path.join("models", "suggest"))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        n_phrases = build_suggest_index(args.db_path, args.out_dir)
+        print(f"Wrote {n_phrases} ingredient phrases to {args.out_dir}")
+    else:
+        start = time.perf_counter()
+        suggester = IngredientSuggester(args.index)
+        print(f"Loaded {len(suggester.phrases)} phrases, {len(suggester.tokens)} tokens "
+              f"in {1000 * (time.perf_counter() - start):.0f} ms")
+        for word in args.words:
+            start = time.perf_counter()
+            completions = suggester.complete(word)
+            middle = time.perf_counter()
+            corrected = suggester.correct_phrase(word)
+            end = time.perf_counter()
+            print(f"{word!r}: complete {1000 * (middle - start):.3f} ms {completions}; "
+                  f"correct {1000 * (end - middle):.3f} ms {corrected!r}")
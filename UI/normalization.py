@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# normalization.py
+import re
+from functools import lru_cache
+
+PAREN_PATTERN = re.compile(r'\(.*?\)')
+NON_ALPHA_PATTERN = re.compile(r'[^a-z\s]')
+
+# Generic words whose phrases are dropped from the cleaned ingredients
+GENERIC_WORDS = ("oil", "salt", "water")
+
+# On text reduced to [a-z\s], NLTK's word_tokenize only differs from
+# str.split() in the MacIntyre contractions that need no apostrophe
+# (NLTKWordTokenizer.CONTRACTIONS2); every other rule of the Treebank
+# tokenizer and Punkt sentence splitter needs punctuation to fire.
+SPLIT_CONTRACTIONS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
+
+LEMMA_CACHE_SIZE = 1 << 16
+PHRASE_CACHE_SIZE = 1 << 18
+
+
+def tokenize(text):
+    """
+    Tokenize text made only of [a-z\\s] exactly like nltk.word_tokenize.
+    """
+    tokens = text.split()
+    if SPLIT_CONTRACTIONS.keys().isdisjoint(tokens):
+        return tokens
+    split_tokens = []
+    for token in tokens:
+        split_tokens.extend(SPLIT_CONTRACTIONS.get(token, (token,)))
+    return split_tokens
+
+
+class IngredientNormalizer:
+    """
+    Turn one raw ingredient line into its cleaned phrase.
+
+    Same steps as the original preprocess_ingredients loop body, with
+    precompiled patterns, a whitespace tokenizer and two bounded LRU
+    caches: one per token lemma and one per [a-z\\s]-reduced line.
+    """
+
+    def __init__(self, stopwords, lemmatize, lemma_cache_size=LEMMA_CACHE_SIZE, phrase_cache_size=PHRASE_CACHE_SIZE):
+        self.stopwords = frozenset(stopwords)
+        self._lemma = lru_cache(maxsize=lemma_cache_size)(lemmatize)
+        self._phrase = lru_cache(maxsize=phrase_cache_size)(self._build_phrase)
+
+    def _build_phrase(self, text):
+        tokens = [self._lemma(token) for token in tokenize(text)
+                  if token not in self.stopwords and len(token) > 1]
+        if not tokens:
+            return ""
+        phrase = " ".join(tokens)
+        if any(word in phrase for word in GENERIC_WORDS):
+            return ""
+        return phrase
+
+    def normalize(self, ingredient):
+        """
+        Return the cleaned phrase of an ingredient line, or "" if nothing is left.
+        """
+        text = NON_ALPHA_PATTERN.sub('', PAREN_PATTERN.sub('', str(ingredient)).lower())
+        return self._phrase(text)
+
+    def cache_stats(self):
+        """
+        Hit/miss counters of the lemma and phrase caches.
+        """
+        stats = {}
+        for name, cache in (("lemma", self._lemma), ("phrase", self._phrase)):
+            info = cache.cache_info()
+            stats[name] = {"hits": info.hits, "misses": info.misses,
+                           "size": info.currsize, "maxsize": info.maxsize}
+        return stats
+
+    def cache_clear(self):
+        self._lemma.cache_clear()
+        self._phrase.cache_clear()
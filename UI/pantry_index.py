@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# pantry_index.py
+import argparse
+import json
+import os
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from recipe_db import connect_readonly
+
+FORMAT_VERSION = 2
+
+# Phrases that get a bit: the most frequent ones, 4 uint64 words per recipe
+# (64 MiB for 2M recipes). Rarer phrases are credited through their
+# posting lists instead.
+DEFAULT_BITS = 256
+# Recipes scored per vectorized block; bounds the temporaries to a few MiB
+BATCH_ROWS = 1 << 16
+DEFAULT_MAX_MISSING = 3
+
+# Set bits of every byte value, for numpy < 2 (no np.bitwise_count)
+POPCOUNT_TABLE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def popcount(words, out):
+    """
+    Set bits of each uint64 in words, written to the uint8 array out.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words, out=out)
+    np.sum(POPCOUNT_TABLE[words.view(np.uint8)].reshape(-1, 8), axis=1, dtype=np.uint8, out=out)
+    return out
+
+
+# ---------------------------------------------
+# Build from the Ingredient Posting Index
+# ---------------------------------------------
+def build_pantry_index(db_path, out_dir, n_bits=DEFAULT_BITS, normalize=None):
+    """
+    Precompute the pantry index from the ingredient tables of a recipes DB.
+
+    The ingredient lines of the posting index are mapped with normalize
+    (default: recipe_model's normalizer), so phrase ids are the cleaned
+    phrases preprocess_ingredients and preprocess_user_ingredients
+    produce; lines that clean to nothing (salt, oil, water) are not
+    counted as ingredients. Phrases are renumbered by how many recipes
+    use them so the n_bits most frequent ones land in each recipe's
+    bitset. Every recipe stores its bitset and its phrase count; phrases
+    outside the bitset keep a phrase -> recipe posting list. Bitsets are
+    stored word by word ((words, recipes), so one word of every recipe is
+    contiguous) and recipes in rowid order.
+    """
+    if normalize is None:
+        from recipe_model import get_normalizer
+
+        normalize = get_normalizer().normalize
+    words = -(-n_bits // 64)
+    n_bits = words * 64
+
+    conn = connect_readonly(db_path)
+    try:
+        ingredient_ids, line_phrases, phrase_ids = [], [], {}
+        for ingredient_id, line in conn.execute("SELECT ingredient_id, line FROM ingredients ORDER BY ingredient_id"):
+            phrase = normalize(line)
+            ingredient_ids.append(ingredient_id)
+            line_phrases.append(phrase_ids.setdefault(phrase, len(phrase_ids)) if phrase else -1)
+        phrases = list(phrase_ids)
+        recipe_ids = np.fromiter(
+            (row[0] for row in conn.execute("SELECT rowid FROM recipes ORDER BY rowid")), dtype=np.int64
+        )
+
+        posting_recipes, posting_phrases = array("q"), array("q")
+        cursor = conn.execute("SELECT recipe_id, ingredient_id FROM recipe_ingredients")
+        while True:
+            rows = cursor.fetchmany(100000)
+            if not rows:
+                break
+            for recipe_id, ingredient_id in rows:
+                posting_recipes.append(recipe_id)
+                posting_phrases.append(ingredient_id)
+    finally:
+        conn.close()
+
+    ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+    posting_recipes = np.frombuffer(posting_recipes, dtype=np.int64)
+    rows = np.searchsorted(recipe_ids, posting_recipes)
+    line_rows = np.searchsorted(ingredient_ids, np.frombuffer(posting_phrases, dtype=np.int64))
+    phrase_rows = np.asarray(line_phrases, dtype=np.int64)[line_rows]
+    # Postings of recipes deleted since the index was built, and of lines
+    # without a cleaned phrase, are dropped
+    known = (rows < len(recipe_ids)) & (recipe_ids[np.minimum(rows, len(recipe_ids) - 1)] == posting_recipes)
+    known &= phrase_rows >= 0
+    # Several lines of a recipe can clean to the same phrase; it counts once
+    pairs = np.unique(rows[known] * max(len(phrases), 1) + phrase_rows[known])
+    rows, phrase_rows = pairs // max(len(phrases), 1), pairs % max(len(phrases), 1)
+
+    # Renumber phrases by recipe frequency (ties by phrase id): position < n_bits owns a bit
+    frequency = np.bincount(phrase_rows, minlength=len(phrases))
+    order = np.lexsort((np.arange(len(phrases)), -frequency))
+    position = np.empty(len(phrases), dtype=np.int64)
+    position[order] = np.arange(len(phrases))
+    positions = position[phrase_rows]
+
+    n = len(recipe_ids)
+    bits = np.zeros((words, n), dtype=np.uint64)
+    frequent = positions < n_bits
+    np.bitwise_or.at(
+        bits, (positions[frequent] // 64, rows[frequent]),
+        np.left_shift(np.uint64(1), (positions[frequent] % 64).astype(np.uint64))
+    )
+    n_ingredients = np.bincount(rows, minlength=n)
+
+    # Rare phrase -> recipe rows, grouped by phrase position
+    rare_positions = positions[~frequent]
+    rare_rows = rows[~frequent]
+    grouped = np.lexsort((rare_rows, rare_positions))
+    rare_indptr = np.zeros(len(phrases) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rare_positions, minlength=len(phrases)), out=rare_indptr[1:])
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "bits.npy"), bits)
+    np.save(os.path.join(out_dir, "n_ingredients.npy"), n_ingredients.astype(np.int16))
+    np.save(os.path.join(out_dir, "rare_indptr.npy"), rare_indptr)
+    np.save(os.path.join(out_dir, "rare_rows.npy"), rare_rows[grouped].astype(np.int32))
+    np.save(os.path.join(out_dir, "recipe_ids.npy"), recipe_ids)
+    with open(os.path.join(out_dir, "phrases.json"), "w") as f:
+        json.dump([phrases[i] for i in order], f)
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"format_version": FORMAT_VERSION, "rows": n, "bits": n_bits,
+                   "phrases": len(phrases)}, f, indent=2)
+    return n
+
+
+# ---------------------------------------------
+# Search
+# ---------------------------------------------
+class PantryIndex:
+    """
+    "Cook with what I have" search over a directory written by build_pantry_index.
+
+    A pantry is turned into the set of phrase ids it covers (a user
+    ingredient covers every phrase with a word starting with each of its
+    tokens, as in the overlap search). The missing count of every recipe,
+    popcount(recipe & ~pantry) over all its phrases, is evaluated as
+
+        missing = n_ingredients - popcount(recipe_bits & pantry_bits) - rare_owned
+
+    in blocks of BATCH_ROWS recipes, which skips every bitset word the
+    pantry leaves empty; rare_owned comes from the posting lists of the
+    covered rare phrases. Arrays are memory-mapped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported pantry index format {self.meta['format_version']} in {path}")
+
+        self.bits = self._load("bits.npy")
+        self.n_ingredients = self._load("n_ingredients.npy")
+        self.rare_indptr = self._load("rare_indptr.npy")
+        self.rare_rows = self._load("rare_rows.npy")
+        self.recipe_ids = self._load("recipe_ids.npy")
+        with open(os.path.join(path, "phrases.json")) as f:
+            self.phrases = json.load(f)
+        self.n_bits = self.meta["bits"]
+
+        # token -> sorted phrase positions containing it
+        tokens = {}
+        for position, phrase in enumerate(self.phrases):
+            for token in set(phrase.split()):
+                tokens.setdefault(token, array("i")).append(position)
+        self.token_phrases = {token: np.frombuffer(ids, dtype=np.int32) for token, ids in tokens.items()}
+        self.tokens = sorted(self.token_phrases)
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode="r")
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def prefix_phrases(self, token):
+        """
+        Phrase positions with a word starting with token, as the overlap search matches.
+        """
+        lo = bisect_left(self.tokens, token)
+        hi = bisect_left(self.tokens, token + "{", lo)
+        if hi - lo == 1:
+            return self.token_phrases[self.tokens[lo]]
+        if hi == lo:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([self.token_phrases[word] for word in self.tokens[lo:hi]]))
+
+    def covered_phrases(self, terms):
+        """
+        Phrase positions covered by a list of token lists (see ingredient_index.query_terms).
+        """
+        covered = []
+        for tokens in terms:
+            postings = sorted((self.prefix_phrases(token) for token in tokens), key=len)
+            if not postings:
+                continue
+            phrases = postings[0]
+            for other in postings[1:]:
+                phrases = np.intersect1d(phrases, other, assume_unique=True)
+            covered.append(phrases)
+        if not covered:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(covered))
+
+    def pantry_bits(self, phrases):
+        pantry = np.zeros(self.n_bits // 64, dtype=np.uint64)
+        frequent = phrases[phrases < self.n_bits].astype(np.uint64)
+        np.bitwise_or.at(pantry, (frequent // np.uint64(64)).astype(np.int64),
+                         np.left_shift(np.uint64(1), frequent % np.uint64(64)))
+        return pantry
+
+    def missing_counts(self, phrases):
+        """
+        Number of missing phrases of every recipe, given the covered phrase positions.
+        """
+        pantry = self.pantry_bits(phrases)
+        words = np.flatnonzero(pantry)
+        missing = np.array(self.n_ingredients, dtype=np.int16)
+        owned = np.empty(BATCH_ROWS, dtype=np.uint64)
+        counts = np.empty(BATCH_ROWS, dtype=np.uint8)
+        for start in range(0, len(self), BATCH_ROWS):
+            stop = min(start + BATCH_ROWS, len(self))
+            block = missing[start:stop]
+            for word in words:
+                np.bitwise_and(self.bits[word, start:stop], pantry[word], out=owned[:stop - start])
+                popcount(owned[:stop - start], counts[:stop - start])
+                block -= counts[:stop - start]
+
+        rare = phrases[phrases >= self.n_bits]
+        if len(rare):
+            owned_rows = np.concatenate([self.rare_rows[self.rare_indptr[p]:self.rare_indptr[p + 1]] for p in rare])
+            rows, counts = np.unique(owned_rows, return_counts=True)
+            missing[rows] -= counts.astype(np.int16)
+        return missing
+
+    def search(self, terms, max_missing=DEFAULT_MAX_MISSING, limit=100):
+        """
+        Recipes missing at most max_missing ingredients, best coverage first.
+
+        Returns (recipe_id, missing, n_ingredients) tuples ordered by
+        coverage (owned / n_ingredients) descending, then fewer missing,
+        then recipe_id. Recipes sharing nothing with the pantry are skipped.
+        """
+        phrases = self.covered_phrases(terms)
+        if not len(phrases):
+            return []
+        missing = self.missing_counts(phrases)
+        candidates = np.flatnonzero((missing <= max_missing) & (missing < self.n_ingredients))
+        if not len(candidates):
+            return []
+
+        n_ingredients = self.n_ingredients[candidates].astype(np.float64)
+        coverage = 1.0 - missing[candidates] / n_ingredients
+        if len(candidates) > limit:
+            # Keep everything tied with the limit-th best coverage, then order exactly
+            threshold = np.partition(coverage, len(coverage) - limit)[len(coverage) - limit]
+            keep = coverage >= threshold
+            candidates, coverage = candidates[keep], coverage[keep]
+        order = np.lexsort((candidates, missing[candidates], -coverage))[:limit]
+        best = candidates[order]
+        return list(zip(self.recipe_ids[best].tolist(), missing[best].tolist(), self.n_ingredients[best].tolist()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the pantry (fewest missing ingredients) index of a recipes database.")
+    parser.add_argument("db_path")
+    parser.add_argument("out_dir", nargs="?", default=os.path.join("models", "pantry"))
+    parser.add_argument("--bits", type=int, default=DEFAULT_BITS, help="phrases stored in each recipe's bitset")
+    args = parser.parse_args()
+
+    n_rows = build_pantry_index(args.db_path, args.out_dir, args.bits)
+    print(f"Wrote the pantry index of {n_rows} recipes to {args.out_dir}")
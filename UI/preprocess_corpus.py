@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# preprocess_corpus.py
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+CHUNK_SIZE = 20000
+
+_preprocess = None
+
+
+def _init_worker():
+    """
+    Load recipe_model (and with it the NLTK resources) once per worker process.
+    """
+    global _preprocess
+    from recipe_model import get_normalizer, preprocess_ingredients
+    get_normalizer()
+    _preprocess = preprocess_ingredients
+
+
+def _part_path(out_dir, chunk_id):
+    return os.path.join(out_dir, f"part-{chunk_id:05d}.csv")
+
+
+def clean_chunk(chunk_id, chunk, out_dir, column="ingredients"):
+    """
+    Add the ingredients_clean column to one chunk and write it as a part file.
+
+    The part is written to a temporary name and renamed, so a part file on
+    disk always holds a finished chunk.
+    """
+    chunk = chunk.copy()
+    chunk["ingredients_clean"] = [_preprocess(value) for value in chunk[column]]
+    path = _part_path(out_dir, chunk_id)
+    tmp_path = path + ".tmp"
+    chunk.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return chunk_id, len(chunk)
+
+
+def preprocess_corpus(input_csv, out_dir, workers=None, chunk_size=CHUNK_SIZE, column="ingredients"):
+    """
+    Stream a raw RecipeNLG CSV through preprocess_ingredients in parallel.
+
+    Chunks are fanned out to a process pool and each finished chunk is
+    written to out_dir/part-NNNNN.csv. Chunks whose part file already
+    exists are skipped, so an interrupted run resumes where it stopped;
+    the chunking parameters are recorded in out_dir/_meta.json so a resume
+    cannot mix chunk boundaries. At most two chunks per worker are held in
+    memory at a time.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, "_meta.json")
+    meta = {"input_csv": os.path.abspath(input_csv), "chunk_size": chunk_size, "column": column}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous = json.load(f)
+        if previous != meta:
+            raise ValueError(f"{out_dir} holds parts of a different run ({previous}); use a new directory")
+    else:
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+
+    for stale in glob.glob(os.path.join(out_dir, "*.tmp")):
+        os.remove(stale)
+
+    workers = workers or os.cpu_count()
+    max_pending = 2 * workers
+    done = skipped = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = set()
+        reader = pd.read_csv(input_csv, chunksize=chunk_size)
+        for chunk_id, chunk in enumerate(reader):
+            if os.path.exists(_part_path(out_dir, chunk_id)):
+                skipped += 1
+                continue
+            pending.add(pool.submit(clean_chunk, chunk_id, chunk, out_dir, column))
+            if len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finished_id, rows = future.result()
+                    done += 1
+                    print(f"Chunk {finished_id} done ({rows} rows)")
+        for future in pending:
+            finished_id, rows = future.result()
+            done += 1
+            print(f"Chunk {finished_id} done ({rows} rows)")
+
+    print(f"Cleaned {done} chunks, skipped {skipped} already finished chunks")
+    return done
+
+
+def merge_parts(out_dir, output_csv):
+    """
+    Concatenate the part files, in chunk order, into a single CSV.
+    """
+    parts = sorted(glob.glob(os.path.join(out_dir, "part-*.csv")))
+    with open(output_csv, "w", newline="") as out:
+        for i, part in enumerate(parts):
+            with open(part, newline="") as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                for line in f:
+                    out.write(line)
+    return len(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the ingredients of a raw recipe CSV in parallel.")
+    parser.add_argument("input_csv")
+    parser.add_argument("out_dir", help="directory for the resumable part files")
+    parser.add_argument("--output", help="merge the finished parts into this CSV")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--column", default="ingredients")
+    args = parser.parse_args()
+
+    preprocess_corpus(args.input_csv, args.out_dir, args.workers, args.chunk_size, args.column)
+    if args.output:
+        n_parts = merge_parts(args.out_dir, args.output)
+        print(f"Merged {n_parts} parts into {args.output}")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# prewarm.py
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+UI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules imported by the app besides streamlit, checked by the import report
+APP_MODULES = [
+    "artifact_store", "ingredient_index", "ingredient_suggest", "normalization", "recipe_db", "recipe_model",
+    "recipe_payloads", "result_cache", "similarity_engine", "tracing",
+]
+
+WARM_QUERY = "chicken, rice, tomato, onion, garlic"
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@contextmanager
+def _timed(timings, step):
+    start = time.perf_counter()
+    yield
+    timings[step] = round(1000 * (time.perf_counter() - start), 1)
+
+
+def app_modules():
+    """
+    APP_MODULES plus the modules the similarity backend selected by the environment imports.
+    """
+    modules = list(APP_MODULES)
+    backend = os.environ.get("PANTRYPALETTE_SIMILARITY_BACKEND", "exact")
+    if backend == "dense":
+        return modules + ["dense_embedding"]
+    if os.environ.get("PANTRYPALETTE_CORPUS_STORE"):
+        modules += ["corpus_store", "sharded_search"]
+    if backend == "approximate":
+        modules.append("approximate_search")
+    return modules
+
+
+def prewarm(store=None):
+    """
+    Load the models, open the DB and fill the caches a first request needs.
+
+    Downloads missing artifacts into the cache, loads the similarity models
+    through the app's own loader (so the backend follows the same
+    PANTRYPALETTE_* switches), faults the memory-mapped files into the page
+    cache and runs one overlap and one similarity query. Returns the time
+    spent per step in milliseconds.
+
+    Run as its own process before the server starts, this only warms what
+    outlives it (the artifact cache, the OS page cache); the app's
+    st.cache_resource models are loaded by its first run.
+    """
+    from artifact_store import ArtifactStore
+    from ingredient_index import search_overlap
+    from ingredient_suggest import suggester_from_env
+    from recipe_db import check_model_alignment, connect_readonly
+    from recipe_model import get_normalizer, preprocess_user_ingredients
+    from similarity_engine import similarity_models_from_env
+
+    timings = {}
+    store = store or ArtifactStore()
+
+    with _timed(timings, "nltk"):
+        get_normalizer()
+    with _timed(timings, "models"):
+        vectorizer, engine, recipe_ids = similarity_models_from_env(store)
+    with _timed(timings, "suggest"):
+        suggester_from_env()
+    with _timed(timings, "db"):
+        conn = connect_readonly(store.path("recipes_db"))
+        check_model_alignment(conn, recipe_ids, engine.n_samples_fit_)
+    try:
+        with _timed(timings, "overlap_query"):
+            search_overlap(conn, [ing.strip() for ing in WARM_QUERY.split(",")], limit=10)
+        with _timed(timings, "similarity_query"):
+            engine.kneighbors(vectorizer.transform([preprocess_user_ingredients(WARM_QUERY)]))
+    finally:
+        conn.close()
+    return timings
+
+
+# ---------------------------------------------
+# Import-Time Report
+# ---------------------------------------------
+def import_report(modules=None, top=15):
+    """
+    Import the app modules in a fresh interpreter under -X importtime.
+
+    Returns the total import time and the slowest top-level imports
+    (cumulative microseconds), for tracking startup regressions. modules
+    defaults to app_modules().
+    """
+    modules = modules or app_modules()
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=UI_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the app modules failed:\n{result.stderr}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({"module": name, "self_us": int(self_us),
+                            "cumulative_us": int(cumulative_us), "depth": len(indent) // 2})
+
+    top_level = [imp for imp in imports if imp["depth"] == 0]
+    return {
+        "python": sys.version.split()[0],
+        "total_us": sum(imp["cumulative_us"] for imp in top_level),
+        "modules": {module: next((imp["cumulative_us"] for imp in imports if imp["module"] == module), None)
+                    for module in modules},
+        "slowest": sorted(top_level, key=lambda imp: imp["cumulative_us"], reverse=True)[:top],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prewarm PantryPalette before serving, or report import times.")
+    parser.add_argument("--import-report", action="store_true", help="report import times instead of prewarming")
+    parser.add_argument("--json", help="write the result as JSON to this path")
+    args = parser.parse_args()
+
+    if args.import_report:
+        result = import_report()
+        print(f"Total import time: {result['total_us'] / 1000:.1f} ms")
+        for imp in result["slowest"]:
+            print(f"  {imp['cumulative_us'] / 1000:8.1f} ms  {imp['module']}")
+    else:
+        result = prewarm()
+        for step, ms in result.items():
+            print(f"{step:<18} {ms:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
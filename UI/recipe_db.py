@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# recipe_db.py
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import numpy as np
+
+RECIPE_COLUMNS = ['title', 'ingredients', 'instructions']
+
+# Stay below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+MAX_IN_PARAMS = 900
+
+# IN lists are padded to one of these sizes so a handful of SQL strings
+# cover every fetch and stay in each connection's statement cache
+IN_LIST_SIZES = (16, 64, 256, MAX_IN_PARAMS)
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every pooled read connection
+READ_PRAGMAS = {
+    "mmap_size": 256 << 20,    # read pages through a 256 MiB memory map
+    "cache_size": -64 << 10,   # 64 MiB page cache (negative = KiB)
+    "temp_store": "MEMORY",    # temp tables (alignment check) stay in memory
+}
+# Applied by ingestion writers; WAL lets readers run while they write
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+}
+
+logger = logging.getLogger("pantrypalette.db")
+
+
+# ---------------------------------------------
+# EXPLAIN QUERY PLAN Debug Hook
+# ---------------------------------------------
+_explain_hook = None
+_explained = set()
+
+
+def set_explain_hook(hook):
+    """
+    Call hook(sql, plan_lines) the first time each statement runs (None disables).
+    """
+    global _explain_hook
+    _explain_hook = hook
+    _explained.clear()
+
+
+def explain_query_plan(conn, sql, params=()):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def execute(cursor, sql, params=()):
+    """
+    cursor.execute, reporting the query plan to the explain hook if one is set.
+    """
+    if _explain_hook is not None and sql not in _explained:
+        _explained.add(sql)
+        _explain_hook(sql, explain_query_plan(cursor.connection, sql, params))
+    return cursor.execute(sql, params)
+
+
+def _log_plan(sql, plan):
+    logger.warning("EXPLAIN QUERY PLAN %s\n  %s", " ".join(sql.split()), "\n  ".join(plan))
+
+
+# PANTRYPALETTE_EXPLAIN=1 logs the plan of every distinct statement once
+if os.environ.get("PANTRYPALETTE_EXPLAIN", "0") == "1":
+    set_explain_hook(_log_plan)
+
+
+# ---------------------------------------------
+# Connections
+# ---------------------------------------------
+def _apply_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def connect_readonly(db_path):
+    """
+    Open a tuned read-only connection that may be shared across threads.
+    """
+    conn = sqlite3.connect(
+        f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True,
+        check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+    )
+    _apply_pragmas(conn, READ_PRAGMAS)
+    return conn
+
+
+def connect_writer(db_path):
+    """
+    Open a read-write connection in WAL mode for the ingestion writers.
+    """
+    conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE)
+    _apply_pragmas(conn, WRITE_PRAGMAS)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Bounded pool of read-only connections to one recipes database.
+
+    connection() checks a connection out for the duration of a with
+    block, so any thread can borrow one; thread_connection() returns a
+    connection owned by the calling thread for long-lived workers. At
+    most max_size connections are checked out at once.
+    """
+
+    def __init__(self, db_path, max_size=8):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = connect_readonly(self.db_path)
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def thread_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+# ---------------------------------------------
+# Batched Fetch
+# ---------------------------------------------
+def _padded_chunks(recipe_ids):
+    """
+    Split ids into IN lists padded (by repeating the last id) to IN_LIST_SIZES.
+    """
+    for start in range(0, len(recipe_ids), MAX_IN_PARAMS):
+        chunk = recipe_ids[start:start + MAX_IN_PARAMS]
+        size = next(size for size in IN_LIST_SIZES if size >= len(chunk))
+        yield chunk + [chunk[-1]] * (size - len(chunk))
+
+
+def fetch_recipes_by_ids(conn, recipe_ids, columns=RECIPE_COLUMNS):
+    """
+    Fetch recipes by primary key, returned in the order of recipe_ids.
+
+    Returns a list of (recipe_id, *columns) tuples. Ids that are not in
+    the database are skipped.
+    """
+    recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+    column_sql = ", ".join(columns)
+    rows = {}
+    cursor = conn.cursor()
+    for chunk in _padded_chunks(recipe_ids):
+        placeholders = ", ".join("?" * len(chunk))
+        execute(cursor, f"SELECT rowid, {column_sql} FROM recipes WHERE rowid IN ({placeholders})", chunk)
+        for row in cursor.fetchall():
+            rows[row[0]] = row
+    return [rows[recipe_id] for recipe_id in recipe_ids if recipe_id in rows]
+
+
+# ---------------------------------------------
+# Model <-> Database Alignment
+# ---------------------------------------------
+def save_recipe_ids(path, recipe_ids):
+    """
+    Persist the recipe primary key of every row the similarity model was fitted on.
+    """
+    np.save(path, np.asarray(recipe_ids, dtype=np.int64))
+
+
+def load_model_recipe_ids(store, n_samples):
+    """
+    The model's row -> recipe primary key mapping for an ArtifactStore.
+
+    The recipe_ids artifact when the store has one; otherwise the first
+    n_samples rowids of the recipes table, the rows the published model
+    was fitted on (its row i is recipes.rowid i + 1), before any recipes
+    were ingested.
+    """
+    if store.available("recipe_ids"):
+        return store.load("recipe_ids")
+    conn = connect_readonly(store.path("recipes_db"))
+    try:
+        rows = conn.execute("SELECT rowid FROM recipes ORDER BY rowid LIMIT ?", (int(n_samples),))
+        return np.fromiter((row[0] for row in rows), dtype=np.int64)
+    finally:
+        conn.close()
+
+
+def check_model_alignment(conn, recipe_ids, n_samples):
+    """
+    Fail fast when the similarity model and the recipes database disagree.
+
+    Raises RuntimeError if the mapping does not cover every fitted row or
+    refers to recipes that are missing from the database.
+    """
+    if len(recipe_ids) != n_samples:
+        raise RuntimeError(
+            f"Recipe id mapping has {len(recipe_ids)} entries but the similarity "
+            f"model was fitted on {n_samples} recipes"
+        )
+    if len(np.unique(recipe_ids)) != len(recipe_ids):
+        raise RuntimeError("Recipe id mapping contains duplicate recipe ids")
+
+    # The INSERTs open an implicit transaction; it is rolled back so a pooled
+    # read-only connection is not returned holding a stale read snapshot
+    was_in_transaction = conn.in_transaction
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS model_recipe_ids (recipe_id INTEGER PRIMARY KEY)")
+        cursor.execute("DELETE FROM model_recipe_ids")
+        cursor.executemany(
+            "INSERT INTO model_recipe_ids (recipe_id) VALUES (?)",
+            ((int(recipe_id),) for recipe_id in recipe_ids)
+        )
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM model_recipe_ids m
+            LEFT JOIN recipes r ON r.rowid = m.recipe_id
+            WHERE r.rowid IS NULL
+        """)
+        missing = cursor.fetchone()[0]
+    finally:
+        if not was_in_transaction:
+            conn.rollback()
+        cursor.execute("DROP TABLE IF EXISTS temp.model_recipe_ids")
+    if missing:
+        raise RuntimeError(
+            f"{missing} recipes referenced by the similarity model are missing from the database"
+        )
@@ -1,21 +1,19 @@
 #!/usr/bin/env python
 # recipe_model.py
 import ast
-import re
+import os
+import threading
 
-import nltk
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
+from normalization import IngredientNormalizer
+from tracing import register_collector, span
 
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import stopwords
+# NLTK corpora are provisioned ahead of time (see Dockerfile), never downloaded
+# at import: NLTK_DATA or the repo's nltk_data/ directory.
+BUNDLED_NLTK_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nltk_data")
+NLTK_RESOURCES = ["corpora/stopwords", "corpora/wordnet"]
 
-# Initialize NLTK resources
-lemmatizer = WordNetLemmatizer()
-stop_words = set(stopwords.words('english'))
-custom_stopwords = stop_words.union({
+# Added to NLTK's English stopwords when the normalizer is built
+extra_stopwords = {
     # Measurement units and common descriptors
     'c', 'cup', 'cups', 'tsp', 'teaspoon', 'teaspoons', 'tbsp', 'tablespoon', 'tablespoons',
     'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds', 'g', 'gram', 'grams', 'kg',
@@ -36,12 +34,70 @@ custom_stopwords = stop_words.union({
     # Generic stopwords
     'plus', 'with', 'without', 'into', 'about', 'of', 'the', 'to', 'for', 'in', 'from',
     'as', 'and', 'or', 'on', 'your', 'if', 'such', 'you', 'use', 'may'
-})
+}
+
+_normalizer = None
+_normalizer_lock = threading.Lock()
+
+def ensure_nltk_data():
+    """
+    Check that the NLTK corpora are available locally; raise LookupError if not.
+    """
+    import nltk
+
+    if os.path.isdir(BUNDLED_NLTK_DATA) and BUNDLED_NLTK_DATA not in nltk.data.path:
+        nltk.data.path.append(BUNDLED_NLTK_DATA)
+    missing = []
+    for resource in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(resource.split("/")[-1])
+    if missing:
+        raise LookupError(
+            f"Missing NLTK data {missing}; provision it with "
+            f"`python -m nltk.downloader -d {BUNDLED_NLTK_DATA} {' '.join(missing)}` "
+            "or point NLTK_DATA at an existing copy"
+        )
+
+def get_normalizer():
+    """
+    Load the NLTK resources and build the cached normalizer on first use.
+    """
+    global _normalizer
+    with _normalizer_lock:
+        if _normalizer is None:
+            ensure_nltk_data()
+            from nltk.stem import WordNetLemmatizer
+            from nltk.corpus import stopwords
+
+            custom_stopwords = set(stopwords.words('english')).union(extra_stopwords)
+            _normalizer = IngredientNormalizer(custom_stopwords, WordNetLemmatizer().lemmatize)
+        return _normalizer
+
+def normalizer_cache_metrics():
+    """
+    /metrics samples of the normalizer's lemma and phrase caches, none before it is built.
+    """
+    if _normalizer is None:
+        return []
+    samples = []
+    for cache, stats in _normalizer.cache_stats().items():
+        labels = {"cache": cache}
+        samples += [
+            ("normalizer_cache_hits_total", "counter", labels, stats["hits"]),
+            ("normalizer_cache_misses_total", "counter", labels, stats["misses"]),
+            ("normalizer_cache_entries", "gauge", labels, stats["size"]),
+        ]
+    return samples
+
+register_collector("normalizer_cache", normalizer_cache_metrics)
 
 def preprocess_ingredients(ingredients):
     """
     Clean and standardize the ingredients list.
     """
+    normalizer = get_normalizer()
     try:
         if isinstance(ingredients, str):
             # Evaluate string if it starts with a list indicator
@@ -53,15 +109,9 @@ def preprocess_ingredients(ingredients):
     
         cleaned_ingredients = set()
         for ing in ingredients_list:
-            ing = re.sub(r'\(.*?\)', '', str(ing)).lower() 
-            ing = re.sub(r'[^a-z\s]', '', ing)
-            tokens = word_tokenize(ing)
-            tokens = [lemmatizer.lemmatize(token) for token in tokens if token not in custom_stopwords and len(token) > 1]
-            if tokens:
-                phrase = " ".join(tokens)
-                # Optionally filter out overly generic words
-                if "oil" not in phrase and "salt" not in phrase and "water" not in phrase:
-                    cleaned_ingredients.add(phrase)
+            phrase = normalizer.normalize(ing)
+            if phrase:
+                cleaned_ingredients.add(phrase)
     
         return ", ".join(sorted(cleaned_ingredients))
     except Exception as e:
@@ -72,24 +122,48 @@ def preprocess_user_ingredients(user_input):
     """
     Process raw user input into a cleaned string of ingredients.
     """
-    ingredients = user_input.split(',')
-    ingredients_str = str([ing.strip() for ing in ingredients])
-    return preprocess_ingredients(ingredients_str)
+    with span("preprocess"):
+        ingredients = user_input.split(',')
+        ingredients_str = str([ing.strip() for ing in ingredients])
+        return preprocess_ingredients(ingredients_str)
+
+# Document forms a TF-IDF model can be fitted on: the stored ingredients
+# column (as the notebook and the shipped model) or its cleaned phrases
+DOCUMENT_FORMS = ("raw", "cleaned")
 
-def find_similar_recipes(user_input, vectorizer, nn_model, train_df):
+def model_document(ingredients, documents="raw"):
+    """
+    Turn a stored ingredients column into the document form a model was fitted on.
+    """
+    if documents == "raw":
+        return ingredients
+    if documents == "cleaned":
+        return preprocess_ingredients(ingredients)
+    raise ValueError(f"Unknown document form '{documents}', expected one of {DOCUMENT_FORMS}")
+
+def find_similar_recipes(user_input, vectorizer, nn_model, train_df, n_neighbors=None):
     """
     Finds and returns the top similar recipes based on the user's ingredients.
+    nn_model may be a fitted NearestNeighbors, a SparseCosineIndex or a
+    ShardedIndex (identical results); train_df may be the training
+    DataFrame or a memory-mapped CorpusStore.
     """
+    from corpus_store import CorpusStore
+
     user_cleaned = preprocess_user_ingredients(user_input)
-    user_vector = vectorizer.transform([user_cleaned])
-    distances, indices = nn_model.kneighbors(user_vector)
+    with span("vectorize"):
+        user_vector = vectorizer.transform([user_cleaned])
+    with span("knn"):
+        distances, indices = nn_model.kneighbors(user_vector, n_neighbors=n_neighbors)
     
     results = []
     for i, (idx, dist) in enumerate(zip(indices[0], distances[0])):
         similarity_score = round((1 - dist) * 100, 2)
-        title = train_df.iloc[idx]['title'] if 'title' in train_df.columns else 'N/A'
-        ingredients = train_df.iloc[idx]['ingredients']
-        ingredients_clean = train_df.iloc[idx]['ingredients_clean']
+        # One row lookup per hit; a CorpusStore decodes only this row
+        row = train_df.row(idx) if isinstance(train_df, CorpusStore) else train_df.iloc[idx]
+        title = row['title'] if 'title' in train_df.columns else 'N/A'
+        ingredients = row['ingredients']
+        ingredients_clean = row['ingredients_clean']
         results.append({
             "rank": i + 1,
             "title": title,
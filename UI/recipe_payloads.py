@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# recipe_payloads.py
+import argparse
+import ast
+import html
+import json
+import re
+from functools import lru_cache
+
+from recipe_db import RECIPE_COLUMNS, connect_writer, fetch_recipes_by_ids
+
+BATCH_SIZE = 10000
+CARD_CACHE_SIZE = 4096
+
+PAYLOAD_COLUMNS = ["ingredients_json", "instructions_json"]
+
+# clean_instruction patterns, compiled once
+QUOTES_AND_BRACKETS = str.maketrans("", "", "[]\"'")
+NUMBER_ONLY = re.compile(r'^\d+\.?\s*$')
+LEADING_NUMBERED = re.compile(r'^\d+\.\s*')
+TRAILING_NUMBER = re.compile(r'\s+\d+\s*$')
+LEADING_NUMBER = re.compile(r'^\d+\s+')
+INNER_NUMBER = re.compile(r'\s+\d+\s+')
+
+
+def clean_instruction(step):
+    step = step.strip().translate(QUOTES_AND_BRACKETS)
+    step = NUMBER_ONLY.sub('', step)
+    step = LEADING_NUMBERED.sub('', step)
+    step = step.lstrip(',')
+    step = TRAILING_NUMBER.sub('', step)
+    step = LEADING_NUMBER.sub('', step)
+    step = INNER_NUMBER.sub(' ', step)
+    if step:
+        step = step[0].upper() + step[1:]
+    return step.strip()
+
+
+def parse_list(value):
+    """
+    Parse a stored "['a', 'b']" column with literal_eval; anything else yields [].
+    """
+    if not isinstance(value, str):
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        # Malformed, or too large / deeply nested for the parser
+        return []
+    return [str(item) for item in parsed] if isinstance(parsed, list) else []
+
+
+def clean_ingredients(ingredients):
+    cleaned = []
+    for ingredient in parse_list(ingredients):
+        ingredient = ingredient.strip().replace('"', '').replace("'", '')
+        if ingredient:
+            cleaned.append(ingredient)
+    return cleaned
+
+
+def clean_instructions(instructions):
+    return [step for step in map(clean_instruction, parse_list(instructions)) if step]
+
+
+def recipe_payload(ingredients, instructions):
+    """
+    The (ingredients_json, instructions_json) pair stored next to a recipe:
+    display-ready lists, parsed and cleaned once at ingestion.
+    """
+    return (json.dumps(clean_ingredients(ingredients)), json.dumps(clean_instructions(instructions)))
+
+
+# ---------------------------------------------
+# Ingestion
+# ---------------------------------------------
+def add_payload_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(recipes)")}
+    for column in PAYLOAD_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE recipes ADD COLUMN {column} TEXT")
+
+
+def has_payload_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(recipes)")}
+    return all(column in existing for column in PAYLOAD_COLUMNS)
+
+
+def store_payloads(conn, recipes):
+    """
+    Store the parsed payloads of (recipe_id, ingredients, instructions) rows.
+
+    Called by the ingestion writers next to index_recipes, so new recipes
+    render without parsing.
+    """
+    conn.executemany(
+        "UPDATE recipes SET ingredients_json = ?, instructions_json = ? WHERE rowid = ?",
+        ((*recipe_payload(ingredients, instructions), recipe_id) for recipe_id, ingredients, instructions in recipes)
+    )
+
+
+def backfill_payloads(db_path, batch_size=BATCH_SIZE):
+    """
+    Add the payload columns to an existing recipes database and fill every row.
+    """
+    conn = connect_writer(db_path)
+    try:
+        add_payload_columns(conn)
+        filled = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT rowid, ingredients, instructions FROM recipes WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            store_payloads(conn, rows)
+            conn.commit()
+            filled += len(rows)
+            last_id = rows[-1][0]
+            print(f"Stored payloads for {filled} recipes")
+        return filled
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------
+# Reading
+# ---------------------------------------------
+def fetch_recipes_with_payloads(conn, recipe_ids, payload_columns=None):
+    """
+    fetch_recipes_by_ids rows followed by (ingredients_json, instructions_json).
+
+    Stored payloads are used where present; a payload that is NULL (a row
+    written before the backfill) or a database without the columns is
+    parsed from the raw columns instead. payload_columns defaults to
+    has_payload_columns(conn).
+    """
+    if payload_columns is None:
+        payload_columns = has_payload_columns(conn)
+    if not payload_columns:
+        return [(*row, *recipe_payload(row[2], row[3])) for row in fetch_recipes_by_ids(conn, recipe_ids)]
+    return [
+        (recipe_id, title, ingredients, instructions,
+         ingredients_json if ingredients_json is not None else json.dumps(clean_ingredients(ingredients)),
+         instructions_json if instructions_json is not None else json.dumps(clean_instructions(instructions)))
+        for recipe_id, title, ingredients, instructions, ingredients_json, instructions_json
+        in fetch_recipes_by_ids(conn, recipe_ids, RECIPE_COLUMNS + PAYLOAD_COLUMNS)
+    ]
+
+
+# ---------------------------------------------
+# Card Rendering
+# ---------------------------------------------
+@lru_cache(maxsize=CARD_CACHE_SIZE)
+def card_html(recipe_id, title, ingredients_json, instructions_json):
+    """
+    The full HTML of one recipe card, memoized by recipe id and payload.
+
+    Rendered with a single st.markdown call instead of one per ingredient
+    and per step.
+    """
+    ingredients = json.loads(ingredients_json) if ingredients_json else []
+    instructions = json.loads(instructions_json) if instructions_json else []
+
+    parts = [
+        '<div class="recipe-card">',
+        f'<div class="recipe-title"> Recipe: {html.escape(str(title))}</div>',
+        '</div>',
+        '<h3>📝 Ingredients</h3>',
+    ]
+    if ingredients:
+        parts.append('<div class="ingredient-grid">')
+        parts.extend(f'<div class="ingredient-item">{html.escape(ingredient)}</div>' for ingredient in ingredients)
+        parts.append('</div>')
+    else:
+        parts.append('<p>No ingredients available</p>')
+
+    parts.append('<h3>👩‍🍳 Instructions</h3>')
+    if instructions:
+        parts.extend(
+            f'<div class="instruction-step"><strong>{number}.</strong> {html.escape(step)}</div>'
+            for number, step in enumerate(instructions, start=1)
+        )
+    else:
+        parts.append('<p>No instructions available</p>')
+    return "".join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store parsed ingredient/instruction payloads in a recipes database.")
+    parser.add_argument("db_path")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    backfill_payloads(args.db_path, args.batch_size)
@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+# search_service.py
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from artifact_store import ArtifactStore
+from ingredient_index import search_overlap, user_terms
+from ingredient_suggest import COMPLETION_LIMIT, suggester_from_env
+from recipe_db import ConnectionPool, check_model_alignment, fetch_recipes_by_ids, load_model_recipe_ids
+from recipe_model import preprocess_user_ingredients
+from result_cache import ResultCache, file_version
+from similarity_engine import SparseCosineIndex
+
+DEFAULT_K = 10
+MAX_K = 100
+BATCH_WINDOW_MS = 2.0
+MAX_BATCH_SIZE = 64
+LATENCY_WINDOW = 10000
+
+
+# ---------------------------------------------
+# Shared Search Backend
+# ---------------------------------------------
+class SearchBackend:
+    """
+    Model, index and DB handles shared by every request of the service.
+
+    Methods are blocking and thread-safe; each executor thread keeps its
+    own SQLite connection.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or ArtifactStore()
+        self.vectorizer = self.store.load("tfidf_vectorizer")
+        corpus_path = os.environ.get("PANTRYPALETTE_CORPUS_STORE")
+        if corpus_path:
+            # Memory-mapped corpus store, optionally sharded across worker processes
+            from corpus_store import CorpusStore
+            from sharded_search import sharded_index_from_env
+
+            corpus = CorpusStore(corpus_path)
+            self.engine = sharded_index_from_env(corpus_path) or corpus.engine()
+            # Engine rows are the corpus store's rows, in its own order
+            self.recipe_ids = np.asarray(corpus.recipe_ids)
+        else:
+            self.engine = SparseCosineIndex.from_nn_model(self.store.load("nearest_neighbors_model"))
+            self.recipe_ids = np.asarray(load_model_recipe_ids(self.store, self.engine.n_samples_fit_))
+        self.db_path = self.store.path("recipes_db")
+        self.pool = ConnectionPool(self.db_path)
+        self.cache = ResultCache()
+        self.suggester = suggester_from_env()
+        check_model_alignment(self.connection(), self.recipe_ids, self.engine.n_samples_fit_)
+
+    def connection(self):
+        return self.pool.thread_connection()
+
+    def canonical(self, ingredients):
+        """
+        preprocess_user_ingredients, with misspelled tokens corrected when the suggestion index is built.
+        """
+        canonical = preprocess_user_ingredients(ingredients)
+        if self.suggester is not None:
+            canonical = self.suggester.correct_canonical(canonical)
+        return canonical
+
+    def version(self):
+        return (tuple(sorted(self.store.versions().items())), file_version(self.db_path))
+
+    def overlap(self, ingredients, limit=DEFAULT_K):
+        """
+        Overlap search on the user's own terms, as in the app.
+        """
+        ingredient_list = user_terms(ingredients)
+        version = self.version()
+        self.cache.set_version(version)
+        return self.cache.get_or_compute(
+            (version, tuple(ingredient_list), "overlap", limit),
+            lambda: self._overlap(ingredient_list, limit)
+        )
+
+    def _overlap(self, ingredient_list, limit):
+        if not ingredient_list:
+            return []
+        conn = self.connection()
+        matches = search_overlap(conn, ingredient_list, limit=limit)
+        match_counts = dict(matches)
+        rows = fetch_recipes_by_ids(conn, [recipe_id for recipe_id, _ in matches])
+        return [
+            {
+                "rank": rank,
+                "id": recipe_id,
+                "title": title,
+                "match_score": round(match_counts[recipe_id] / len(ingredient_list) * 100, 2),
+                "ingredients": recipe_ingredients,
+                "instructions": instructions,
+            }
+            for rank, (recipe_id, title, recipe_ingredients, instructions) in enumerate(rows, start=1)
+        ]
+
+    def similar_batch(self, queries):
+        """
+        Similarity search for a batch of (ingredients, k) queries.
+
+        Cache misses are vectorized and scored in one call; the result
+        items mirror recipe_model.find_similar_recipes.
+        """
+        version = self.version()
+        self.cache.set_version(version)
+        canonicals = [self.canonical(ingredients) for ingredients, _ in queries]
+        keys = [(version, canonical, "similar", k) for canonical, (_, k) in zip(canonicals, queries)]
+
+        results = [None] * len(queries)
+        misses = []
+        for i, key in enumerate(keys):
+            found, value = self.cache.get(key)
+            if found:
+                results[i] = value
+            else:
+                misses.append(i)
+        if not misses:
+            return results
+
+        max_k = max(queries[i][1] for i in misses)
+        vectors = self.vectorizer.transform([canonicals[i] for i in misses])
+        distances, indices = self.engine.kneighbors(vectors, n_neighbors=max_k)
+        rows = fetch_recipes_by_ids(self.connection(), np.unique(self.recipe_ids[indices]))
+        recipes = {row[0]: row[1:] for row in rows}
+
+        for row, i in enumerate(misses):
+            k = queries[i][1]
+            items = []
+            for idx, dist in zip(indices[row][:k], distances[row][:k]):
+                recipe_id = int(self.recipe_ids[idx])
+                if recipe_id not in recipes:
+                    continue
+                title, recipe_ingredients, instructions = recipes[recipe_id]
+                items.append({
+                    "rank": len(items) + 1,
+                    "id": recipe_id,
+                    "title": title,
+                    "similarity": round((1 - dist) * 100, 2),
+                    "ingredients": recipe_ingredients,
+                    "instructions": instructions,
+                })
+            self.cache.put(keys[i], items)
+            results[i] = items
+        return results
+
+
+# ---------------------------------------------
+# Micro-Batching and Latency Stats
+# ---------------------------------------------
+class SimilarityBatcher:
+    """
+    Coalesce concurrent similarity requests into one batched backend call.
+
+    The first queued request opens a window of window_ms; everything that
+    arrives before it closes (up to max_batch) is scored together. One
+    batch runs at a time, so requests arriving meanwhile form the next one.
+    """
+
+    def __init__(self, backend, executor, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE):
+        self.backend = backend
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, ingredients, k):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((ingredients, k, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            queries = [(ingredients, k) for ingredients, k, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.backend.similar_batch, queries)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def percentiles(samples, unit="_ms"):
+    if not samples:
+        return {"count": 0}
+    values = np.fromiter(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50" + unit: round(p50, 3), "p95" + unit: round(p95, 3),
+            "p99" + unit: round(p99, 3), "max" + unit: round(values.max(), 3)}
+
+
+# ---------------------------------------------
+# HTTP/JSON Front End
+# ---------------------------------------------
+class BadRequest(ValueError):
+    pass
+
+
+def _parse_k(payload, default=DEFAULT_K):
+    k = payload.get("k", default)
+    # bool is an int subclass: true would pass as k=1
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= MAX_K:
+        raise BadRequest(f"k must be an integer between 1 and {MAX_K}")
+    return k
+
+
+def _parse_ingredients(payload):
+    ingredients = payload.get("ingredients")
+    if isinstance(ingredients, list):
+        ingredients = ", ".join(str(ing) for ing in ingredients)
+    if not isinstance(ingredients, str) or not ingredients.strip():
+        raise BadRequest("'ingredients' must be a non-empty string or list")
+    return ingredients
+
+
+class SearchService:
+    """
+    asyncio HTTP/1.1 JSON service in front of a SearchBackend.
+
+    POST /search/overlap   {"ingredients": "chicken, rice", "k": 10}
+    POST /search/similar   {"ingredients": "chicken, rice", "k": 10}
+    POST /search/batch     {"queries": [{"mode": "similar", "ingredients": ..., "k": ...}, ...]}
+    GET  /suggest?prefix=chick&k=10   ingredient completions, for per-keystroke autocomplete
+    GET  /stats            latency percentiles, batch sizes, cache stats
+    GET  /health
+    """
+
+    def __init__(self, backend, workers=8, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE):
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.batcher = SimilarityBatcher(backend, self.executor, window_ms, max_batch)
+        self.latencies = {}
+
+    async def _overlap(self, ingredients, k):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.backend.overlap, ingredients, k)
+
+    async def overlap(self, payload):
+        return await self._overlap(_parse_ingredients(payload), _parse_k(payload))
+
+    async def similar(self, payload):
+        return await self.batcher.submit(_parse_ingredients(payload), _parse_k(payload))
+
+    async def batch(self, payload):
+        queries = payload.get("queries")
+        if not isinstance(queries, list) or not queries:
+            raise BadRequest("'queries' must be a non-empty list")
+        handlers = {"overlap": self._overlap, "similar": self.batcher.submit}
+        # Validate every query before starting any, so a bad one leaves nothing running
+        parsed = []
+        for query in queries:
+            mode = query.get("mode", "similar") if isinstance(query, dict) else None
+            if mode not in handlers:
+                raise BadRequest("each query needs a 'mode' of 'overlap' or 'similar'")
+            parsed.append((handlers[mode], _parse_ingredients(query), _parse_k(query)))
+        return await asyncio.gather(*(handler(ingredients, k) for handler, ingredients, k in parsed))
+
+    async def suggest(self, params):
+        # Completion is a bisect plus a cached ranking, cheap enough to run on the event loop
+        prefix = params.get("prefix", "")
+        if not prefix.strip():
+            raise BadRequest("'prefix' must be a non-empty string")
+        limit = params.get("k", str(COMPLETION_LIMIT))
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_K:
+            raise BadRequest(f"k must be an integer between 1 and {MAX_K}")
+        return self.backend.suggester.complete(prefix, int(limit))
+
+    def stats(self):
+        return {
+            "latency": {route: percentiles(samples) for route, samples in self.latencies.items()},
+            "similarity_batch_size": percentiles(self.batcher.batch_sizes, unit=""),
+            "result_cache": self.backend.cache.stats(),
+        }
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path
+        routes = {
+            ("POST", "/search/overlap"): self.overlap,
+            ("POST", "/search/similar"): self.similar,
+            ("POST", "/search/batch"): self.batch,
+            ("GET", "/suggest"): self.suggest,
+        }
+        if (method, path) == ("GET", "/health"):
+            return 200, {"status": "ok"}
+        if (method, path) == ("GET", "/stats"):
+            return 200, self.stats()
+        if (method, path) == ("GET", "/suggest") and self.backend.suggester is None:
+            return 404, {"error": "the ingredient suggestion index is not built"}
+        handler = routes.get((method, path))
+        if handler is None:
+            return 404, {"error": f"no route for {method} {path}"}
+
+        start = time.perf_counter()
+        try:
+            if method == "GET":
+                payload = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            else:
+                payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise BadRequest("request body must be a JSON object")
+            result = {"results": await handler(payload)}
+            status = 200
+        except (BadRequest, json.JSONDecodeError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            result, status = {"error": str(e)}, 500
+        self.latencies.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(1000 * (time.perf_counter() - start))
+        return status, result
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        data = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0")
+                if len(parts) != 3 or not length.isdigit():
+                    # The rest of the stream cannot be framed: answer and close
+                    await self._respond(writer, 400, {"error": "malformed request line or Content-Length"}, False)
+                    break
+                method, target, version = parts
+                body = await reader.readexactly(int(length)) if int(length) else b""
+
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"PantryPalette search service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+# ---------------------------------------------
+# Load Generator
+# ---------------------------------------------
+async def load_test(host, port, queries, concurrency=32, requests=2000, mode="similar", k=DEFAULT_K):
+    """
+    Drive the service with concurrent keep-alive clients.
+
+    Returns client-side latency percentiles, throughput and the
+    service's own /stats snapshot.
+    """
+    latencies = []
+    counter = iter(range(requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                body = json.dumps({"ingredients": queries[i % len(queries)], "k": k}).encode()
+                start = time.perf_counter()
+                writer.write(
+                    f"POST /search/{mode} HTTP/1.1\r\nHost: {host}\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                length = 0
+                await reader.readline()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                latencies.append(1000 * (time.perf_counter() - start))
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return {
+        "client_latency": percentiles(latencies),
+        "throughput_qps": round(len(latencies) / elapsed, 1),
+        "service": json.loads(response.split(b"\r\n\r\n", 1)[1]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless JSON search service for PantryPalette.")
+    parser.add_argument("command", nargs="?", choices=["serve", "loadtest"], default="serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=32, help="loadtest: concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="loadtest: total requests")
+    parser.add_argument("--mode", choices=["similar", "overlap"], default="similar", help="loadtest: endpoint")
+    parser.add_argument("--queries", help="loadtest: file with one comma-separated ingredient list per line")
+    args = parser.parse_args()
+
+    if args.command == "loadtest":
+        queries = ["chicken, rice", "tomato, cheese, pasta", "egg, flour, sugar, butter", "onion, garlic, beef"]
+        if args.queries:
+            with open(args.queries) as f:
+                queries = [line.strip() for line in f if line.strip()]
+        report = asyncio.run(load_test(args.host, args.port, queries, args.concurrency, args.requests, args.mode))
+        print(json.dumps(report, indent=2))
+    else:
+        service = SearchService(SearchBackend(), args.workers, args.batch_window_ms, args.max_batch)
+        asyncio.run(service.serve(args.host, args.port))
@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# segmented_index.py
+import argparse
+import copy
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from similarity_engine import SparseCosineIndex, l2_normalize, top_k
+
+MANIFEST_NAME = "segments.json"
+
+# Compact once the delta segments hold this fraction of the main segment's rows...
+COMPACTION_RATIO = 0.1
+# ...or once there are this many delta segments
+MAX_DELTA_SEGMENTS = 16
+
+
+def _atomic_write(path, write):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def refresh_idf(vectorizer, document_frequency, n_documents):
+    """
+    Return a copy of a fitted TfidfVectorizer with IDF recomputed from new counts.
+
+    The vocabulary stays frozen; only idf_ changes, with sklearn's formula.
+    """
+    if vectorizer.smooth_idf:
+        idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+    else:
+        idf = np.log(n_documents / np.maximum(document_frequency, 1)) + 1
+    refreshed = copy.deepcopy(vectorizer)
+    refreshed.idf_ = idf
+    return refreshed
+
+
+def reweight(matrix, old_idf, new_idf):
+    """
+    Re-express L2-normalized TF-IDF rows under a new IDF.
+
+    Row = tf * idf / norm, so scaling column j by new_idf[j] / old_idf[j]
+    and normalizing again gives exactly normalize(tf * new_idf).
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float64, copy=True)
+    matrix.data *= (new_idf / old_idf)[matrix.indices]
+    return l2_normalize(matrix)
+
+
+class Segment:
+    """
+    One immutable block of recipe vectors plus its mutable tombstone mask.
+    """
+
+    def __init__(self, name, matrix, recipe_ids, deleted=None, normalized=False):
+        self.name = name
+        self.engine = SparseCosineIndex(matrix, normalized=normalized)
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        self.deleted = np.zeros(len(self.recipe_ids), dtype=bool) if deleted is None else deleted
+        self._order = np.argsort(self.recipe_ids, kind="stable")
+
+    @property
+    def matrix(self):
+        return self.engine.matrix
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def live_rows(self):
+        return int(len(self.recipe_ids) - self.deleted.sum())
+
+    def positions(self, recipe_ids):
+        """
+        Live positions holding any of recipe_ids.
+        """
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        sorted_ids = self.recipe_ids[self._order]
+        left = np.searchsorted(sorted_ids, recipe_ids, side="left")
+        right = np.searchsorted(sorted_ids, recipe_ids, side="right")
+        found = np.concatenate([self._order[l:r] for l, r in zip(left, right)] or [np.empty(0, dtype=np.int64)])
+        return found[~self.deleted[found]]
+
+
+class SegmentedIndex:
+    """
+    Similarity index made of a main segment and small delta segments.
+
+    New recipes are vectorized with the frozen vectorizer into a delta
+    segment that is searched alongside the main one; per-segment top-k
+    lists are merged by score. Deleting or updating a recipe tombstones
+    its old row. compact() folds every live row into a new main segment
+    and refreshes the IDF from the current document frequencies, either
+    inline or on a background thread; searches keep using the previous
+    segments until the new ones are swapped in.
+
+    With a directory, every change is persisted there (segment .npz
+    files, tombstone masks and segments.json, replaced atomically) so an
+    ingestion process can write while app processes call reload().
+    Only one writer per directory is supported.
+
+    documents is the document form the vectorizer was fitted on
+    (recipe_model.DOCUMENT_FORMS); it is recorded in segments.json and a
+    directory written for another form is refused.
+    """
+
+    def __init__(self, vectorizer, main_matrix, main_recipe_ids, directory=None, n_neighbors=10,
+                 compaction_ratio=COMPACTION_RATIO, max_delta_segments=MAX_DELTA_SEGMENTS, documents="raw"):
+        self.n_neighbors = n_neighbors
+        self.documents = documents
+        self.compaction_ratio = compaction_ratio
+        self.max_delta_segments = max_delta_segments
+        self.directory = directory
+        self.base_vectorizer = vectorizer
+        self.base_segment = Segment("main", main_matrix, main_recipe_ids)
+        self._lock = threading.RLock()
+        self._compaction = None
+        self._manifest_mtime = None
+
+        self.vectorizer = vectorizer
+        self.generation = 0
+        self.segments = (self.base_segment,)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.reload()
+
+    # ---------------------------------------------
+    # Persistence
+    # ---------------------------------------------
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _load_segment(self, name, deleted_file):
+        data = np.load(self._path(f"{name}.npz"))
+        matrix = sp.csr_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+        deleted = np.load(self._path(deleted_file)) if deleted_file else None
+        return Segment(name, matrix, data["recipe_ids"], deleted, normalized=True)
+
+    def _save_segment(self, segment):
+        matrix = segment.matrix
+        _atomic_write(self._path(f"{segment.name}.npz"), lambda f: np.savez(
+            f, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+            shape=np.array(matrix.shape), recipe_ids=segment.recipe_ids
+        ))
+
+    def _save_manifest(self):
+        if not self.directory:
+            return
+        entries = []
+        for segment in self.segments:
+            deleted_file = None
+            if segment.deleted.any():
+                deleted_file = f"{segment.name}.g{self.generation}.del.npy"
+                _atomic_write(self._path(deleted_file), lambda f: np.save(f, segment.deleted))
+            entries.append({"name": segment.name, "deleted": deleted_file})
+        idf_file = None
+        if self.vectorizer is not self.base_vectorizer:
+            idf_file = f"idf.g{self.generation}.npy"
+            _atomic_write(self._path(idf_file), lambda f: np.save(f, self.vectorizer.idf_))
+        manifest = {"generation": self.generation, "idf": idf_file, "documents": self.documents, "segments": entries}
+        _atomic_write(self._path(MANIFEST_NAME), lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+        self._manifest_mtime = os.stat(self._path(MANIFEST_NAME)).st_mtime_ns
+        self._remove_unreferenced(manifest)
+
+    def _remove_unreferenced(self, manifest):
+        keep = {MANIFEST_NAME, manifest["idf"]}
+        for entry in manifest["segments"]:
+            keep.update((f"{entry['name']}.npz", entry["deleted"]))
+        for filename in os.listdir(self.directory):
+            if filename not in keep and filename.endswith((".npz", ".npy")):
+                os.remove(self._path(filename))
+
+    def reload(self):
+        """
+        Pick up segments written by another process; returns True if anything changed.
+        """
+        path = self._path(MANIFEST_NAME)
+        if not os.path.exists(path):
+            return False
+        mtime = os.stat(path).st_mtime_ns
+        if mtime == self._manifest_mtime:
+            return False
+        with open(path) as f:
+            manifest = json.load(f)
+        documents = manifest.get("documents", "raw")
+        if documents != self.documents:
+            raise ValueError(f"Segments in {self.directory} were vectorized from {documents} documents "
+                             f"but the model was fitted on {self.documents} ones")
+
+        with self._lock:
+            current = {segment.name: segment for segment in self.segments}
+            current.setdefault("main", self.base_segment)
+            try:
+                segments, masks = [], []
+                for entry in manifest["segments"]:
+                    segment = current.get(entry["name"])
+                    if segment is None:
+                        segment = self._load_segment(entry["name"], entry["deleted"])
+                    elif entry["deleted"]:
+                        masks.append((segment, np.load(self._path(entry["deleted"]))))
+                    segments.append(segment)
+                vectorizer = self.base_vectorizer
+                if manifest["idf"]:
+                    vectorizer = copy.deepcopy(self.base_vectorizer)
+                    vectorizer.idf_ = np.load(self._path(manifest["idf"]))
+            except FileNotFoundError:
+                # The writer replaced the manifest meanwhile; pick it up next time
+                return False
+            for segment, deleted in masks:
+                segment.deleted = deleted
+            self.vectorizer = vectorizer
+            self.segments = tuple(segments)
+            self.generation = manifest["generation"]
+            self._manifest_mtime = mtime
+        return True
+
+    # ---------------------------------------------
+    # Writes
+    # ---------------------------------------------
+    def _next_name(self, prefix):
+        self.generation += 1
+        return f"{prefix}-{self.generation:06d}"
+
+    def _tombstone(self, recipe_ids):
+        deleted = 0
+        for segment in self.segments:
+            positions = segment.positions(recipe_ids)
+            segment.deleted[positions] = True
+            deleted += len(positions)
+        return deleted
+
+    def add_recipes(self, recipes):
+        """
+        Insert or update (recipe_id, ingredients) pairs as a new delta segment.
+
+        ingredients is the stored ingredients column, turned into the
+        document form the main model was fitted on. Older rows of the same
+        recipes are tombstoned.
+        """
+        from recipe_model import model_document
+
+        recipes = list(recipes)
+        if not recipes:
+            return None
+        recipe_ids = [int(recipe_id) for recipe_id, _ in recipes]
+        documents = [model_document(ingredients, self.documents) for _, ingredients in recipes]
+        with self._lock:
+            vectors = self.vectorizer.transform(documents)
+            segment = Segment(self._next_name("delta"), vectors, recipe_ids)
+            self._tombstone(recipe_ids)
+            if self.directory:
+                self._save_segment(segment)
+            self.segments = self.segments + (segment,)
+            self._save_manifest()
+        return segment.name
+
+    def delete_recipes(self, recipe_ids):
+        """
+        Tombstone every live row of recipe_ids; returns the number of rows deleted.
+        """
+        with self._lock:
+            deleted = self._tombstone([int(recipe_id) for recipe_id in recipe_ids])
+            if deleted:
+                self.generation += 1
+                self._save_manifest()
+        return deleted
+
+    # ---------------------------------------------
+    # Search
+    # ---------------------------------------------
+    def search(self, query_vectors, k=None):
+        """
+        Top-k live recipes per query row, merged across segments.
+
+        Returns one (recipe_ids, similarities) pair of arrays per query.
+        Ties are broken by segment order and row, as in a single index.
+        """
+        k = k or self.n_neighbors
+        segments = self.segments
+        per_query = [([], [], []) for _ in range(query_vectors.shape[0])]
+        offset = 0
+        for segment in segments:
+            scores = segment.engine.scores(query_vectors)
+            for row, segment_scores in enumerate(scores):
+                segment_scores[segment.deleted] = -np.inf
+                best = top_k(segment_scores, k)
+                best = best[np.isfinite(segment_scores[best])]
+                ids, sims, order = per_query[row]
+                ids.append(segment.recipe_ids[best])
+                sims.append(segment_scores[best])
+                order.append(offset + best)
+            offset += len(segment)
+
+        results = []
+        for ids, sims, order in per_query:
+            ids, sims, order = np.concatenate(ids), np.concatenate(sims), np.concatenate(order)
+            best = np.lexsort((order, -sims))[:k]
+            results.append((ids[best], sims[best]))
+        return results
+
+    def search_text(self, documents, k=None):
+        return self.search(self.vectorizer.transform(documents), k)
+
+    # ---------------------------------------------
+    # Compaction
+    # ---------------------------------------------
+    def delta_rows(self):
+        return sum(len(segment) for segment in self.segments[1:])
+
+    def needs_compaction(self):
+        main_rows = max(len(self.segments[0]), 1)
+        return (len(self.segments) - 1 >= self.max_delta_segments
+                or self.delta_rows() >= self.compaction_ratio * main_rows)
+
+    def compact(self, refresh=True):
+        """
+        Fold every live row into one main segment, refreshing the IDF.
+
+        Writes that land while the new segment is built are kept: newer
+        delta segments stay (re-weighted to the new IDF) and tombstones
+        on folded rows are carried over.
+        """
+        with self._lock:
+            folded = self.segments
+            deleted_before = [segment.deleted.copy() for segment in folded]
+            vectorizer = self.vectorizer
+
+        live = [~deleted for deleted in deleted_before]
+        matrix = sp.vstack([segment.matrix[mask] for segment, mask in zip(folded, live)], format="csr")
+        recipe_ids = np.concatenate([segment.recipe_ids[mask] for segment, mask in zip(folded, live)])
+        if refresh:
+            document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+            new_vectorizer = refresh_idf(vectorizer, document_frequency, matrix.shape[0])
+            matrix = reweight(matrix, vectorizer.idf_, new_vectorizer.idf_)
+        else:
+            new_vectorizer = vectorizer
+
+        with self._lock:
+            main = Segment(self._next_name("main"), matrix, recipe_ids, normalized=True)
+            # Tombstones added to the folded segments during the rebuild
+            for segment, deleted in zip(folded, deleted_before):
+                newly_deleted = segment.recipe_ids[segment.deleted & ~deleted]
+                main.deleted[main.positions(newly_deleted)] = True
+            newer = []
+            for segment in self.segments[len(folded):]:
+                if new_vectorizer is not vectorizer:
+                    segment = Segment(segment.name, reweight(segment.matrix, vectorizer.idf_, new_vectorizer.idf_),
+                                      segment.recipe_ids, segment.deleted, normalized=True)
+                    if self.directory:
+                        self._save_segment(segment)
+                newer.append(segment)
+            if self.directory:
+                self._save_segment(main)
+            self.segments = (main, *newer)
+            self.vectorizer = new_vectorizer
+            self._save_manifest()
+        return main.name
+
+    def maybe_compact(self, background=True):
+        """
+        Start a compaction if the threshold is crossed and none is running.
+
+        Returns the background thread (or the new segment name inline), or None.
+        """
+        with self._lock:
+            if not self.needs_compaction() or (self._compaction and self._compaction.is_alive()):
+                return None
+            if not background:
+                return self.compact()
+            self._compaction = threading.Thread(target=self.compact, name="segment-compaction", daemon=True)
+            self._compaction.start()
+            return self._compaction
+
+    def stats(self):
+        return {
+            "generation": self.generation,
+            "segments": [{"name": s.name, "rows": len(s), "live": s.live_rows()} for s in self.segments],
+            "delta_rows": self.delta_rows(),
+            "needs_compaction": self.needs_compaction(),
+        }
+
+
+def open_segmented_index(directory, store=None, **kwargs):
+    """
+    Segmented index over the app's fitted artifacts plus the deltas in directory.
+    """
+    from artifact_store import ArtifactStore
+    from recipe_db import load_model_recipe_ids
+
+    store = store or ArtifactStore()
+    matrix = store.load("nearest_neighbors_model")._fit_X
+    return SegmentedIndex(
+        store.load("tfidf_vectorizer"),
+        matrix,
+        load_model_recipe_ids(store, matrix.shape[0]),
+        directory=directory,
+        documents=store.document_form(),
+        **kwargs
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or compact a segmented similarity index.")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("directory", nargs="?", default=os.path.join("models", "segments"))
+    parser.add_argument("--no-refresh", action="store_true", help="compact without recomputing the IDF")
+    args = parser.parse_args()
+
+    index = open_segmented_index(args.directory)
+    if args.command == "compact":
+        print(f"Compacted into {index.compact(refresh=not args.no_refresh)}")
+    print(json.dumps(index.stats(), indent=2))
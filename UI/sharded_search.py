@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# sharded_search.py
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from similarity_engine import QUERY_BATCH_SIZE, SparseCosineIndex, top_k
+
+# Worker processes are spawned, not forked, so a pool can be started from
+# a threaded server (Streamlit, the search service) safely
+MP_CONTEXT = "spawn"
+
+
+def shard_bounds(n_rows, n_shards):
+    """
+    Split n_rows into n_shards contiguous [start, stop) row ranges of near-equal size.
+    """
+    n_shards = max(1, min(n_shards, n_rows))
+    edges = np.linspace(0, n_rows, n_shards + 1).astype(np.int64)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def shard_view(matrix, start, stop):
+    """
+    Rows [start, stop) of a CSR matrix sharing its data and indices (no copy).
+
+    matrix[start:stop] would copy the shard out of the memory map.
+    """
+    low, high = matrix.indptr[start], matrix.indptr[stop]
+    return sp.csr_matrix(
+        (matrix.data[low:high], matrix.indices[low:high], np.asarray(matrix.indptr[start:stop + 1]) - low),
+        shape=(stop - start, matrix.shape[1]), copy=False
+    )
+
+
+# ---------------------------------------------
+# Shard Scoring
+# ---------------------------------------------
+class ShardSet:
+    """
+    Shard engines over one corpus store's memory-mapped TF-IDF matrix.
+    """
+
+    def __init__(self, corpus_path, bounds):
+        from corpus_store import CorpusStore
+
+        self.matrix = CorpusStore(corpus_path).tfidf_matrix()
+        self.bounds = bounds
+        self.engines = [
+            SparseCosineIndex(shard_view(self.matrix, start, stop), normalized=True) for start, stop in bounds
+        ]
+
+    def score(self, shard, queries, k):
+        """
+        Per-query top k of one shard as (global positions, scores) pairs.
+
+        Queries are scored in QUERY_BATCH_SIZE blocks exactly like
+        SparseCosineIndex.kneighbors, so every score is bit-identical to
+        the unsharded one.
+        """
+        engine, start = self.engines[shard], self.bounds[shard][0]
+        results = []
+        for offset in range(0, queries.shape[0], QUERY_BATCH_SIZE):
+            for row in engine.scores(queries[offset:offset + QUERY_BATCH_SIZE]):
+                top = top_k(row, k)
+                results.append((top + start, row[top]))
+        return results
+
+
+# Set in each worker process by the pool initializer
+_worker_shards = None
+
+
+def _init_worker(corpus_path, bounds):
+    """
+    Map the corpus store once per worker process.
+    """
+    global _worker_shards
+    _worker_shards = ShardSet(corpus_path, bounds)
+
+
+def _score_shard(shard, queries, k):
+    return _worker_shards.score(shard, queries, k)
+
+
+# ---------------------------------------------
+# Coordinator
+# ---------------------------------------------
+class ShardedIndex:
+    """
+    Exact cosine top-k over a corpus store's matrix split into row shards.
+
+    Drop-in replacement for SparseCosineIndex. Every query block is sent
+    to each shard, the shards are scored by a persistent worker pool that
+    maps the same corpus store (one copy in the page cache), and the
+    per-shard top k lists are merged by score, then position. That is the
+    order top_k uses, so the merged neighbors and distances are identical
+    to the unsharded engine's.
+
+    executor="process" scores shards in spawned worker processes,
+    "thread" in a thread pool of this process (scipy and numpy release
+    the GIL in the scoring kernels); workers=0 scores every shard inline.
+    """
+
+    def __init__(self, corpus_path, n_shards=None, workers=None, n_neighbors=10, executor="process"):
+        from corpus_store import CorpusStore
+
+        self.corpus_path = corpus_path
+        self.matrix = CorpusStore(corpus_path).tfidf_matrix()
+        self.n_neighbors = n_neighbors
+        self.n_samples_fit_ = self.matrix.shape[0]
+        self.n_features_in_ = self.matrix.shape[1]
+
+        self.workers = os.cpu_count() if workers is None else workers
+        self.bounds = shard_bounds(self.n_samples_fit_, n_shards or max(1, self.workers))
+        self.n_shards = len(self.bounds)
+
+        if executor not in ("process", "thread"):
+            raise ValueError(f"executor must be 'process' or 'thread', not {executor!r}")
+        self.executor = executor if self.workers else None
+        self.shards = None
+        if self.executor == "process":
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(MP_CONTEXT),
+                initializer=_init_worker, initargs=(corpus_path, self.bounds)
+            )
+        else:
+            self.shards = ShardSet(corpus_path, self.bounds)
+            self.pool = ThreadPoolExecutor(max_workers=self.workers) if self.executor == "thread" else None
+
+    def warm_up(self):
+        """
+        Start every worker and map every shard before the first real query.
+        """
+        self.kneighbors(sp.csr_matrix((1, self.n_features_in_)), n_neighbors=1)
+
+    def _shard_results(self, queries, k):
+        if self.pool is None:
+            return [self.shards.score(shard, queries, k) for shard in range(self.n_shards)]
+        score = _score_shard if self.executor == "process" else self.shards.score
+        futures = [self.pool.submit(score, shard, queries, k) for shard in range(self.n_shards)]
+        return [future.result() for future in futures]
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        """
+        Same contract as SparseCosineIndex.kneighbors.
+        """
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_)
+        X = sp.csr_matrix(X)
+        n_queries = X.shape[0]
+        distances = np.empty((n_queries, k), dtype=np.float64)
+        indices = np.empty((n_queries, k), dtype=np.int64)
+
+        shard_results = self._shard_results(X, k)
+        for query in range(n_queries):
+            positions = np.concatenate([results[query][0] for results in shard_results])
+            scores = np.concatenate([results[query][1] for results in shard_results])
+            best = np.lexsort((positions, -scores))[:k]
+            indices[query] = positions[best]
+            distances[query] = np.clip(1.0 - scores[best], 0.0, 2.0)
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def sharded_index_from_env(corpus_path, n_neighbors=10):
+    """
+    ShardedIndex configured by the environment, or None when sharding is off.
+
+        PANTRYPALETTE_SEARCH_WORKERS   worker count; unset disables sharding
+        PANTRYPALETTE_SEARCH_SHARDS    shard count (default: one per worker)
+        PANTRYPALETTE_SEARCH_EXECUTOR  "process" (default) or "thread"
+    """
+    workers = os.environ.get("PANTRYPALETTE_SEARCH_WORKERS")
+    if not workers:
+        return None
+    shards = os.environ.get("PANTRYPALETTE_SEARCH_SHARDS")
+    index = ShardedIndex(
+        corpus_path, int(shards) if shards else None, int(workers), n_neighbors,
+        executor=os.environ.get("PANTRYPALETTE_SEARCH_EXECUTOR", "process")
+    )
+    index.warm_up()
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a sharded index against the unsharded engine.")
+    parser.add_argument("corpus_path", nargs="?", default=os.path.join("models", "corpus"))
+    parser.add_argument("--shards", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    from corpus_store import CorpusStore
+
+    engine = CorpusStore(args.corpus_path).engine()
+    sharded = ShardedIndex(args.corpus_path, args.shards, args.workers)
+    # Recipe rows themselves make realistic queries
+    rows = np.random.default_rng(0).choice(engine.n_samples_fit_, size=min(args.queries, engine.n_samples_fit_),
+                                           replace=False)
+    queries = engine.matrix[np.sort(rows)]
+    expected = engine.kneighbors(queries, n_neighbors=args.k)
+    found = sharded.kneighbors(queries, n_neighbors=args.k)
+    sharded.close()
+    identical = all(np.array_equal(a, b) for a, b in zip(expected, found))
+    print(f"{sharded.n_shards} shards, {sharded.workers} workers: "
+          f"{'identical to' if identical else 'DIFFERS from'} the unsharded engine on {len(rows)} queries")
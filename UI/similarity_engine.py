@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# similarity_engine.py
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+# Queries scored together; bounds the dense (n_recipes x batch) score block
+QUERY_BATCH_SIZE = 16
+
+
+def l2_normalize(matrix):
+    """
+    Return a float64 CSR copy of matrix with unit-length rows (zero rows stay zero).
+
+    Same arithmetic as sklearn.preprocessing.normalize, without importing sklearn.
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float64, copy=True)
+    norms = np.sqrt(np.bincount(
+        np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr)),
+        weights=matrix.data ** 2,
+        minlength=matrix.shape[0]
+    ))
+    norms[norms == 0.0] = 1.0
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+    return matrix
+
+
+def top_k(scores, k):
+    """
+    Return the positions of the k highest scores, best first.
+
+    Ties are broken by position so the result does not depend on how the
+    scores were computed or partitioned (see sharded search).
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        threshold = scores[candidates].min()
+        # argpartition picks arbitrarily among scores equal to the threshold
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order].astype(np.int64)
+
+
+class SparseCosineIndex:
+    """
+    Exact cosine top-k search over an L2-normalized CSR recipe matrix.
+
+    Drop-in replacement for NearestNeighbors(metric='cosine'): kneighbors
+    returns the same (distances, indices) arrays, but a query is scored
+    with a single sparse matrix-vector product and the top k is taken with
+    argpartition instead of sorting every distance.
+
+    Pass normalized=True for a matrix whose rows are already unit length
+    (e.g. a memory-mapped corpus store) to use it as-is instead of copying.
+    """
+
+    def __init__(self, recipe_vectors, n_neighbors=10, normalized=False):
+        if normalized:
+            self.matrix = sp.csr_matrix(recipe_vectors, copy=False)
+        else:
+            self.matrix = l2_normalize(recipe_vectors)
+        self.n_neighbors = n_neighbors
+        self.n_samples_fit_ = self.matrix.shape[0]
+        self.n_features_in_ = self.matrix.shape[1]
+
+    @classmethod
+    def from_nn_model(cls, nn_model):
+        """
+        Build the index from a fitted sklearn NearestNeighbors model.
+        """
+        return cls(nn_model._fit_X, n_neighbors=nn_model.n_neighbors)
+
+    def scores(self, query_vectors):
+        """
+        Cosine similarity of every query row against every recipe, shape (n_queries, n_recipes).
+        """
+        queries = l2_normalize(query_vectors)
+        if queries.shape[0] == 1:
+            return (self.matrix @ queries.toarray().ravel())[np.newaxis, :]
+        return np.asarray(self.matrix @ queries.toarray().T).T
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        """
+        Find the n_neighbors most similar recipes for each query row.
+
+        Returns (distances, indices) with cosine distances (1 - similarity),
+        or only indices when return_distance is False.
+        """
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_)
+        X = sp.csr_matrix(X)
+        n_queries = X.shape[0]
+        distances = np.empty((n_queries, k), dtype=np.float64)
+        indices = np.empty((n_queries, k), dtype=np.int64)
+
+        for start in range(0, n_queries, QUERY_BATCH_SIZE):
+            block = self.scores(X[start:start + QUERY_BATCH_SIZE])
+            for offset, row in enumerate(block):
+                top = top_k(row, k)
+                indices[start + offset] = top
+                distances[start + offset] = np.clip(1.0 - row[top], 0.0, 2.0)
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+
+def similarity_models_from_env(store):
+    """
+    The app's similarity models as the environment selects them.
+
+    Returns (vectorizer, engine, recipe_ids), recipe_ids mapping engine
+    rows to recipe primary keys. The engine is the exact sparse engine
+    over the nearest-neighbors model, or over the memory-mapped corpus
+    store of PANTRYPALETTE_CORPUS_STORE (sharded when
+    PANTRYPALETTE_SEARCH_WORKERS is set); PANTRYPALETTE_SIMILARITY_BACKEND
+    switches to the dense embedding ("dense") or wraps the engine in
+    approximate retrieval ("approximate").
+    """
+    vectorizer = store.load("tfidf_vectorizer")
+    backend = os.environ.get("PANTRYPALETTE_SIMILARITY_BACKEND", "exact")
+    corpus_path = os.environ.get("PANTRYPALETTE_CORPUS_STORE")
+    if backend == "dense":
+        # Truncated-SVD embeddings, one BLAS matrix multiply per query batch
+        from dense_embedding import DenseCosineIndex, default_dense_dir
+
+        engine = DenseCosineIndex(default_dense_dir(store))
+        engine.check_model(vectorizer, store.versions()["tfidf_vectorizer"])
+        return vectorizer, engine, engine.recipe_ids
+
+    if corpus_path:
+        # Memory-mapped matrix shared through the page cache by every worker
+        from corpus_store import CorpusStore
+        from sharded_search import sharded_index_from_env
+
+        corpus = CorpusStore(corpus_path)
+        engine = sharded_index_from_env(corpus_path) or corpus.engine()
+        recipe_ids = corpus.recipe_ids
+    else:
+        from recipe_db import load_model_recipe_ids
+
+        engine = SparseCosineIndex.from_nn_model(store.load("nearest_neighbors_model"))
+        recipe_ids = load_model_recipe_ids(store, engine.n_samples_fit_)
+
+    # Optional approximate retrieval for very large corpora
+    if backend == "approximate":
+        from approximate_search import ImpactOrderedIndex
+
+        max_postings = os.environ.get("PANTRYPALETTE_MAX_POSTINGS")
+        engine = ImpactOrderedIndex.from_engine(
+            engine,
+            max_postings=int(max_postings) if max_postings else None,
+            rerank_depth=int(os.environ.get("PANTRYPALETTE_RERANK_DEPTH", "200"))
+        )
+    return vectorizer, engine, recipe_ids
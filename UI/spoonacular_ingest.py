@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+# spoonacular_ingest.py
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from recipe_db import MAX_IN_PARAMS, connect_writer
+
+DEFAULT_BASE_URL = "https://api.spoonacular.com"
+DEFAULT_RATE = 1.0          # requests per second
+DEFAULT_BURST = 5
+DEFAULT_CONCURRENCY = 8
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5          # seconds, doubled on every retry
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Credentials never become part of a cache key (or a recording)
+UNCACHED_PARAMS = {"apiKey"}
+
+# Recipes written per transaction
+BATCH_SIZE = 500
+
+# Spoonacular ids live in their own namespace; recipes.rowid stays the app's key
+MAPPING_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS spoonacular_recipes (
+        spoonacular_id INTEGER PRIMARY KEY,
+        recipe_id INTEGER NOT NULL UNIQUE,
+        fetched_at REAL NOT NULL
+    );
+"""
+
+
+class IngestError(RuntimeError):
+    pass
+
+
+# ---------------------------------------------
+# Rate Limit
+# ---------------------------------------------
+class TokenBucket:
+    """
+    asyncio token bucket: rate tokens per second, at most burst saved up.
+
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ---------------------------------------------
+# On-Disk Response Cache
+# ---------------------------------------------
+def cache_key(path, params):
+    items = sorted((name, str(value)) for name, value in params.items() if name not in UNCACHED_PARAMS)
+    return hashlib.sha256(f"{path}?{urlencode(items)}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    One JSON file per successful GET, keyed by path and parameters.
+
+    A re-run answers every request it has seen from disk, so it costs no
+    API quota; the same files are what the replay server serves.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, path, params):
+        """
+        Return (found, payload).
+        """
+        try:
+            with open(self._path(cache_key(path, params))) as f:
+                return True, json.load(f)["body"]
+        except FileNotFoundError:
+            return False, None
+
+    def put(self, path, params, payload):
+        file_path = self._path(cache_key(path, params))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        recorded = {name: value for name, value in params.items() if name not in UNCACHED_PARAMS}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"path": path, "params": recorded, "body": payload}, f)
+        os.replace(tmp_path, file_path)
+
+
+# ---------------------------------------------
+# Client
+# ---------------------------------------------
+class SpoonacularClient:
+    """
+    Concurrent Spoonacular GETs under a token-bucket rate limit.
+
+    Requests run on a thread pool of keep-alive sessions, at most
+    concurrency at a time; 429/5xx responses and connection errors are
+    retried with exponential backoff and jitter (honoring Retry-After).
+    Other errors, such as 402 when the daily quota is spent, raise
+    IngestError.
+
+        SPOONACULAR_API_KEY            API key (omitted when unset, e.g. for the replay server)
+        PANTRYPALETTE_SPOONACULAR_URL  base URL (default https://api.spoonacular.com)
+    """
+
+    def __init__(self, api_key=None, base_url=None, cache_dir=None, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 concurrency=DEFAULT_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.api_key = api_key or os.environ.get("SPOONACULAR_API_KEY")
+        self.base_url = (base_url or os.environ.get("PANTRYPALETTE_SPOONACULAR_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.max_retries = max_retries
+        self.stats = Counter()
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+        return session
+
+    def _get(self, url, params):
+        response = self._session().get(url, params=params, timeout=REQUEST_TIMEOUT)
+        return response.status_code, response.headers.get("Retry-After"), response.text
+
+    def _backoff(self, attempt, retry_after):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+        try:
+            return max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            return delay
+
+    async def get_json(self, path, params=None, use_cache=True):
+        """
+        GET a JSON endpoint, from the response cache when it has the answer.
+
+        With use_cache=False the cache is not read, only updated with the
+        fresh response.
+        """
+        import requests
+
+        params = dict(params or {})
+        if self.cache is not None and use_cache:
+            found, payload = self.cache.get(path, params)
+            if found:
+                self.stats["cache_hits"] += 1
+                return payload
+
+        query = dict(params, apiKey=self.api_key) if self.api_key else params
+        loop = asyncio.get_running_loop()
+        error = None
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt - 1, retry_after))
+                await self.bucket.acquire()
+                self.stats["requests"] += 1
+                try:
+                    status, retry_after, body = await loop.run_in_executor(
+                        self.executor, self._get, self.base_url + path, query
+                    )
+                except requests.RequestException as e:
+                    retry_after, error = None, str(e)
+                    continue
+                if status == 200:
+                    payload = json.loads(body)
+                    if self.cache is not None:
+                        self.cache.put(path, params, payload)
+                    return payload
+                if status not in RETRY_STATUSES:
+                    raise IngestError(f"GET {path} failed with HTTP {status}: {body[:200]}")
+                error = f"HTTP {status}"
+        raise IngestError(f"GET {path} failed after {self.max_retries + 1} attempts: {error}")
+
+    async def find_by_ingredients(self, ingredients, number=10):
+        return await self.get_json(
+            "/recipes/findByIngredients", {"ingredients": ",".join(ingredients), "number": number}
+        )
+
+    async def recipe_information(self, recipe_id, refresh=False):
+        return await self.get_json(f"/recipes/{int(recipe_id)}/information", use_cache=not refresh)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+# ---------------------------------------------
+# Bulk Upsert
+# ---------------------------------------------
+def recipe_row(details):
+    """
+    (spoonacular_id, title, ingredients, instructions) in the recipes table's format.
+
+    Lists are stored as their Python repr, like the RecipeNLG rows, so
+    parse_list and preprocess_ingredients read them unchanged.
+    """
+    ingredients = [ingredient["original"] for ingredient in details.get("extendedIngredients") or []
+                   if ingredient.get("original")]
+    steps = [step["step"] for block in details.get("analyzedInstructions") or [] for step in block.get("steps", [])]
+    return int(details["id"]), details.get("title") or "", str(ingredients), str(steps)
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def known_spoonacular_ids(conn, spoonacular_ids):
+    """
+    Map the already ingested spoonacular ids to their recipes.rowid.
+    """
+    spoonacular_ids = [int(spoonacular_id) for spoonacular_id in spoonacular_ids]
+    known = {}
+    for start in range(0, len(spoonacular_ids), MAX_IN_PARAMS):
+        chunk = spoonacular_ids[start:start + MAX_IN_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        known.update(conn.execute(
+            f"SELECT spoonacular_id, recipe_id FROM spoonacular_recipes WHERE spoonacular_id IN ({placeholders})", chunk
+        ))
+    return known
+
+
+def upsert_recipes(conn, rows, index_cache=None):
+    """
+    Insert or update recipe_row tuples in one transaction.
+
+    Already ingested recipes keep their rowid; new ones get a block of
+    fresh rowids reserved under the write lock. The ingredient posting
+    index and the display payloads are updated in the same transaction
+    when the database has them. Returns the stored
+    (recipe_id, ingredients, instructions) rows and the number inserted.
+    """
+    from ingredient_index import index_recipes
+    from recipe_payloads import has_payload_columns, store_payloads
+
+    rows = list({row[0]: row for row in rows}.values())
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        known = known_spoonacular_ids(conn, [row[0] for row in rows])
+        next_id = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM recipes").fetchone()[0] + 1
+        recipe_ids = {}
+        for spoonacular_id, _, _, _ in rows:
+            if spoonacular_id in known:
+                recipe_ids[spoonacular_id] = known[spoonacular_id]
+            else:
+                recipe_ids[spoonacular_id] = next_id
+                next_id += 1
+
+        stored = [(recipe_ids[spoonacular_id], title, ingredients, instructions)
+                  for spoonacular_id, title, ingredients, instructions in rows]
+        conn.executemany("""
+            INSERT INTO recipes (rowid, title, ingredients, instructions) VALUES (?, ?, ?, ?)
+            ON CONFLICT (rowid) DO UPDATE SET
+                title = excluded.title, ingredients = excluded.ingredients, instructions = excluded.instructions
+        """, stored)
+        fetched_at = time.time()
+        conn.executemany("""
+            INSERT INTO spoonacular_recipes (spoonacular_id, recipe_id, fetched_at) VALUES (?, ?, ?)
+            ON CONFLICT (spoonacular_id) DO UPDATE SET fetched_at = excluded.fetched_at
+        """, ((spoonacular_id, recipe_id, fetched_at) for spoonacular_id, recipe_id in recipe_ids.items()))
+
+        stored = [(recipe_id, ingredients, instructions) for recipe_id, _, ingredients, instructions in stored]
+        if _has_table(conn, "recipe_ingredients"):
+            index_recipes(conn, [(recipe_id, ingredients) for recipe_id, ingredients, _ in stored], index_cache)
+        if has_payload_columns(conn):
+            store_payloads(conn, stored)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stored, len(rows) - len(known)
+
+
+# ---------------------------------------------
+# Ingestion Pipeline
+# ---------------------------------------------
+async def ingest(client, db_path, ingredient_queries=(), spoonacular_ids=(), number=10, refresh=False,
+                 batch_size=BATCH_SIZE, segments=None):
+    """
+    Discover recipes, fetch their details concurrently and upsert them in batches.
+
+    Recipes come from findByIngredients for each ingredient list in
+    ingredient_queries plus the explicit spoonacular_ids; already
+    ingested ones are skipped unless refresh, which also fetches every
+    recipe's details past the response cache. A recipe whose fetch fails
+    is counted and skipped. All writes run on one writer thread with its
+    own connection, so the event loop keeps fetching while a batch
+    commits. New rows are added to the segmented index when one is given
+    (the pantry index is rebuilt offline). Returns a summary dict.
+    """
+    loop = asyncio.get_running_loop()
+    writer = ThreadPoolExecutor(max_workers=1)
+    summary = Counter()
+    conn = None
+    try:
+        conn = await loop.run_in_executor(writer, connect_writer, db_path)
+        await loop.run_in_executor(writer, conn.executescript, MAPPING_SCHEMA)
+
+        found = await asyncio.gather(*(client.find_by_ingredients(query, number) for query in ingredient_queries))
+        wanted = list(dict.fromkeys(
+            [int(spoonacular_id) for spoonacular_id in spoonacular_ids]
+            + [int(recipe["id"]) for recipes in found for recipe in recipes]
+        ))
+        summary["discovered"] = len(wanted)
+        if not refresh:
+            known = await loop.run_in_executor(writer, known_spoonacular_ids, conn, wanted)
+            wanted = [spoonacular_id for spoonacular_id in wanted if spoonacular_id not in known]
+            summary["skipped"] = summary["discovered"] - len(wanted)
+
+        index_cache = {}
+
+        async def flush(rows):
+            stored, inserted = await loop.run_in_executor(writer, upsert_recipes, conn, rows, index_cache)
+            summary["inserted"] += inserted
+            summary["updated"] += len(stored) - inserted
+            if segments is not None:
+                await loop.run_in_executor(
+                    writer, segments.add_recipes, [(recipe_id, ingredients) for recipe_id, ingredients, _ in stored]
+                )
+            print(f"Stored {summary['inserted'] + summary['updated']} of {len(wanted)} recipes")
+
+        batch = []
+        for fetch in asyncio.as_completed([client.recipe_information(spoonacular_id, refresh) for spoonacular_id in wanted]):
+            try:
+                batch.append(recipe_row(await fetch))
+            except (IngestError, KeyError, ValueError) as e:
+                summary["failed"] += 1
+                print(f"Skipping a recipe: {e}")
+                continue
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+
+        if segments is not None:
+            await loop.run_in_executor(writer, lambda: segments.maybe_compact(background=False))
+    finally:
+        # Also when a fetch raised out of gather; shutdown waits for the close
+        if conn is not None:
+            writer.submit(conn.close)
+        writer.shutdown()
+
+    summary.update(client.stats)
+    return dict(summary)
+
+
+# ---------------------------------------------
+# Replay Server (local stub of the API)
+# ---------------------------------------------
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if random.random() < self.server.error_rate:
+            self._send(429, {"status": "failure", "code": 429, "message": "replayed rate limit"})
+            return
+        found, payload = self.server.cache.get(url.path, dict(parse_qsl(url.query)))
+        if found:
+            self._send(200, payload)
+        else:
+            self._send(404, {"status": "failure", "code": 404, "message": f"no recording for {url.path}"})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_replay_server(cache_dir, host="127.0.0.1", port=0, error_rate=0.0):
+    """
+    Serve recorded responses (a ResponseCache directory) as the Spoonacular API.
+
+    Point PANTRYPALETTE_SPOONACULAR_URL at it to run an ingestion
+    without network or quota; error_rate answers that fraction of
+    requests with 429 to exercise the retries. Returns the server,
+    running on a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _ReplayHandler)
+    server.cache = ResponseCache(cache_dir)
+    server.error_rate = error_rate
+    threading.Thread(target=server.serve_forever, name="spoonacular-replay", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest Spoonacular recipes into a recipes database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("ingest", help="fetch recipes and upsert them")
+    run.add_argument("db_path")
+    run.add_argument("--ingredients", nargs="+", default=[], metavar="LIST",
+                     help='comma-separated ingredient lists to search for, e.g. "chicken,rice"')
+    run.add_argument("--ids", type=int, nargs="+", default=[], help="spoonacular recipe ids to fetch")
+    run.add_argument("--number", type=int, default=10, help="recipes per ingredient search")
+    run.add_argument("--refresh", action="store_true", help="re-fetch recipes that are already ingested")
+    run.add_argument("--cache-dir", default=os.path.join("cache", "spoonacular"))
+    run.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second")
+    run.add_argument("--burst", type=int, default=DEFAULT_BURST)
+    run.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    run.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    run.add_argument("--segments-dir", help="also add the recipes to this segmented similarity index")
+
+    serve = commands.add_parser("serve", help="replay recorded responses as a local stub API")
+    serve.add_argument("cache_dir")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = start_replay_server(args.cache_dir, args.host, args.port, args.error_rate)
+        print(f"Replaying {args.cache_dir} on http://{args.host}:{server.server_address[1]}")
+        threading.Event().wait()
+
+    segments = None
+    if args.segments_dir:
+        from segmented_index import open_segmented_index
+        segments = open_segmented_index(args.segments_dir)
+
+    async def main():
+        client = SpoonacularClient(cache_dir=args.cache_dir, rate=args.rate, burst=args.burst,
+                                   concurrency=args.concurrency)
+        try:
+            return await ingest(client, args.db_path, [query.split(",") for query in args.ingredients], args.ids,
+                                args.number, args.refresh, args.batch_size, segments)
+        finally:
+            client.close()
+
+    print(json.dumps(asyncio.run(main()), indent=2))
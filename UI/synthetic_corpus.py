@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# synthetic_corpus.py
+import argparse
+import json
+import os
+
+import numpy as np
+
+from recipe_db import connect_readonly, connect_writer
+from recipe_payloads import backfill_payloads
+
+# Common RecipeNLG ingredient heads; the long tail is generated from them
+BASE_INGREDIENTS = [
+    "flour", "sugar", "butter", "egg", "milk", "onion", "garlic", "chicken", "tomato", "cheese",
+    "pepper", "rice", "beef", "potato", "carrot", "celery", "cream", "vanilla", "lemon", "cinnamon",
+    "parsley", "basil", "oregano", "thyme", "bacon", "pork", "mushroom", "spinach", "broccoli", "corn",
+    "bean", "pasta", "noodle", "bread", "cracker", "walnut", "pecan", "almond", "raisin", "apple",
+    "banana", "strawberry", "blueberry", "orange", "lime", "honey", "syrup", "chocolate", "cocoa", "coconut",
+    "yogurt", "mayonnaise", "mustard", "ketchup", "vinegar", "soy sauce", "broth", "stock", "shrimp", "salmon",
+    "tuna", "turkey", "sausage", "ham", "zucchini", "squash", "cabbage", "lettuce", "cucumber", "avocado",
+    "jalapeno", "paprika", "cumin", "chili powder", "ginger", "nutmeg", "clove", "allspice", "cornstarch", "yeast",
+    "baking soda", "baking powder", "oat", "peanut butter", "cream cheese", "sour cream", "buttermilk", "molasses", "pineapple", "peach",
+]
+MODIFIERS = [
+    "red", "green", "yellow", "white", "brown", "sweet", "smoked", "frozen", "canned", "dried",
+    "unsalted", "shredded", "lowfat", "spicy", "wild", "roasted", "toasted", "italian", "mexican", "baby",
+]
+UNITS = ["cup", "cups", "tsp", "tbsp", "oz", "lb", "pkg", "can", "clove", "pinch", "", ""]
+QUANTITIES = ["1", "2", "3", "1/2", "1/4", "3/4", "1 1/2", "4", "6", "8"]
+DISHES = ["Casserole", "Salad", "Soup", "Cake", "Bread", "Pie", "Stir Fry", "Bake", "Dip", "Cookies", "Pasta", "Stew"]
+STEPS = [
+    "Preheat oven to 350 degrees.", "Mix all ingredients in a large bowl.", "Stir until smooth.",
+    "Pour into a greased pan.", "Bake for 30 minutes.", "Simmer for 20 minutes.", "Season to taste.",
+    "Chill before serving.", "Serve warm.", "Cook over medium heat until browned.",
+]
+
+
+def vocabulary_capacity():
+    """
+    Number of distinct names ingredient_vocabulary can generate.
+    """
+    return len(BASE_INGREDIENTS) * (1 + len(MODIFIERS) + len(MODIFIERS) ** 2)
+
+
+def ingredient_vocabulary(size, seed=0):
+    """
+    Return `size` ingredient names: the base list followed by modifier variants.
+
+    Variants are "<modifier> <base>" and "<modifier> <base> <modifier>",
+    so at most vocabulary_capacity() distinct names exist.
+    """
+    capacity = vocabulary_capacity()
+    if size > capacity:
+        raise ValueError(f"Cannot generate {size} distinct ingredient names, at most {capacity} exist")
+    rng = np.random.default_rng(seed)
+    names = list(BASE_INGREDIENTS)
+    seen = set(names)
+    while len(names) < size:
+        name = f"{MODIFIERS[rng.integers(len(MODIFIERS))]} {BASE_INGREDIENTS[rng.integers(len(BASE_INGREDIENTS))]}"
+        if name in seen:
+            name = f"{name} {MODIFIERS[rng.integers(len(MODIFIERS))]}"
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names[:size]
+
+
+def zipf_weights(size, exponent=1.1):
+    """
+    Rank-frequency weights: a few ingredients dominate, like real recipes.
+    """
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_recipes(n_rows, vocab_size=5000, seed=0, chunk_size=50000):
+    """
+    Yield chunks of (title, ingredients, instructions) rows in RecipeNLG format.
+
+    ingredients and instructions are str(list) like the RecipeNLG CSV.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = ingredient_vocabulary(vocab_size)
+    weights = zipf_weights(vocab_size)
+
+    for start in range(0, n_rows, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, n_rows - start)):
+            n_ingredients = int(np.clip(rng.normal(8, 3), 2, 20))
+            picks = np.unique(rng.choice(vocab_size, size=n_ingredients, p=weights))
+            lines = []
+            for pick in picks:
+                unit = UNITS[rng.integers(len(UNITS))]
+                quantity = QUANTITIES[rng.integers(len(QUANTITIES))]
+                lines.append(" ".join(part for part in (quantity, unit, vocab[pick]) if part))
+            title = f"{vocab[picks[0]].title()} {DISHES[rng.integers(len(DISHES))]}"
+            steps = [STEPS[i] for i in rng.choice(len(STEPS), size=int(rng.integers(2, 7)), replace=False)]
+            rows.append((title, str(lines), str(steps)))
+        yield rows
+
+
+def generate_queries(n_queries, vocab_size=5000, seed=1):
+    """
+    Comma-separated user queries of 1-5 ingredients drawn with the corpus skew.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = ingredient_vocabulary(vocab_size)
+    weights = zipf_weights(vocab_size)
+    return [", ".join(vocab[i] for i in np.unique(rng.choice(vocab_size, size=int(rng.integers(1, 6)), p=weights)))
+            for _ in range(n_queries)]
+
+
+def write_database(db_path, chunks):
+    """
+    Write generated rows to a fresh SQLite recipes table; returns the row count.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = connect_writer(db_path)
+    try:
+        conn.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+        total = 0
+        for rows in chunks:
+            conn.executemany("INSERT INTO recipes (title, ingredients, instructions) VALUES (?, ?, ?)", rows)
+            conn.commit()
+            total += len(rows)
+        return total
+    finally:
+        conn.close()
+
+
+def fit_artifacts(db_path, models_dir):
+    """
+    Fit the notebook's TF-IDF + NearestNeighbors models on the corpus and
+    write them with recipe_ids.npy and an ArtifactStore manifest.
+    """
+    import joblib
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.neighbors import NearestNeighbors
+
+    conn = connect_readonly(db_path)
+    try:
+        rows = conn.execute("SELECT rowid, ingredients FROM recipes ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+
+    vectorizer = TfidfVectorizer(max_features=500, ngram_range=(1, 2))
+    vectors = vectorizer.fit_transform(ingredients for _, ingredients in rows)
+    nn_model = NearestNeighbors(n_neighbors=10, metric="cosine").fit(vectors)
+
+    os.makedirs(models_dir, exist_ok=True)
+    joblib.dump(vectorizer, os.path.join(models_dir, "tfidf_vectorizer.pkl"))
+    joblib.dump(nn_model, os.path.join(models_dir, "nearest_neighbors_model.pkl"))
+    np.save(os.path.join(models_dir, "recipe_ids.npy"), np.array([rowid for rowid, _ in rows], dtype=np.int64))
+
+    manifest = {"artifacts": {
+        "tfidf_vectorizer": {"version": "synthetic", "filename": "tfidf_vectorizer.pkl", "format": "joblib", "sha256": None, "url": None,
+                             "documents": "raw"},
+        "nearest_neighbors_model": {"version": "synthetic", "filename": "nearest_neighbors_model.pkl", "format": "joblib", "sha256": None, "url": None},
+        "recipe_ids": {"version": "synthetic", "filename": "recipe_ids.npy", "format": "npy", "sha256": None, "url": None},
+        "recipes_db": {"version": "synthetic", "filename": os.path.basename(db_path),
+                       "local_path": os.path.relpath(db_path, models_dir), "format": "file", "sha256": None, "url": None},
+    }}
+    manifest_path = os.path.join(models_dir, "manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def build_corpus(out_dir, n_rows, vocab_size=5000, seed=0, with_index=True):
+    """
+    Generate a synthetic corpus directory: recipes.db, models/ and manifest.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    db_path = os.path.join(out_dir, "recipes.db")
+    total = write_database(db_path, generate_recipes(n_rows, vocab_size, seed))
+    print(f"Wrote {total} recipes to {db_path}")
+    if with_index:
+        from ingredient_index import rebuild_index
+        from ingredient_suggest import build_suggest_index
+        from pantry_index import build_pantry_index
+        rebuild_index(db_path)
+        build_pantry_index(db_path, os.path.join(out_dir, "pantry"))
+        build_suggest_index(db_path, os.path.join(out_dir, "suggest"))
+    backfill_payloads(db_path)
+    manifest_path = fit_artifacts(db_path, os.path.join(out_dir, "models"))
+    with open(os.path.join(out_dir, "corpus.json"), "w") as f:
+        json.dump({"rows": total, "vocab_size": vocab_size, "seed": seed}, f, indent=2)
+    print(f"Wrote model artifacts and {manifest_path}")
+    return manifest_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic RecipeNLG-shaped corpus with fitted models.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--vocab-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-index", action="store_true", help="skip building the ingredient posting index")
+    args = parser.parse_args()
+
+    build_corpus(args.out_dir, args.rows, args.vocab_size, args.seed, with_index=not args.no_index)
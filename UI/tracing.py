@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# tracing.py
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+METRIC_PREFIX = "pantrypalette"
+DEFAULT_METRICS_PORT = 9464
+
+logger = logging.getLogger("pantrypalette.trace")
+
+# Shared by every disabled span, so a disabled span costs one call and a global lookup
+_NOOP = nullcontext()
+_tracer = None
+# name -> callable returning (metric, type, labels, value) samples, read on every scrape
+_collectors = {}
+_current_request = contextvars.ContextVar("pantrypalette_trace_request", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Request:
+    """
+    Spans and counters of one search, for the structured log line.
+    """
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+        self.spans = {}
+        self.counters = {}
+
+    def __enter__(self):
+        self.token = _current_request.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _current_request.reset(self.token)
+        self.tracer.observe(self.name, elapsed)
+        if self.tracer.log_requests:
+            logger.info(json.dumps({
+                "request": self.name,
+                **self.fields,
+                "duration_ms": round(1000 * elapsed, 3),
+                "spans_ms": {name: round(1000 * seconds, 3) for name, seconds in self.spans.items()},
+                "counters": self.counters,
+                "error": exc_type.__name__ if exc_type else None,
+            }))
+        return False
+
+
+class Tracer:
+    """
+    Process-wide stage histograms and counters for the search pipeline.
+    """
+
+    def __init__(self, log_requests=False):
+        self.log_requests = log_requests
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = _Histogram()
+            histogram.observe(seconds)
+        request = _current_request.get()
+        if request is not None:
+            request.spans[stage] = request.spans.get(stage, 0.0) + seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        request = _current_request.get()
+        if request is not None:
+            request.counters[name] = request.counters.get(name, 0) + value
+
+    def render_prometheus(self):
+        """
+        Render every histogram and counter in the Prometheus text format.
+        """
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.total, h.count) for stage, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Time spent in each search pipeline stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+        ]
+        for stage, (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+        for _, collect in sorted(_collectors.items()):
+            samples = {}
+            for metric, kind, labels, value in collect():
+                samples.setdefault((metric, kind), []).append((labels, value))
+            for (metric, kind), values in samples.items():
+                lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {kind}")
+                for labels, value in values:
+                    label_text = ",".join(f'{key}="{label}"' for key, label in sorted(labels.items()))
+                    lines.append(f"{METRIC_PREFIX}_{metric}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------
+# Module-Level API
+# ---------------------------------------------
+def enable(log_requests=False):
+    global _tracer
+    if log_requests and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    if _tracer is None:
+        _tracer = Tracer(log_requests)
+    else:
+        _tracer.log_requests = log_requests
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name):
+    """
+    Time a pipeline stage: `with span("vectorize"): ...`. No-op when disabled.
+    """
+    if _tracer is None:
+        return _NOOP
+    return _Span(_tracer, name)
+
+
+def request(name, **fields):
+    """
+    Group the spans of one search; logs one JSON line when request logging is on.
+    """
+    if _tracer is None:
+        return _NOOP
+    return _Request(_tracer, name, fields)
+
+
+def count(name, value=1):
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+
+def register_collector(name, collect):
+    """
+    Export collect() on /metrics: an iterable of (metric, type, labels, value).
+
+    For state owned elsewhere (cache sizes, hit counters), read at scrape
+    time instead of counted per request. Registering a name again replaces
+    its collector.
+    """
+    _collectors[name] = collect
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics" or _tracer is None:
+            self.send_error(404)
+            return
+        body = _tracer.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host="127.0.0.1", port=DEFAULT_METRICS_PORT):
+    """
+    Serve GET /metrics from a daemon thread; returns the server.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# PANTRYPALETTE_TRACING=1 turns spans on; PANTRYPALETTE_TRACE_LOG=1 adds a JSON log line per search
+if os.environ.get("PANTRYPALETTE_TRACING", "0") == "1":
+    enable(log_requests=os.environ.get("PANTRYPALETTE_TRACE_LOG", "0") == "1")
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# train_model.py
+import argparse
+import heapq
+import json
+import math
+import os
+import resource
+import shutil
+import tempfile
+import time
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+from artifact_store import sha256_file
+from recipe_db import connect_readonly, fetch_recipes_by_ids, save_recipe_ids
+
+# The notebook's models
+MAX_FEATURES = 500
+NGRAM_RANGE = (1, 2)
+N_NEIGHBORS = 10
+# The notebook's train_test_split(df_combined, test_size=0.3, random_state=42)
+TEST_SIZE = 0.3
+SPLIT_SEED = 42
+
+# Documents held in memory at a time, in either pass
+CHUNK_SIZE = 20000
+# Elements per block when copying the streamed CSR arrays into .npy files
+COPY_BLOCK = 1 << 22
+DEFAULT_MEMORY_MB = 2048
+
+
+# ---------------------------------------------
+# Memory Ceiling
+# ---------------------------------------------
+def set_memory_ceiling(limit_mb):
+    """
+    Cap this process's heap (RLIMIT_DATA) so an overrun raises MemoryError.
+
+    RLIMIT_DATA counts private allocations only: the memory-mapped CSR
+    arrays and pickles are page cache and may exceed it. Enforced by
+    Linux; other platforms may ignore it.
+    """
+    limit = int(limit_mb) << 20
+    _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+    return limit >> 20
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# ---------------------------------------------
+# Training Rows
+# ---------------------------------------------
+def train_rowids(rowids, test_size=TEST_SIZE, seed=SPLIT_SEED):
+    """
+    The rows sklearn's train_test_split(test_size, random_state=seed) keeps for training.
+
+    Same permutation as ShuffleSplit, so the notebook's train_df (a frame
+    whose position i is recipes.rowid i + 1) selects the same recipes.
+    Returned in rowid order, which is the order the model rows are written.
+    """
+    rowids = np.asarray(rowids, dtype=np.int64)
+    if not test_size:
+        return rowids
+    n = len(rowids)
+    n_test = math.ceil(test_size * n)
+    permutation = np.random.RandomState(seed).permutation(n)
+    return np.sort(rowids[permutation[n_test:]])
+
+
+def document_chunks(db_path, rowids, documents="raw", chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of training documents, chunk_size recipes at a time.
+
+    Documents are the stored ingredients column, as the notebook cell and
+    the shipped model used; documents="cleaned" fits on the cleaned
+    ingredient phrases (preprocess_ingredients) instead.
+    """
+    from recipe_model import model_document
+
+    conn = connect_readonly(db_path)
+    try:
+        for start in range(0, len(rowids), chunk_size):
+            batch = rowids[start:start + chunk_size].tolist()
+            rows = fetch_recipes_by_ids(conn, batch, columns=["ingredients"])
+            if len(rows) != len(batch):
+                raise RuntimeError(f"{len(batch) - len(rows)} training recipes disappeared from {db_path}")
+            yield [model_document(ingredients, documents) for _, ingredients in rows]
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------
+# Pass 1: Term Counts and Vocabulary
+# ---------------------------------------------
+def _new_vectorizer():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(max_features=MAX_FEATURES, ngram_range=NGRAM_RANGE)
+
+
+def count_terms(chunks, work_dir):
+    """
+    Stream the documents once, spilling per-chunk term counts to sorted runs.
+
+    Each run file holds "term<TAB>count<TAB>document count" lines in
+    sorted term order; the documents themselves are spooled (one per
+    line) for the second pass. Only one chunk's counts are in memory.
+    Returns (n_documents, run paths, spool path).
+    """
+    analyzer = _new_vectorizer().build_analyzer()
+    spool_path = os.path.join(work_dir, "documents.txt")
+    runs = []
+    n_documents = 0
+    with open(spool_path, "w", encoding="utf-8", newline="\n") as spool:
+        for chunk in chunks:
+            counts, document_counts = Counter(), Counter()
+            for document in chunk:
+                document = str(document).replace("\n", " ").replace("\r", " ")
+                spool.write(document + "\n")
+                terms = analyzer(document)
+                counts.update(terms)
+                document_counts.update(set(terms))
+            n_documents += len(chunk)
+
+            run_path = os.path.join(work_dir, f"run-{len(runs):05d}.tsv")
+            with open(run_path, "w", encoding="utf-8", newline="\n") as f:
+                for term in sorted(counts):
+                    f.write(f"{term}\t{counts[term]}\t{document_counts[term]}\n")
+            runs.append(run_path)
+            print(f"Pass 1: counted {n_documents} documents")
+    return n_documents, runs, spool_path
+
+
+def _read_run(path):
+    with open(path, encoding="utf-8", newline="\n") as f:
+        for line in f:
+            term, count, document_count = line.rstrip("\n").split("\t")
+            yield term, int(count), int(document_count)
+
+
+def merged_terms(runs):
+    """
+    Yield (term, total count, document frequency) over all runs, in sorted term order.
+    """
+    merged = heapq.merge(*(_read_run(path) for path in runs), key=itemgetter(0))
+    for term, entries in groupby(merged, key=itemgetter(0)):
+        count = document_count = 0
+        for _, c, d in entries:
+            count += c
+            document_count += d
+        yield term, count, document_count
+
+
+def select_vocabulary(runs, max_features=MAX_FEATURES):
+    """
+    Pick the max_features most frequent terms exactly as CountVectorizer does.
+
+    sklearn sorts the vocabulary, then keeps (-total_counts).argsort()[:max_features];
+    the same argsort over the same sorted counts reproduces its choice,
+    ties included. Returns ({term: column}, document frequency per column).
+    Holds two int64 counters per distinct term, never the terms themselves.
+    """
+    counts, document_counts = array("q"), array("q")
+    for _, count, document_count in merged_terms(runs):
+        counts.append(count)
+        document_counts.append(document_count)
+    if not counts:
+        raise ValueError("empty vocabulary; the training documents contain no terms")
+    counts = np.frombuffer(counts, dtype=np.int64)
+    document_counts = np.frombuffer(document_counts, dtype=np.int64)
+
+    if max_features is not None and len(counts) > max_features:
+        selected = np.sort((-counts).argsort()[:max_features])
+    else:
+        selected = np.arange(len(counts))
+
+    # Second merge to recover the strings of the selected terms only
+    vocabulary = {}
+    wanted = iter(selected.tolist())
+    next_index = next(wanted, None)
+    for index, (term, _, _) in enumerate(merged_terms(runs)):
+        if index == next_index:
+            vocabulary[term] = len(vocabulary)
+            next_index = next(wanted, None)
+            if next_index is None:
+                break
+    return vocabulary, document_counts[selected]
+
+
+def fitted_vectorizer(vocabulary, document_frequency, n_documents):
+    """
+    A TfidfVectorizer equal to one fitted in memory on the same documents.
+    """
+    from segmented_index import refresh_idf
+
+    vectorizer = _new_vectorizer()
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.fixed_vocabulary_ = False
+    return refresh_idf(vectorizer, document_frequency, n_documents)
+
+
+# ---------------------------------------------
+# Pass 2: CSR Matrix Straight to Disk
+# ---------------------------------------------
+def _spooled_chunks(spool_path, chunk_size):
+    with open(spool_path, encoding="utf-8", newline="\n") as spool:
+        chunk = []
+        for line in spool:
+            chunk.append(line[:-1])
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _raw_to_npy(raw_path, npy_path, raw_dtype, length, dtype=None):
+    """
+    Copy a raw array file into an .npy file (optionally widening it) block by block.
+    """
+    out = np.lib.format.open_memmap(npy_path, mode="w+", dtype=dtype or raw_dtype, shape=(length,))
+    if length:
+        raw = np.memmap(raw_path, dtype=raw_dtype, mode="r", shape=(length,))
+        for start in range(0, length, COPY_BLOCK):
+            out[start:start + COPY_BLOCK] = raw[start:start + COPY_BLOCK]
+        del raw
+    out.flush()
+    del out
+    os.remove(raw_path)
+
+
+def write_tfidf_matrix(spool_path, vectorizer, out_dir, chunk_size=CHUNK_SIZE):
+    """
+    Transform the spooled documents chunk by chunk and append the CSR rows to disk.
+
+    Writes tfidf.data.npy (float64), tfidf.indices.npy and tfidf.indptr.npy
+    and returns the matrix memory-mapped from them. Both index arrays get
+    the same dtype (int32 whenever nnz fits), so scipy never copies one
+    to match the other.
+    """
+    import scipy.sparse as sp
+
+    data_path = os.path.join(out_dir, "tfidf.data.raw")
+    indices_path = os.path.join(out_dir, "tfidf.indices.raw")
+    indptr = array("q", [0])
+    with open(data_path, "wb") as data_file, open(indices_path, "wb") as indices_file:
+        for chunk in _spooled_chunks(spool_path, chunk_size):
+            block = vectorizer.transform(chunk)
+            block.sort_indices()
+            data_file.write(block.data.astype(np.float64).tobytes())
+            indices_file.write(block.indices.astype(np.int32).tobytes())
+            indptr.extend((block.indptr[1:] + indptr[-1]).tolist())
+            print(f"Pass 2: wrote {len(indptr) - 1} rows")
+
+    nnz = indptr[-1]
+    _raw_to_npy(data_path, os.path.join(out_dir, "tfidf.data.npy"), np.float64, nnz)
+    index_dtype = np.int32 if nnz < np.iinfo(np.int32).max else np.int64
+    _raw_to_npy(indices_path, os.path.join(out_dir, "tfidf.indices.npy"), np.int32, nnz, index_dtype)
+    np.save(os.path.join(out_dir, "tfidf.indptr.npy"), np.frombuffer(indptr, dtype=np.int64).astype(index_dtype))
+    arrays = [np.load(os.path.join(out_dir, f"tfidf.{name}.npy"), mmap_mode="r") for name in ("data", "indices", "indptr")]
+    return sp.csr_matrix(tuple(arrays), shape=(len(indptr) - 1, len(vectorizer.vocabulary_)), copy=False)
+
+
+# ---------------------------------------------
+# Versioned Artifacts
+# ---------------------------------------------
+def _write_manifest(manifest_path, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(manifest_path), suffix=".part")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, manifest_path)
+
+
+def publish_artifacts(models_dir, version, files, db_path, documents="raw"):
+    """
+    Point the manifest at a new version of the model artifacts.
+
+    files maps artifact name -> (filename, format). The new files carry
+    the version in their names, so a running app keeps its loaded version
+    until it restarts; the manifest itself is replaced atomically. The
+    document form is recorded on the tfidf_vectorizer entry, for anything
+    that vectorizes stored recipes (ArtifactStore.document_form).
+    """
+    manifest_path = os.path.join(models_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = {"artifacts": {}}
+
+    for name, (filename, fmt) in files.items():
+        manifest["artifacts"][name] = {
+            "version": version, "filename": filename, "format": fmt,
+            "sha256": sha256_file(os.path.join(models_dir, filename)), "url": None,
+        }
+    manifest["artifacts"]["tfidf_vectorizer"]["documents"] = documents
+    if "recipes_db" not in manifest["artifacts"]:
+        manifest["artifacts"]["recipes_db"] = {
+            "version": version, "filename": os.path.basename(db_path),
+            "local_path": os.path.relpath(db_path, models_dir), "format": "file", "sha256": None, "url": None,
+        }
+    _write_manifest(manifest_path, manifest)
+    return manifest_path
+
+
+def train(db_path, models_dir, version=None, test_size=TEST_SIZE, seed=SPLIT_SEED, documents="raw",
+          chunk_size=CHUNK_SIZE):
+    """
+    Fit the TF-IDF + NearestNeighbors models out of core and publish them.
+
+    Pass 1 streams the training documents, spilling term counts to disk,
+    and picks the vocabulary and IDF exactly as TfidfVectorizer.fit
+    would. Pass 2 streams them again and writes the TF-IDF CSR arrays to
+    disk. The NearestNeighbors model is fitted on the memory-mapped
+    matrix and pickled chunk by chunk, so no step holds the corpus in
+    memory. Intermediate files live in a scratch directory under
+    models_dir that is removed at the end.
+    """
+    import joblib
+    from sklearn.neighbors import NearestNeighbors
+
+    version = version or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    start = time.perf_counter()
+    os.makedirs(models_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=f"train-{version}-", dir=models_dir)
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            all_rowids = np.fromiter((row[0] for row in conn.execute("SELECT rowid FROM recipes ORDER BY rowid")),
+                                     dtype=np.int64)
+        finally:
+            conn.close()
+        rowids = train_rowids(all_rowids, test_size, seed)
+        print(f"Training on {len(rowids)} of {len(all_rowids)} recipes")
+
+        n_documents, runs, spool_path = count_terms(document_chunks(db_path, rowids, documents, chunk_size), work_dir)
+        vocabulary, document_frequency = select_vocabulary(runs)
+        vectorizer = fitted_vectorizer(vocabulary, document_frequency, n_documents)
+        matrix = write_tfidf_matrix(spool_path, vectorizer, work_dir, chunk_size)
+
+        nn_model = NearestNeighbors(n_neighbors=N_NEIGHBORS, metric="cosine").fit(matrix)
+
+        files = {
+            "tfidf_vectorizer": (f"tfidf_vectorizer-{version}.pkl", "joblib"),
+            "nearest_neighbors_model": (f"nearest_neighbors_model-{version}.pkl", "joblib"),
+            "recipe_ids": (f"recipe_ids-{version}.npy", "npy"),
+        }
+        joblib.dump(vectorizer, os.path.join(models_dir, files["tfidf_vectorizer"][0]))
+        joblib.dump(nn_model, os.path.join(models_dir, files["nearest_neighbors_model"][0]))
+        save_recipe_ids(os.path.join(models_dir, files["recipe_ids"][0]), rowids)
+        del nn_model, matrix
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "version": version, "db_path": os.path.abspath(db_path), "documents": n_documents,
+        "test_size": test_size, "seed": seed, "documents": documents, "chunk_size": chunk_size,
+        "features": len(vocabulary), "elapsed_s": round(time.perf_counter() - start, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    with open(os.path.join(models_dir, f"training-{version}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    publish_artifacts(models_dir, version, files, db_path, documents)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the similarity models on a recipes database in bounded memory.")
+    parser.add_argument("db_path")
+    parser.add_argument("models_dir", nargs="?", default="models")
+    parser.add_argument("--version", help="artifact version (default: UTC timestamp)")
+    parser.add_argument("--test-size", type=float, default=TEST_SIZE, help="held-out fraction, 0 trains on every recipe")
+    parser.add_argument("--seed", type=int, default=SPLIT_SEED)
+    parser.add_argument("--documents", choices=["raw", "cleaned"], default="raw",
+                        help="fit on the stored ingredients column (as the notebook did) or its cleaned phrases")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--memory-mb", type=int,
+                        default=int(os.environ.get("PANTRYPALETTE_TRAIN_MEMORY_MB", str(DEFAULT_MEMORY_MB))),
+                        help="heap ceiling in MiB (0 disables)")
+    args = parser.parse_args()
+
+    if args.memory_mb:
+        print(f"Memory ceiling: {set_memory_ceiling(args.memory_mb)} MiB")
+    report = train(args.db_path, args.models_dir, args.version, args.test_size, args.seed, args.documents, args.chunk_size)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,105 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from artifact_store import ArtifactError, ArtifactStore
+
+IDS = np.arange(1, 6, dtype=np.int64)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """
+    A local HTTP stand-in for the artifact host, serving tmp_path/mirror.
+    """
+    root = tmp_path / "mirror"
+    root.mkdir()
+    np.save(root / "recipe_ids.npy", IDS)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def write_manifest(models_dir, sha256, url=None):
+    models_dir.mkdir(exist_ok=True)
+    path = models_dir / "manifest.json"
+    path.write_text(json.dumps({"artifacts": {"recipe_ids": {
+        "version": "1", "filename": "recipe_ids.npy", "format": "npy", "sha256": sha256, "url": url,
+    }}}))
+    return str(path)
+
+
+def digest(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_local_copy_is_used_when_it_matches(tmp_path, mirror):
+    root, _ = mirror
+    models_dir = tmp_path / "models"
+    manifest = write_manifest(models_dir, digest(root / "recipe_ids.npy"))
+    (models_dir / "recipe_ids.npy").write_bytes((root / "recipe_ids.npy").read_bytes())
+
+    store = ArtifactStore(manifest, cache_dir=str(tmp_path / "cache"), offline=True)
+    assert store.path("recipe_ids") == str(models_dir / "recipe_ids.npy")
+    assert np.array_equal(store.load("recipe_ids"), IDS)
+
+
+def test_download_is_verified_and_cached(tmp_path, mirror):
+    root, url = mirror
+    expected = digest(root / "recipe_ids.npy")
+    manifest = write_manifest(tmp_path / "models", expected)
+    (tmp_path / "models" / "recipe_ids.npy").write_bytes(b"stale copy")
+    cache_dir = str(tmp_path / "cache")
+
+    path = ArtifactStore(manifest, cache_dir=cache_dir, base_url=url).path("recipe_ids")
+    assert path == os.path.join(cache_dir, "recipe_ids", "1", expected, "recipe_ids.npy")
+    # Served from the content-addressed cache without the network
+    offline = ArtifactStore(manifest, cache_dir=cache_dir, offline=True)
+    assert offline.path("recipe_ids") == path
+    assert np.array_equal(offline.load("recipe_ids"), IDS)
+
+
+def test_hash_mismatch_is_rejected(tmp_path, mirror):
+    _, url = mirror
+    manifest = write_manifest(tmp_path / "models", "0" * 64)
+    cache_dir = tmp_path / "cache"
+    with pytest.raises(ArtifactError, match="expected"):
+        ArtifactStore(manifest, cache_dir=str(cache_dir), base_url=url).path("recipe_ids")
+    assert not [name for _, _, files in os.walk(cache_dir) for name in files]
+
+
+def test_unpinned_download_needs_opt_in(tmp_path, mirror, monkeypatch):
+    root, url = mirror
+    monkeypatch.delenv("PANTRYPALETTE_ALLOW_UNPINNED", raising=False)
+    manifest = write_manifest(tmp_path / "models", None, url=f"{url}/recipe_ids.npy")
+    cache_dir = str(tmp_path / "cache")
+    with pytest.raises(ArtifactError, match="no sha256"):
+        ArtifactStore(manifest, cache_dir=cache_dir).path("recipe_ids")
+
+    path = ArtifactStore(manifest, cache_dir=cache_dir, allow_unpinned=True).path("recipe_ids")
+    assert path.endswith(os.path.join(digest(root / "recipe_ids.npy"), "recipe_ids.npy"))
+
+
+def test_newest_unpinned_copy_is_used(tmp_path):
+    manifest = write_manifest(tmp_path / "models", None)
+    version_dir = tmp_path / "cache" / "recipe_ids" / "1"
+    for age, (sha256, ids) in enumerate([("0" * 64, IDS[:2]), ("f" * 64, IDS)]):
+        (version_dir / sha256).mkdir(parents=True)
+        path = version_dir / sha256 / "recipe_ids.npy"
+        np.save(path, ids)
+        os.utime(path, (1000 + age, 1000 + age))
+
+    store = ArtifactStore(manifest, cache_dir=str(tmp_path / "cache"), offline=True)
+    assert np.array_equal(store.load("recipe_ids"), IDS)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from dense_embedding import DenseCosineIndex, build_dense_index
+
+DOCUMENTS = [
+    "chicken rice onion", "chicken breast garlic", "rice beans tomato", "tomato basil mozzarella",
+    "beef onion garlic", "pasta tomato garlic", "egg flour sugar", "butter flour sugar milk",
+]
+VERSION = ("1", "abc123")
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    vectorizer = TfidfVectorizer().fit(DOCUMENTS)
+    out_dir = str(tmp_path_factory.mktemp("dense"))
+    build_dense_index(vectorizer.transform(DOCUMENTS), np.arange(1, len(DOCUMENTS) + 1), out_dir,
+                      n_components=4, model_version=VERSION)
+    return vectorizer, DenseCosineIndex(out_dir)
+
+
+def test_check_model_accepts_the_building_vectorizer(built):
+    vectorizer, index = built
+    index.check_model(vectorizer, VERSION)
+
+
+def test_check_model_rejects_another_feature_space(built):
+    _, index = built
+    with pytest.raises(RuntimeError, match="features"):
+        index.check_model(TfidfVectorizer().fit(DOCUMENTS[:2]), VERSION)
+
+
+def test_check_model_rejects_another_model_version(built):
+    vectorizer, index = built
+    with pytest.raises(RuntimeError, match="rebuild"):
+        index.check_model(vectorizer, ("2", "def456"))
@@ -0,0 +1,61 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from ingredient_index import rebuild_index
+from ingredient_suggest import IngredientSuggester, build_suggest_index
+from search_service import SearchService
+
+RECIPES = [
+    ("Roast Chicken", "['1 whole chicken', '2 cups chopped onions', 'salt']"),
+    ("Chicken Soup", "['2 chicken breasts', '1 onion', '8 cups water']"),
+    ("Chickpea Curry", "['1 can chickpeas', '1 onion', 'curry powder']"),
+]
+
+QUANTITY_WORDS = {"cup", "cups", "can", "whole", "chopped"}
+
+
+def normalize(line):
+    # Stand-in for the NLTK normalizer: drop quantity words, singularize, drop generic words
+    words = [word.rstrip("s") for word in line.split() if word not in QUANTITY_WORDS]
+    phrase = " ".join(words)
+    return "" if any(word in phrase for word in ("oil", "salt", "water")) else phrase
+
+
+@pytest.fixture(scope="module")
+def suggest_dir(tmp_path_factory):
+    root = tmp_path_factory.mktemp("suggest")
+    db_path = str(root / "recipes.db")
+    setup = sqlite3.connect(db_path)
+    setup.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    setup.executemany("INSERT INTO recipes (title, ingredients, instructions) VALUES (?, ?, '[]')", RECIPES)
+    setup.commit()
+    setup.close()
+    rebuild_index(db_path)
+    build_suggest_index(db_path, str(root / "suggest"), normalize=normalize)
+    return str(root / "suggest")
+
+
+def test_phrases_are_cleaned_and_counts_summed(suggest_dir):
+    suggester = IngredientSuggester(suggest_dir)
+    counts = dict(zip(suggester.phrases, suggester.counts.tolist()))
+    assert counts == {"chicken": 1, "chicken breast": 1, "chickpea": 1, "curry powder": 1, "onion": 3}
+
+
+def test_suggest_route(suggest_dir):
+    service = SearchService(SimpleNamespace(suggester=IngredientSuggester(suggest_dir)), workers=1)
+    status, body = asyncio.run(service.dispatch("GET", "/suggest?prefix=chick&k=2", b""))
+    assert (status, body) == (200, {"results": ["chicken", "chicken breast"]})
+    status, _ = asyncio.run(service.dispatch("GET", "/suggest?prefix=chick&k=0", b""))
+    assert status == 400
+
+    service.backend.suggester = None
+    status, _ = asyncio.run(service.dispatch("GET", "/suggest?prefix=chick", b""))
+    assert status == 404
+
+
+def test_corrected_generic_words_are_matched_as_whole_words(suggest_dir):
+    suggester = IngredientSuggester(suggest_dir)
+    assert suggester.correct_canonical("boiled ham, chiken, oil") == "boiled ham, chicken"
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from ingredient_index import rebuild_index, search_overlap, user_terms
+
+RECIPES = [
+    ("Caprese", "['2 tomatoes', '1/4 cup olive oil', 'sea salt', 'fresh basil']"),
+    ("Roast Chicken", "['1 whole chicken', '2 tbsp olive oil', 'salt', 'pepper']"),
+    ("Chicken Soup", "['2 chicken breasts', '8 cups water', '1 onion', 'salt']"),
+    ("Fruit Salad", "['1/2 watermelon', '1 cup blueberries', 'mint']"),
+    ("Tomato Rice", "['1 cup rice', '1 (14 oz.) can diced tomatoes', '2 cups water', 'butter']"),
+    ("Plain Rice", "['1 cup rice', '2 cups water']"),
+]
+
+QUERIES = [
+    "salt, chicken",
+    "olive oil",
+    "sea salt, basil, tomato",
+    "watermelon",
+    "water, rice",
+    "Chicken, Rice, Mint, Saffron",
+    "chicken breast, onion",
+    "pepper, pepper",
+]
+
+
+def calculate_match_score(ingredients, ingredient_list):
+    # The original app's scoring of a LIKE-matched row
+    matched_ingredients = sum(1 for ing in ingredient_list if ing in ingredients)
+    return matched_ingredients / len(ingredient_list)
+
+
+def indexed_db(db_path, recipes):
+    setup = sqlite3.connect(db_path)
+    setup.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    setup.executemany("INSERT INTO recipes (title, ingredients, instructions) VALUES (?, ?, '[]')", recipes)
+    setup.commit()
+    setup.close()
+    rebuild_index(db_path)
+    return sqlite3.connect(db_path)
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    conn = indexed_db(str(tmp_path_factory.mktemp("db") / "recipes.db"), RECIPES)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_calculate_match_score(conn, query):
+    ingredient_list = user_terms(query)
+    expected = {}
+    for recipe_id, ingredients in conn.execute("SELECT rowid, ingredients FROM recipes"):
+        score = calculate_match_score(ingredients, ingredient_list)
+        if score:
+            expected[recipe_id] = score
+
+    matches = search_overlap(conn, ingredient_list)
+    found = {recipe_id: matched / len(ingredient_list) for recipe_id, matched in matches}
+    assert found == expected
+    scores = [score for _, score in sorted(found.items(), key=lambda item: (-item[1], item[0]))]
+    assert [matched / len(ingredient_list) for _, matched in matches] == scores
+
+
+def test_generic_words_stay_searchable(conn):
+    assert {recipe_id for recipe_id, _ in search_overlap(conn, ["salt"])} == {1, 2, 3}
+    # Two terms, one matched: the denominator is what the user entered
+    assert dict(search_overlap(conn, user_terms("salt, chicken")))[1] == 1
+
+
+def test_repeated_terms_count_once():
+    assert user_terms("Pepper, pepper , salt,") == ["pepper", "salt"]
+
+
+def test_where_matching_differs_from_substrings(tmp_path):
+    conn = indexed_db(str(tmp_path / "recipes.db"), [
+        ("Chicken Bake", "['2 chicken breasts', '1/2 cup unsalted butter']"),
+        ("Salted Fish", "['1 lb salted cod']"),
+    ])
+    try:
+        # Word order is ignored: every token only has to start a word of one line
+        assert search_overlap(conn, ["breast chicken"]) == search_overlap(conn, ["chicken breast"]) == [(1, 1)]
+        # Tokens match word prefixes, not substrings inside a word
+        assert search_overlap(conn, ["salt"]) == [(2, 1)]
+        assert search_overlap(conn, ["butter salted"]) == []
+    finally:
+        conn.close()
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from ingredient_index import query_terms, rebuild_index
+from pantry_index import PantryIndex, build_pantry_index
+
+RECIPES = [
+    ("Pasta", "['1 lb pasta', '1 tsp salt', '2 tbsp olive oil']"),
+    ("Onion Pasta", "['1 lb pasta', '2 onions', '1 onion, sliced', '8 cups water']"),
+    ("Rice Bowl", "['1 cup rice', '2 eggs']"),
+]
+
+QUANTITY_WORDS = {"lb", "tsp", "tbsp", "cup", "cups", "sliced"}
+
+
+def normalize(line):
+    # Stand-in for the NLTK normalizer: drop quantity words, singularize, drop generic words
+    words = [word.rstrip("s") for word in line.split() if word not in QUANTITY_WORDS]
+    phrase = " ".join(words)
+    return "" if {"oil", "salt", "water"} & set(words) else phrase
+
+
+def pantry(text):
+    # Stand-in for preprocess_user_ingredients, on the same normalizer
+    return sorted({normalize(item.strip()) for item in text.split(",")} - {""})
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    root = tmp_path_factory.mktemp("pantry")
+    db_path = str(root / "recipes.db")
+    setup = sqlite3.connect(db_path)
+    setup.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    setup.executemany("INSERT INTO recipes (title, ingredients, instructions) VALUES (?, ?, '[]')", RECIPES)
+    setup.commit()
+    setup.close()
+    rebuild_index(db_path)
+    build_pantry_index(db_path, str(root / "index"), normalize=normalize)
+    return PantryIndex(str(root / "index"))
+
+
+def test_phrases_are_cleaned_and_counted_once(index):
+    assert sorted(index.phrases) == ["egg", "onion", "pasta", "rice"]
+    assert index.n_ingredients.tolist() == [1, 2, 2]
+
+
+def test_staples_in_pantry_and_recipe_are_not_missing(index):
+    results = index.search(query_terms(pantry("pasta, salt, olive oil, rice, water")), max_missing=2, limit=10)
+    assert sorted(results) == [(1, 0, 1), (2, 1, 2), (3, 1, 2)]
@@ -0,0 +1,18 @@
+import pytest
+
+from prewarm import APP_MODULES, app_modules
+
+
+@pytest.mark.parametrize("backend, corpus_store, extra", [
+    (None, None, []),
+    ("dense", "corpus", ["dense_embedding"]),
+    (None, "corpus", ["corpus_store", "sharded_search"]),
+    ("approximate", None, ["approximate_search"]),
+])
+def test_app_modules_follow_the_backend_switches(monkeypatch, backend, corpus_store, extra):
+    for name, value in [("PANTRYPALETTE_SIMILARITY_BACKEND", backend), ("PANTRYPALETTE_CORPUS_STORE", corpus_store)]:
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    assert app_modules() == APP_MODULES + extra
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from artifact_store import ArtifactStore
+from recipe_db import check_model_alignment, connect_readonly, connect_writer, load_model_recipe_ids
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "recipes.db")
+    conn = connect_writer(path)
+    conn.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    conn.executemany("INSERT INTO recipes VALUES (?, '[]', '[]')", [("a",), ("b",), ("c",)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_alignment_check_leaves_no_open_transaction(db_path):
+    conn = connect_readonly(db_path)
+    check_model_alignment(conn, np.array([1, 2, 3]), 3)
+    assert conn.in_transaction is False
+
+    # The checked connection sees later writes
+    writer = connect_writer(db_path)
+    writer.execute("INSERT INTO recipes VALUES ('d', '[]', '[]')")
+    writer.commit()
+    writer.close()
+    assert conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0] == 4
+    conn.close()
+
+
+def test_alignment_check_reports_missing_recipes(db_path):
+    conn = connect_readonly(db_path)
+    with pytest.raises(RuntimeError, match="1 recipes"):
+        check_model_alignment(conn, np.array([1, 2, 9]), 3)
+    assert conn.in_transaction is False
+    # The temp table is gone, so a second check starts clean
+    check_model_alignment(conn, np.array([1, 2, 3]), 3)
+    conn.close()
+
+
+
+def test_model_recipe_ids_come_from_rowid_order_without_the_artifact(tmp_path, db_path):
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    (models_dir / "manifest.json").write_text(json.dumps({"artifacts": {
+        "recipe_ids": {"version": "1", "filename": "recipe_ids.npy", "format": "npy", "sha256": None, "url": None},
+        "recipes_db": {"version": "1", "filename": "recipes.db", "local_path": "../recipes.db", "format": "file",
+                       "sha256": None, "url": None},
+    }}))
+    store = ArtifactStore(str(models_dir / "manifest.json"), cache_dir=str(tmp_path / "cache"), offline=True)
+
+    # Recipes ingested after the model was fitted are not model rows
+    assert load_model_recipe_ids(store, 2).tolist() == [1, 2]
+
+    np.save(models_dir / "recipe_ids.npy", np.array([3, 1]))
+    assert load_model_recipe_ids(store, 2).tolist() == [3, 1]
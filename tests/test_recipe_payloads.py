@@ -0,0 +1,30 @@
+import json
+import sqlite3
+
+import pytest
+
+from recipe_payloads import add_payload_columns, fetch_recipes_with_payloads, parse_list, store_payloads
+
+
+@pytest.mark.parametrize("value", [None, 3, "", "not a list", "['unterminated", "{'a': 1}", "[" * 100000, "(" * 100000])
+def test_parse_list_never_raises(value):
+    assert parse_list(value) == []
+
+
+def test_parse_list_stringifies_items():
+    assert parse_list("['1 cup rice', 2]") == ["1 cup rice", "2"]
+
+
+def test_null_payloads_are_parsed_per_row(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "recipes.db"))
+    conn.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    conn.executemany("INSERT INTO recipes VALUES (?, ?, ?)", [
+        ("Stored", "['1 cup rice']", "['Boil.']"),
+        ("Ingested later", "['2 eggs']", "['1. Whisk the eggs']"),
+    ])
+    add_payload_columns(conn)
+    store_payloads(conn, [(1, "['1 cup rice']", "['Boil.']")])
+
+    rows = fetch_recipes_with_payloads(conn, [1, 2])
+    assert [json.loads(row[4]) for row in rows] == [["1 cup rice"], ["2 eggs"]]
+    assert [json.loads(row[5]) for row in rows] == [["Boil."], ["Whisk the eggs"]]
@@ -0,0 +1,103 @@
+import asyncio
+import gc
+import json
+import sqlite3
+import warnings
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import search_service
+from corpus_store import write_corpus_store
+from search_service import BadRequest, SearchBackend, SearchService, _parse_k
+
+
+@pytest.fixture
+def service():
+    calls = []
+    backend = SimpleNamespace(suggester=None, overlap=lambda ingredients, k: calls.append((ingredients, k)) or [])
+    service = SearchService(backend, workers=1)
+    service.calls = calls
+    return service
+
+
+@pytest.mark.parametrize("k", [True, False, 0, 101, 2.0, "3"])
+def test_parse_k_rejects_non_integers_and_out_of_range(k):
+    with pytest.raises(BadRequest):
+        _parse_k({"k": k})
+
+
+def test_parse_k_default():
+    assert _parse_k({}) == 10
+
+
+def test_batch_is_validated_before_any_query_starts(service):
+    body = json.dumps({"queries": [
+        {"mode": "overlap", "ingredients": "rice"},
+        {"mode": "overlap", "ingredients": "rice", "k": True},
+    ]}).encode()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        status, _ = asyncio.run(service.dispatch("POST", "/search/batch", body))
+        gc.collect()
+    assert status == 400
+    assert service.calls == []
+    assert not [w for w in caught if "never awaited" in str(w.message)]
+
+
+def test_batch_runs_every_query(service):
+    body = json.dumps({"queries": [{"mode": "overlap", "ingredients": "rice"},
+                                   {"mode": "overlap", "ingredients": ["egg", "flour"], "k": 3}]}).encode()
+    status, result = asyncio.run(service.dispatch("POST", "/search/batch", body))
+    assert (status, result) == (200, {"results": [[], []]})
+    assert service.calls == [("rice", 10), ("egg, flour", 3)]
+
+
+@pytest.mark.parametrize("request_line", [b"GARBAGE\r\n", b"GET /health\r\n", b"GET /health HTTP/1.1 extra\r\n"])
+def test_malformed_request_line_gets_a_400(service, request_line):
+    async def exchange():
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(request_line + b"Host: test\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    response = asyncio.run(exchange())
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Connection: close" in response
+
+
+def test_corpus_store_rows_map_to_its_own_recipe_ids(tmp_path, monkeypatch):
+    recipes = [("Chicken Soup", "chicken onion"), ("Rice Bowl", "rice egg"), ("Tomato Salad", "tomato basil")]
+    db_path = str(tmp_path / "recipes.db")
+    setup = sqlite3.connect(db_path)
+    setup.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    setup.executemany("INSERT INTO recipes (title, ingredients, instructions) VALUES (?, ?, '[]')", recipes)
+    setup.commit()
+    setup.close()
+
+    # The corpus store holds the rows in another order than the model's recipe_ids
+    order = [2, 0, 1]
+    documents = [recipes[i][1] for i in order]
+    vectorizer = TfidfVectorizer().fit(documents)
+    corpus_path = str(tmp_path / "corpus")
+    write_corpus_store(corpus_path, [(recipes[i][0], recipes[i][1], "[]", recipes[i][1]) for i in order],
+                       vectorizer.transform(documents), [i + 1 for i in order])
+    artifacts = {"tfidf_vectorizer": vectorizer, "recipe_ids": np.array([1, 2, 3])}
+    store = SimpleNamespace(load=artifacts.get, path=lambda name: db_path, versions=lambda: {})
+    monkeypatch.setenv("PANTRYPALETTE_CORPUS_STORE", corpus_path)
+    monkeypatch.delenv("PANTRYPALETTE_SEARCH_WORKERS", raising=False)
+    monkeypatch.setenv("PANTRYPALETTE_SUGGEST_INDEX", str(tmp_path / "suggest"))
+    monkeypatch.setattr(search_service, "preprocess_user_ingredients", lambda ingredients: ingredients)
+
+    backend = SearchBackend(store)
+    [results] = backend.similar_batch([("rice egg", 1)])
+    assert [(item["id"], item["title"]) for item in results] == [(2, "Rice Bowl")]
@@ -0,0 +1,150 @@
+import asyncio
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import spoonacular_ingest
+from ingredient_index import rebuild_index
+from segmented_index import SegmentedIndex
+from spoonacular_ingest import IngestError, ResponseCache, SpoonacularClient, ingest, start_replay_server
+
+QUERY = ["chicken", "rice"]
+RECIPES = {
+    101: ("Chicken Rice", ["1 lb chicken thighs", "1 cup rice"], ["Brown the chicken.", "Add the rice."]),
+    102: ("Fried Rice", ["2 cups cooked rice", "2 eggs", "soy sauce"], ["Fry everything."]),
+    103: ("Chicken Salad", ["2 chicken breasts", "1 head lettuce"], ["Grill the chicken.", "Toss."]),
+}
+
+
+def details(spoonacular_id):
+    title, ingredients, steps = RECIPES[spoonacular_id]
+    return {
+        "id": spoonacular_id,
+        "title": title,
+        "extendedIngredients": [{"original": ingredient} for ingredient in ingredients],
+        "analyzedInstructions": [{"steps": [{"number": i, "step": step} for i, step in enumerate(steps, 1)]}],
+    }
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    cache = ResponseCache(str(tmp_path / "recordings"))
+    cache.put("/recipes/findByIngredients", {"ingredients": ",".join(QUERY), "number": 10},
+              [{"id": spoonacular_id} for spoonacular_id in RECIPES])
+    for spoonacular_id in RECIPES:
+        cache.put(f"/recipes/{spoonacular_id}/information", {}, details(spoonacular_id))
+    return cache.directory
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "recipes.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE recipes (title TEXT, ingredients TEXT, instructions TEXT)")
+    conn.execute("INSERT INTO recipes VALUES ('Plain Rice', \"['1 cup rice', '2 cups water']\", '[]')")
+    conn.commit()
+    conn.close()
+    rebuild_index(path)
+    return path
+
+
+@pytest.fixture
+def segments():
+    # The fixture database's only recipe
+    documents = ["['1 cup rice', '2 cups water']"]
+    vectorizer = TfidfVectorizer().fit(documents + ["['1 lb chicken thighs', '1 onion']"])
+    return SegmentedIndex(vectorizer, vectorizer.transform(documents), np.array([1]))
+
+
+def run_ingest(base_url, cache_dir, db_path, queries=(QUERY,), **kwargs):
+    async def main():
+        client = SpoonacularClient(base_url=base_url, cache_dir=cache_dir, rate=1000, burst=100, max_retries=20)
+        try:
+            return await ingest(client, db_path, queries, **kwargs)
+        finally:
+            client.close()
+
+    return asyncio.run(main())
+
+
+def snapshot(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return (
+            conn.execute("SELECT rowid, title, ingredients, instructions FROM recipes ORDER BY rowid").fetchall(),
+            conn.execute("SELECT spoonacular_id, recipe_id FROM spoonacular_recipes ORDER BY 1").fetchall(),
+            conn.execute("SELECT ingredient_id, recipe_id FROM recipe_ingredients ORDER BY 1, 2").fetchall(),
+        )
+    finally:
+        conn.close()
+
+
+def test_ingest_retries_caches_and_upserts_idempotently(monkeypatch, tmp_path, recordings, db_path, segments):
+    monkeypatch.setattr(spoonacular_ingest, "BACKOFF_BASE", 0.001)
+    random.seed(0)
+    server = start_replay_server(recordings, error_rate=0.5)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cache_dir = str(tmp_path / "cache")
+    try:
+        first = run_ingest(base_url, cache_dir, db_path, segments=segments)
+    finally:
+        server.shutdown()
+    assert first["retries"] > 0
+    assert first["requests"] == first["retries"] + 1 + len(RECIPES)
+    assert (first["inserted"], first.get("failed", 0)) == (len(RECIPES), 0)
+    stored = snapshot(db_path)
+    assert sorted(row[1] for row in stored[0]) == ["Chicken Rice", "Chicken Salad", "Fried Rice", "Plain Rice"]
+    assert len(stored[1]) == len(RECIPES)
+    # Vectorized from the raw ingredients column, as the main segment, then compacted
+    assert sum(segment["live"] for segment in segments.stats()["segments"]) == 1 + len(RECIPES)
+
+    # A refresh re-fetches the recipe details past the response cache and picks up upstream changes
+    changed = dict(details(101), title="Chicken Rice Bowl")
+    ResponseCache(recordings).put("/recipes/101/information", {}, changed)
+    server = start_replay_server(recordings)
+    try:
+        again = run_ingest(f"http://127.0.0.1:{server.server_address[1]}", cache_dir, db_path, refresh=True)
+    finally:
+        server.shutdown()
+    assert (again["requests"], again["cache_hits"]) == (len(RECIPES), 1)
+    assert (again.get("inserted", 0), again["updated"]) == (0, len(RECIPES))
+    assert ResponseCache(cache_dir).get("/recipes/101/information", {}) == (True, changed)
+    stored = snapshot(db_path)
+    assert sorted(row[1] for row in stored[0]) == ["Chicken Rice Bowl", "Chicken Salad", "Fried Rice", "Plain Rice"]
+
+    skipped = run_ingest(base_url, cache_dir, db_path)
+    assert skipped["skipped"] == len(RECIPES)
+    assert snapshot(db_path) == stored
+
+
+def test_failed_discovery_closes_the_writer(monkeypatch, recordings, db_path):
+    opened = []
+
+    def connect_writer(path):
+        # Usable from the test thread, to check it was closed
+        opened.append(sqlite3.connect(path, check_same_thread=False))
+        return opened[-1]
+
+    monkeypatch.setattr(spoonacular_ingest, "connect_writer", connect_writer)
+    server = start_replay_server(recordings)
+    try:
+        # No recording for this search: the replay server answers 404
+        with pytest.raises(IngestError):
+            run_ingest(f"http://127.0.0.1:{server.server_address[1]}", None, db_path, queries=[["saffron"]])
+    finally:
+        server.shutdown()
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        opened[0].execute("SELECT 1")
+
+
+def test_segments_refuse_another_document_form(tmp_path, segments):
+    directory = str(tmp_path / "segments")
+    cleaned = SegmentedIndex(segments.vectorizer, segments.base_segment.matrix, segments.base_segment.recipe_ids,
+                             directory=directory, documents="cleaned")
+    cleaned.delete_recipes([1])
+    with pytest.raises(ValueError):
+        SegmentedIndex(segments.vectorizer, segments.base_segment.matrix, segments.base_segment.recipe_ids,
+                       directory=directory, documents="raw")
@@ -0,0 +1,13 @@
+import pytest
+
+from synthetic_corpus import ingredient_vocabulary, vocabulary_capacity
+
+
+def test_vocabulary_is_distinct():
+    names = ingredient_vocabulary(5000)
+    assert len(names) == len(set(names)) == 5000
+
+
+def test_vocabulary_larger_than_capacity_is_refused():
+    with pytest.raises(ValueError, match=str(vocabulary_capacity())):
+        ingredient_vocabulary(vocabulary_capacity() + 1)
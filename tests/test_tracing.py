@@ -0,0 +1,16 @@
+import recipe_model
+from normalization import IngredientNormalizer
+from tracing import Tracer
+
+
+def test_normalizer_cache_stats_are_exported(monkeypatch):
+    normalizer = IngredientNormalizer({"cup"}, lambda word: word.rstrip("s"))
+    monkeypatch.setattr(recipe_model, "_normalizer", normalizer)
+    normalizer.normalize("2 cups onions")
+    normalizer.normalize("2 cups onions")
+
+    metrics = Tracer().render_prometheus()
+    assert "# TYPE pantrypalette_normalizer_cache_hits_total counter" in metrics
+    assert 'pantrypalette_normalizer_cache_hits_total{cache="phrase"} 1' in metrics
+    assert 'pantrypalette_normalizer_cache_misses_total{cache="phrase"} 1' in metrics
+    assert 'pantrypalette_normalizer_cache_entries{cache="phrase"} 1' in metrics